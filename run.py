@@ -1,9 +1,16 @@
 """
 项目主执行文件，作为程序入口点
 """
+import os
 import pandas as pd
+from stock_backtester.backtest import Backtester
 from stock_backtester.config import Config
-from stock_backtester.engine import download_all_stocks, calculate_time_range
+from stock_backtester.engine import download_all_periods, refresh_all_stocks, calculate_time_range
+from stock_backtester.feeds.bar_cache import BarCache
+from stock_backtester.feeds.mmap_store import MmapBarStore
+from stock_backtester.feeds.resample import base_period
+from stock_backtester.feeds.resilience import configure_feed_caller
+from stock_backtester.feeds.xtquant_feed import format_stock_code
 from stock_backtester.logger import setup_logging, get_logger
 from stock_backtester.screener.screener import Screener
 from stock_backtester.screener.filters import MAFilter, WRFilter, GeneralComparisonFilter
@@ -32,6 +39,10 @@ def main():
         print(f"股票代码列表: {stock_list}")
         logger.info(f"共找到 {len(stock_list)} 只股票")
         
+        # 配置数据源调用的限流、重试和熔断
+        if config.feed:
+            configure_feed_caller(**config.feed)
+        
         # 设置时间范围参数（可以根据需要修改）
         start_date = None  # 如果为None，则使用默认逻辑
         end_date = None    # 如果为None，则使用默认逻辑
@@ -42,43 +53,25 @@ def main():
         logger.info(f"数据下载时间范围: {actual_start_date} 到 {actual_end_date}")
         
         # 定义所有需要下载的周期
-        periods = ['1m', '5m', '30m', '1d']  # 支持多种周期数据下载
+        # 只下载基础周期，30m等合成周期在筛选时由5m数据在本地合成
+        periods = ['1m', '5m', '1d']  # 支持多种周期数据下载
         adjustment = 'pre' # 复权方式，默认前复权
-        
-        # 为每个周期下载所有股票数据
-        all_stock_data = {}
-        for period in periods:
-            print(f"\n开始下载 {period} 周期的股票数据...")
-            logger.info(f"开始下载 {period} 周期的股票数据...")
-            
-            # 下载所有股票数据
-            stock_data = download_all_stocks(
-                stock_list, 
-                actual_start_date, 
-                actual_end_date, 
-                period, 
-                adjustment, 
-                config.max_threads
-            )
-            
-            # 存储结果
-            all_stock_data[period] = stock_data
-            
-            # 处理结果
-            successful_downloads = sum(1 for data in stock_data.values() if data is not None)
-            failed_downloads = len(stock_data) - successful_downloads
-            
-            print(f"{period} 周期数据下载完成: 成功 {successful_downloads} 只，失败 {failed_downloads} 只")
-            logger.info(f"{period} 周期数据下载完成: 成功 {successful_downloads} 只，失败 {failed_downloads} 只")
-            
-            # 显示成功下载的股票
-            successful_stocks = [code for code, data in stock_data.items() if data is not None]
-            if successful_stocks:
-                print(f"成功下载的股票 ({period}): {successful_stocks}")
-                logger.info(f"成功下载的股票 ({period}): {successful_stocks}")
-        
-        # 创建筛选器管理器
-        screener = Screener(actual_start_date, actual_end_date)
+        incremental = False  # 是否先增量刷新本地缓存（需要配置cache_dir），适合每日收盘后运行
+        streaming = False  # 是否边下载边筛选：每只股票所需周期的数据就绪后立即筛选并输出结果，适合即时筛选
+        backtest = False  # 是否在筛选后用筛选链的历史信号对日线数据做向量化回测
+        
+        # 配置了缓存目录时，使用本地K线缓存，只下载缓存未覆盖的区间
+        cache = BarCache(config.cache_dir) if config.cache_dir else None
+        if cache is not None:
+            print(f"使用K线本地缓存: {config.cache_dir}")
+            logger.info(f"使用K线本地缓存: {config.cache_dir}")
+        
+        # 创建筛选器管理器，先确定筛选链需要的数据周期，下载时优先下载这些周期
+        screener_config = config.screener or {}
+        screener = Screener(actual_start_date, actual_end_date, cache,
+                            max_workers=screener_config.get('max_workers', config.max_threads),
+                            process_workers=screener_config.get('process_workers', 0),
+                            adjustment=adjustment)
         
         # 通过代码添加筛选条件
         # 示例：添加MA筛选条件（MA5 > MA10）
@@ -97,6 +90,72 @@ def main():
         general_filter = GeneralComparisonFilter('close', 'open', 'gt')
         screener.add_filter(general_filter)
         
+        # 边下载边筛选时不预先下载全部周期，筛选时按需下载每只股票所需的数据
+        if streaming:
+            periods = []
+        
+        # 增量刷新模式下先把缓存追加到最新，之后的下载直接从缓存读取
+        if incremental and cache is not None:
+            for period in periods:
+                refresh_all_stocks(stock_list, cache, period, adjustment, config.max_threads,
+                                   actual_end_date, config.batch_size)
+        
+        # 所有周期的下载任务在同一个线程池中调度，筛选链需要的周期（合成周期对应其基础周期）优先下载
+        # 配置了缓存时分钟线每批写入缓存后即丢弃，之后从缓存构建内存映射存储，不在内存中保留逐只股票的DataFrame
+        minute_periods = ['1m', '5m']
+        period_data = {}
+        if periods:
+            print(f"\n开始下载 {', '.join(periods)} 周期的股票数据...")
+            logger.info(f"开始下载 {', '.join(periods)} 周期的股票数据...")
+            period_data = download_all_periods(
+                stock_list,
+                actual_start_date,
+                actual_end_date,
+                periods,
+                adjustment,
+                config.max_threads,
+                cache,
+                config.batch_size,
+                priority_periods=[base_period(period) for period in screener.plan().periods],
+                adaptive=config.adaptive_threads,
+                min_threads=config.min_threads,
+                cache_only_periods=minute_periods
+            )
+        
+        all_stock_data = {}
+        mmap_stores = {}
+        for period, stock_data in period_data.items():
+            # 存储结果；配置了缓存时分钟线由缓存构建内存映射存储
+            if cache is not None and period in minute_periods:
+                formatted_codes = [code for code in map(format_stock_code, stock_list) if code is not None]
+                mmap_stores[period] = MmapBarStore.build_from_cache(
+                    os.path.join(config.cache_dir, 'mmap', period), cache, formatted_codes,
+                    actual_start_date, actual_end_date, period, adjustment
+                )
+            else:
+                all_stock_data[period] = stock_data
+            
+            # 处理结果
+            successful_downloads = sum(1 for data in stock_data.values() if data is not None)
+            failed_downloads = len(stock_data) - successful_downloads
+            
+            print(f"{period} 周期数据下载完成: 成功 {successful_downloads} 只，失败 {failed_downloads} 只")
+            logger.info(f"{period} 周期数据下载完成: 成功 {successful_downloads} 只，失败 {failed_downloads} 只")
+            
+            # 显示成功下载的股票
+            successful_stocks = [code for code, data in stock_data.items() if data is not None]
+            if successful_stocks:
+                print(f"成功下载的股票 ({period}): {successful_stocks}")
+                logger.info(f"成功下载的股票 ({period}): {successful_stocks}")
+        # 筛选前释放下载结果，之后只通过all_stock_data和内存映射存储访问数据
+        del period_data
+        
+        # 用已下载的数据填充数据上下文，筛选时不再重复下载
+        for period, stock_data in all_stock_data.items():
+            screener.seed_data(stock_data, period, adjustment)
+        for period, store in mmap_stores.items():
+            screener.context.attach_store(store, period, adjustment)
+        
         # 执行股票筛选
         print("\n开始执行股票筛选...")
         logger.info("开始执行股票筛选...")
@@ -111,7 +170,18 @@ def main():
         try:
             # 执行筛选，传递股票代码列表和数据范围参数
             stock_codes = list(stock_list)  # 使用从Excel文件读取的股票代码列表
-            screened_stocks = screener.exec(stock_codes)
+            
+            # 显示执行计划，便于在全市场筛选前分析筛选链的开销
+            logger.info(screener.explain(stock_codes))
+            if streaming:
+                # 每只股票完成筛选后立即输出
+                for stock_code, passed in screener.stream(stock_codes):
+                    if passed:
+                        print(f"符合条件: {stock_code}")
+                        logger.info(f"符合条件: {stock_code}")
+                screened_stocks = screener.get_filtered_stocks()
+            else:
+                screened_stocks = screener.exec(stock_codes)
             
             print(f"\n筛选完成，符合条件的股票数量: {len(screened_stocks)}")
             logger.info(f"筛选完成，符合条件的股票数量: {len(screened_stocks)}")
@@ -123,10 +193,21 @@ def main():
                 print("没有股票符合条件")
                 logger.info("没有股票符合条件")
                 
+            # 用筛选链在每个交易日的历史信号回测：信号次日开盘成交，按A股规则处理整手、涨跌停和交易费用
+            if backtest and not streaming and '1d' in all_stock_data:
+                signals = screener.signals(stock_codes)
+                result = Backtester().run(signals, all_stock_data['1d'])
+                summary = result.summary()
+                print(f"\n回测完成: {summary}")
+                logger.info(f"回测完成: {summary}")
+                
         except Exception as e:
             error_msg = f"股票筛选执行出错: {str(e)}"
             print(error_msg)
             logger.error(error_msg, exc_info=True)
+        finally:
+            # 关闭计算技术指标的进程池
+            screener.close()
         
         # 这里可以添加进一步的数据处理逻辑
         # 例如：数据存储、分析等
@@ -0,0 +1,322 @@
+"""
+向量化回测模块，用筛选器生成的历史信号矩阵和本地K线模拟A股交易
+
+交易规则：
+- 信号在当日收盘后产生，下一个交易日开盘价成交：信号为True时买入，变为False时卖出
+- T+1：买入当日不能卖出；由于只在开盘成交且每天最多改变一次持仓，买入的股票最早在下一个交易日卖出
+- 按固定金额开仓，股数向下取整到整手（100股），不足一手的信号不买入
+- 现金不能为负：先卖出再买入，卖出所得当日可用；现金不足时按股票顺序用剩余现金买入整手（含佣金），
+  第一只买不全的股票之后的开仓在之后的交易日继续尝试
+- 开盘价达到涨停价时不能买入，达到跌停价时不能卖出，停牌日不能买卖；未成交的委托在之后的交易日继续尝试
+- 佣金按成交金额的比例收取，每笔不低于最低佣金；卖出时另收印花税
+
+开仓股数取决于当日可用的现金，持仓按交易日逐日推进，每个交易日内对所有股票做数组运算；
+成交金额、交易费用、现金和总资产由持股矩阵整体计算。
+"""
+import numpy as np
+import pandas as pd
+from typing import Dict, Union
+from .panel import Panel
+from .logger import get_logger
+
+# 获取日志记录器
+logger = get_logger(__name__)
+
+# 各板块的涨跌幅限制：创业板、科创板20%，北交所30%，其余10%
+BOARD_LIMITS = (
+    (('300', '301'), 0.20),
+    (('688', '689'), 0.20),
+)
+BJ_LIMIT = 0.30
+# 北交所股票代码的前缀，用于判断不带市场后缀的代码
+BJ_PREFIXES = ('4', '8', '92')
+DEFAULT_LIMIT = 0.10
+
+
+def limit_ratio(stock_code: str) -> float:
+    """
+    按股票代码判断涨跌幅限制比例
+
+    Args:
+        stock_code (str): 股票代码，支持 '600000.SH'、'SH.600000' 和不带市场的 '830799' 等格式
+
+    Returns:
+        float: 涨跌幅限制比例，如0.1表示10%
+    """
+    code, _, market = str(stock_code).strip().upper().partition('.')
+    if code in ('SH', 'SZ', 'BJ'):
+        code, market = market, code
+    # 不带市场后缀的代码（如从Excel读取的原始代码）按北交所的代码前缀判断
+    if market == 'BJ' or (not market and code.startswith(BJ_PREFIXES)):
+        return BJ_LIMIT
+    for prefixes, ratio in BOARD_LIMITS:
+        if code.startswith(prefixes):
+            return ratio
+    return DEFAULT_LIMIT
+
+
+def _ffill(values: np.ndarray) -> np.ndarray:
+    """沿时间轴（第1维）用前一个非NaN值填充NaN"""
+    n_times = values.shape[1]
+    if not n_times:
+        return values.copy()
+    last = np.where(np.isnan(values), -1, np.arange(n_times))
+    last = np.maximum.accumulate(last, axis=1)
+    rows = np.arange(values.shape[0])[:, None]
+    return np.where(last >= 0, values[rows, np.maximum(last, 0)], np.nan)
+
+
+def _shift(values: np.ndarray, fill) -> np.ndarray:
+    """沿时间轴后移一位，第一列为fill"""
+    shifted = np.empty_like(values)
+    if values.shape[1]:
+        shifted[:, 0] = fill
+        shifted[:, 1:] = values[:, :-1]
+    return shifted
+
+
+class BacktestResult:
+    """回测结果"""
+
+    def __init__(self, equity: pd.Series, cash: pd.Series, positions: pd.DataFrame, turnover: pd.Series,
+                 trades: pd.DataFrame, costs: pd.Series, initial_cash: float):
+        """
+        初始化回测结果
+
+        Args:
+            equity (pd.Series): 每日收盘后的总资产
+            cash (pd.Series): 每日收盘后的现金
+            positions (pd.DataFrame): 每日收盘后每只股票的持股数量
+            turnover (pd.Series): 每日换手率，(买入金额 + 卖出金额) / 2 / 前一日总资产
+            trades (pd.DataFrame): 每日每只股票的成交股数，买入为正、卖出为负
+            costs (pd.Series): 每日的佣金和印花税
+            initial_cash (float): 初始资金
+        """
+        self.equity = equity
+        self.cash = cash
+        self.positions = positions
+        self.turnover = turnover
+        self.trades = trades
+        self.costs = costs
+        self.initial_cash = initial_cash
+
+    @property
+    def returns(self) -> pd.Series:
+        """每日收益率"""
+        return self.equity / self.equity.shift(1, fill_value=self.initial_cash) - 1
+
+    @property
+    def total_return(self) -> float:
+        """总收益率"""
+        return float(self.equity.iloc[-1] / self.initial_cash - 1) if len(self.equity) else 0.0
+
+    @property
+    def max_drawdown(self) -> float:
+        """最大回撤，为非正数"""
+        if not len(self.equity):
+            return 0.0
+        peak = np.maximum.accumulate(np.maximum(self.equity.to_numpy(), self.initial_cash))
+        return float(np.min(self.equity.to_numpy() / peak - 1))
+
+    def summary(self) -> Dict[str, float]:
+        """
+        汇总回测指标
+
+        Returns:
+            Dict[str, float]: 总收益率、年化收益率、最大回撤、平均换手率、成交笔数和交易费用
+        """
+        days = len(self.equity)
+        growth = 1 + self.total_return
+        # 亏损超过初始资金时年化收益率记为-100%
+        annual = growth ** (252 / days) - 1 if days and growth > 0 else (-1.0 if days else 0.0)
+        return {
+            'total_return': self.total_return,
+            'annual_return': float(annual),
+            'max_drawdown': self.max_drawdown,
+            'mean_turnover': float(self.turnover.mean()) if days else 0.0,
+            'trades': int(np.count_nonzero(self.trades.to_numpy())),
+            'costs': float(self.costs.sum()),
+        }
+
+
+class Backtester:
+    """向量化回测器"""
+
+    def __init__(self, initial_cash: float = 1_000_000, position_value: float = 100_000,
+                 commission_rate: float = 0.00025, min_commission: float = 5.0, stamp_duty: float = 0.0005,
+                 lot_size: int = 100, limit_ratios: Dict[str, float] = None):
+        """
+        初始化回测器
+
+        Args:
+            initial_cash (float): 初始资金
+            position_value (float): 每只股票开仓的金额
+            commission_rate (float): 佣金费率，买卖双向收取
+            min_commission (float): 每笔最低佣金
+            stamp_duty (float): 印花税率，只在卖出时收取
+            lot_size (int): 每手股数
+            limit_ratios (Dict[str, float]): 股票代码到涨跌幅限制比例的映射，如ST股票的0.05，未提供的按板块判断
+        """
+        self.initial_cash = initial_cash
+        self.position_value = position_value
+        self.commission_rate = commission_rate
+        self.min_commission = min_commission
+        self.stamp_duty = stamp_duty
+        self.lot_size = lot_size
+        self.limit_ratios = limit_ratios or {}
+        logger.debug(f"初始化回测器，初始资金: {initial_cash}, 每只股票开仓金额: {position_value}")
+
+    def _aligned_bars(self, signals: pd.DataFrame, bars: Union[Panel, Dict[str, pd.DataFrame]]) -> Panel:
+        """把K线对齐到信号矩阵的股票和日期，缺少K线的位置为NaN"""
+        symbols = list(signals.columns)
+        if not isinstance(bars, Panel):
+            bars = Panel.from_frames({symbol: bars.get(symbol) for symbol in symbols}, ['open', 'close'])
+        panel = bars.select(symbols)
+        columns = pd.DatetimeIndex(panel.timestamps).get_indexer(pd.DatetimeIndex(signals.index))
+        fields = {}
+        for name in ('open', 'close'):
+            values = np.full((len(symbols), len(columns)), np.nan)
+            found = columns >= 0
+            values[:, found] = panel.field(name)[:, columns[found]]
+            fields[name] = values
+        return Panel(symbols, signals.index.to_numpy(dtype='datetime64[ns]'), fields)
+
+    def _fill_masks(self, panel: Panel):
+        """计算每个交易日开盘时能否买入、能否卖出"""
+        open_price = panel.field('open')
+        prev_close = _shift(_ffill(panel.field('close')), np.nan)
+        ratios = np.array([self.limit_ratios.get(symbol, limit_ratio(symbol)) for symbol in panel.symbols])[:, None]
+        # 涨跌停价按前收盘价计算并四舍五入到分
+        limit_up = np.round(prev_close * (1 + ratios), 2)
+        limit_down = np.round(prev_close * (1 - ratios), 2)
+        traded = ~np.isnan(open_price)
+        with np.errstate(invalid='ignore'):
+            # 没有前收盘价（上市首日）时不限制涨跌幅
+            can_buy = traded & ~(open_price >= limit_up - 1e-6)
+            can_sell = traded & ~(open_price <= limit_down + 1e-6)
+        return can_buy, can_sell
+
+    def _commission(self, value: np.ndarray) -> np.ndarray:
+        """按成交金额计算佣金，每笔不低于最低佣金，未成交时为0"""
+        return np.where(value > 0, np.maximum(value * self.commission_rate, self.min_commission), 0.0)
+
+    def _allocate(self, prices: np.ndarray, cash: float) -> np.ndarray:
+        """
+        为同一交易日的开仓分配现金
+
+        按股票顺序累计每只股票按固定金额开仓的买入金额和佣金，用np.searchsorted找到现金够用的前若干只全额买入；
+        第一只买不全的股票用剩余现金买入整手，剩余现金不足一手后本日不再开仓，之后的股票在之后的交易日继续尝试。
+
+        Args:
+            prices (np.ndarray): 按股票顺序排列的开仓股票的开盘价
+            cash (float): 卖出后可用的现金
+
+        Returns:
+            np.ndarray: 每只股票买入的股数，买入金额和佣金合计不超过cash
+        """
+        lot = self.lot_size
+        shares = np.floor(self.position_value / prices / lot) * lot
+        value = shares * prices
+        spent = np.cumsum(value + self._commission(value))
+        funded = int(np.searchsorted(spent, cash, side='right'))
+        if funded == len(prices):
+            return shares
+
+        # 剩余现金需同时满足 金额 × (1 + 佣金费率) 和 金额 + 最低佣金 不超过剩余现金
+        remaining = cash - (spent[funded - 1] if funded else 0.0)
+        price = prices[funded]
+        budget = min(remaining / (1 + self.commission_rate), remaining - self.min_commission)
+        count = min(shares[funded], max(np.floor(budget / price / lot) * lot, 0.0))
+        if count > 0 and count * price + self._commission(np.array(count * price)) > remaining:
+            # 浮点误差导致超出时少买一手
+            count -= lot
+        shares[funded] = count
+        shares[funded + 1:] = 0.0
+        return shares
+
+    def _positions(self, target: np.ndarray, open_price: np.ndarray, can_buy: np.ndarray,
+                   can_sell: np.ndarray) -> np.ndarray:
+        """
+        逐个交易日推进持仓，开仓股数受当日可用现金约束
+
+        每个交易日内对所有股票做数组运算，只沿时间轴循环；数组先转为按交易日连续存放，按日取行不跨步访问。
+
+        Args:
+            target (np.ndarray): 每个交易日开盘时的目标持仓，形状为(股票数量, 交易日数量)
+            open_price (np.ndarray): 开盘价，停牌为NaN
+            can_buy (np.ndarray): 每个交易日开盘时能否买入
+            can_sell (np.ndarray): 每个交易日开盘时能否卖出
+
+        Returns:
+            np.ndarray: 每个交易日收盘后的持股数量，形状与target相同
+        """
+        n_symbols, n_times = target.shape
+        target, can_buy, can_sell = (np.ascontiguousarray(mask.T) for mask in (target, can_buy, can_sell))
+        open_price = np.ascontiguousarray(open_price.T)
+        shares = np.zeros((n_times, n_symbols))
+        holding = np.zeros(n_symbols)
+        cash = float(self.initial_cash)
+        for t in range(n_times):
+            # 先卖出，卖出所得当日即可用于买入
+            sell = (holding > 0) & ~target[t] & can_sell[t]
+            if sell.any():
+                value = holding[sell] * open_price[t, sell]
+                cash += float((value - self._commission(value) - value * self.stamp_duty).sum())
+                holding[sell] = 0.0
+            buy = np.flatnonzero((holding == 0) & target[t] & can_buy[t])
+            if len(buy):
+                bought = self._allocate(open_price[t, buy], cash)
+                value = bought * open_price[t, buy]
+                cash -= float((value + self._commission(value)).sum())
+                holding[buy] = bought
+            shares[t] = holding
+        return shares.T
+
+    def run(self, signals: pd.DataFrame, bars: Union[Panel, Dict[str, pd.DataFrame]]) -> BacktestResult:
+        """
+        执行回测
+
+        Args:
+            signals (pd.DataFrame): 以日期为索引、股票代码为列的布尔信号矩阵，如Screener.signals()的结果
+            bars (Panel | Dict[str, pd.DataFrame]): 日线数据，如缓存中的K线或其构建的面板，需要包含open和close
+
+        Returns:
+            BacktestResult: 回测结果
+        """
+        signals = signals.sort_index()
+        panel = self._aligned_bars(signals, bars)
+        open_price = panel.field('open')
+        close = _ffill(panel.field('close'))
+
+        # 前一日收盘的信号决定当日开盘的目标持仓
+        target = _shift(signals.to_numpy(dtype=bool).T, False)
+        can_buy, can_sell = self._fill_masks(panel)
+        shares = self._positions(target, open_price, can_buy, can_sell)
+        n_times = target.shape[1]
+
+        trades = shares - _shift(shares, 0.0)
+        value = np.abs(trades) * np.nan_to_num(open_price)
+        traded = trades != 0
+        commission = self._commission(value)
+        stamp = np.where(trades < 0, value * self.stamp_duty, 0.0)
+        costs = (commission + stamp).sum(axis=0)
+        cash_flow = (np.where(trades < 0, value, 0.0) - np.where(trades > 0, value, 0.0)).sum(axis=0) - costs
+
+        cash = self.initial_cash + np.cumsum(cash_flow)
+        equity = cash + (shares * np.nan_to_num(close)).sum(axis=0)
+        previous = np.concatenate([[self.initial_cash], equity[:-1]])
+        turnover = value.sum(axis=0) / 2 / previous
+
+        index = signals.index
+        result = BacktestResult(
+            equity=pd.Series(equity, index=index, name='equity'),
+            cash=pd.Series(cash, index=index, name='cash'),
+            positions=pd.DataFrame(shares.T, index=index, columns=panel.symbols),
+            turnover=pd.Series(turnover, index=index, name='turnover'),
+            trades=pd.DataFrame(trades.T, index=index, columns=panel.symbols),
+            costs=pd.Series(costs, index=index, name='costs'),
+            initial_cash=self.initial_cash,
+        )
+        logger.info(f"回测完成: {len(panel.symbols)} 只股票 × {n_times} 个交易日, "
+                    f"成交 {int(np.count_nonzero(traded))} 笔, 总收益率 {result.total_return:.2%}")
+        return result
@@ -22,7 +22,12 @@ class Config:
         self.config_path = config_path
         self.excel_path = None
         self.max_threads = None
+        self.adaptive_threads = None
+        self.min_threads = None
         self.screener = None
+        self.feed = None
+        self.cache_dir = None
+        self.batch_size = None
         self._load_config()
     
     def _load_config(self):
@@ -53,7 +58,20 @@ class Config:
         self.excel_path = config_data['excel_path']
         self.max_threads = config_data['max_threads']
         
+        # 设置自适应下载并发（可选），开启后max_threads为并发上限，min_threads为并发下限
+        self.adaptive_threads = config_data.get('adaptive_threads', False)
+        self.min_threads = config_data.get('min_threads', 1)
+        
         # 设置筛选器配置（如果存在）
         self.screener = config_data.get('screener', None)
         
+        # 设置数据源调用保护配置（如果存在）
+        self.feed = config_data.get('feed', None)
+        
+        # 设置K线缓存目录（可选，未配置时不使用本地缓存）
+        self.cache_dir = config_data.get('cache_dir', None)
+        
+        # 设置批量下载时每批的股票数量上限（可选）
+        self.batch_size = config_data.get('batch_size', 500)
+        
         logger.info(f"配置项设置完成: excel_path={self.excel_path}, max_threads={self.max_threads}")
\ No newline at end of file
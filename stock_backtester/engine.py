@@ -2,15 +2,23 @@
 核心引擎模块，负责任务调度和并发执行
 """
 import pandas as pd
+import asyncio
 import concurrent.futures
+import functools
 from tqdm import tqdm
 import datetime
 import os
+import time
+from .feeds.singleflight import SingleFlight
+from .feeds.resilience import FetchResults
 from .logger import get_logger
 
 # 获取日志记录器
 logger = get_logger(__name__)
 
+# 合并同时进行的相同单只股票下载请求，多个筛选链或线程同时请求同一份数据时只下载一次
+download_flights = SingleFlight()
+
 
 def calculate_time_range(start_date=None, end_date=None):
     """
@@ -58,7 +66,7 @@ def calculate_time_range(start_date=None, end_date=None):
     return result
 
 
-def download_single_stock(stock_code, start_date, end_date, period='1d', adjustment='pre'):
+def download_single_stock(stock_code, start_date, end_date, period='1d', adjustment='pre', cache=None):
     """
     下载单只股票的数据
     
@@ -68,9 +76,14 @@ def download_single_stock(stock_code, start_date, end_date, period='1d', adjustm
         end_date (str): 结束日期
         period (str): 数据周期
         adjustment (str): 复权方式
+        cache (BarCache): K线本地缓存，为None时直接从数据源下载
         
     Returns:
-        pandas.DataFrame: 股票数据
+        pandas.DataFrame: 股票数据，成功获取但没有数据时为None
+
+    Raises:
+        ValueError: 股票代码格式无效
+        FeedError: 数据源重试用尽后仍然失败，失败不会被当作无数据返回
     """
     try:
         logger.info(f"开始下载股票 {stock_code} 的数据")
@@ -84,22 +97,100 @@ def download_single_stock(stock_code, start_date, end_date, period='1d', adjustm
             logger.error(f"无效的股票代码格式: {stock_code}")
             raise ValueError(f"无效的股票代码格式: {stock_code}")
         
-        # 下载数据
-        data = download_stock_data(formatted_code, start_date, end_date, period, adjustment)
+        # 下载数据，提供缓存时只获取缓存未覆盖的区间；相同的请求正在进行时等待并共享其结果
+        key = (formatted_code, period, adjustment, start_date, end_date, cache.root_dir if cache is not None else None)
+        if cache is not None:
+            data = download_flights.do(key, cache.get_or_fetch, formatted_code, start_date, end_date, period,
+                                       adjustment, download_stock_data)
+        else:
+            data = download_flights.do(key, download_stock_data, formatted_code, start_date, end_date, period,
+                                       adjustment)
         
         logger.info(f"股票 {stock_code} 数据下载完成")
         return data
     except Exception as e:
-        # 记录错误但不终止程序
+        # 记录错误后继续抛出，由调用方区分下载失败和无数据
         logger.error(f"下载股票 {stock_code} 数据时出错: {str(e)}")
         print(f"下载股票 {stock_code} 数据时出错: {str(e)}")
-        return stock_code, None
+        raise
 
 
-def download_all_stocks(stock_list, start_date, end_date, period='1d', adjustment='pre', max_threads=4):
+def download_stock_chunk(stock_codes, start_date, end_date, period='1d', adjustment='pre', cache=None):
+    """
+    批量下载一批股票的数据
+    
+    Args:
+        stock_codes (list): 已格式化的股票代码列表
+        start_date (str): 开始日期
+        end_date (str): 结束日期
+        period (str): 数据周期
+        adjustment (str): 复权方式
+        cache (BarCache): K线本地缓存，为None时直接从数据源下载
+        
+    Returns:
+        FetchResults: 股票代码到数据的映射，没有数据的股票对应None，下载失败的股票记录在failed中
+    """
+    from stock_backtester.feeds.xtquant_feed import download_stock_data_batch
+    
+    if cache is not None:
+        return cache.get_or_fetch_many(stock_codes, start_date, end_date, period, adjustment, download_stock_data_batch)
+    return download_stock_data_batch(stock_codes, start_date, end_date, period, adjustment, len(stock_codes))
+
+
+def _format_stock_list(stock_list):
+    """
+    格式化股票代码，无效代码直接记为下载失败
+    
+    Args:
+        stock_list (list): 股票代码列表
+        
+    Returns:
+        tuple: (原始代码到格式化代码的映射，无效代码对应None; 去重后的有效格式化代码列表)
+    """
+    from stock_backtester.feeds.xtquant_feed import format_stock_code
+    
+    code_map = {}
+    for stock in stock_list:
+        formatted_code = format_stock_code(stock)
+        if formatted_code is None:
+            logger.error(f"无效的股票代码格式: {stock}")
+            print(f"下载股票 {stock} 数据时出错: 无效的股票代码格式: {stock}")
+        code_map[stock] = formatted_code
+    formatted_codes = list(dict.fromkeys(code for code in code_map.values() if code is not None))
+    return code_map, formatted_codes
+
+
+def _report_failures(code_map, failed, period):
+    """
+    汇总下载失败的股票并按原始股票代码返回，无效代码也计为失败
+
+    Args:
+        code_map (dict): 原始代码到格式化代码的映射，无效代码对应None
+        failed (set): 下载失败的格式化代码
+        period (str): 数据周期
+
+    Returns:
+        set: 下载失败的原始股票代码
+    """
+    failed_stocks = {stock for stock, formatted_code in code_map.items()
+                     if formatted_code is None or formatted_code in failed}
+    if failed_stocks:
+        preview = ', '.join(sorted(map(str, failed_stocks))[:20])
+        logger.error(f"{period} 周期共 {len(failed_stocks)} 只股票下载失败: {preview}")
+        print(f"{period} 周期共 {len(failed_stocks)} 只股票下载失败（重试用尽或无效代码）: {preview}"
+              f"{' 等' if len(failed_stocks) > 20 else ''}")
+    return failed_stocks
+
+
+def download_all_stocks(stock_list, start_date, end_date, period='1d', adjustment='pre', max_threads=4, cache=None,
+                        batch_size=500, adaptive=False, min_threads=1):
     """
     并发下载所有股票的数据
     
+    股票按批次分组，每批通过一次批量请求下载，多个批次在线程池中并发执行。
+    每批的股票数量不超过batch_size，并根据时间范围和周期按内存上限进一步收缩。
+    开启adaptive时，在途批次数量由AIMD控制器根据每批耗时和失败情况在[min_threads, max_threads]之间动态调整。
+    
     Args:
         stock_list (list): 股票代码列表
         start_date (str): 开始日期
@@ -107,36 +198,365 @@ def download_all_stocks(stock_list, start_date, end_date, period='1d', adjustmen
         period (str): 数据周期
         adjustment (str): 复权方式
         max_threads (int): 最大线程数
+        cache (BarCache): K线本地缓存，为None时直接从数据源下载
+        batch_size (int): 每批股票数量的上限
+        adaptive (bool): 是否自适应调整并发数量，max_threads为并发上限
+        min_threads (int): 自适应调整时的并发下限
         
     Returns:
-        dict: 股票代码到数据的映射
+        FetchResults: 股票代码到数据的映射，顺序与stock_list一致，下载失败的股票记录在failed中
     """
+    from stock_backtester.feeds.xtquant_feed import estimate_chunk_size
+    
     logger.info(f"开始并发下载所有股票数据，股票数量: {len(stock_list)}, 最大线程数: {max_threads}")
     
-    # 存储结果的字典
-    results = {}
+    code_map, formatted_codes = _format_stock_list(stock_list)
     
-    # 使用线程池执行器
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as executor:
-        # 提交所有任务
-        future_to_stock = {
-            executor.submit(download_single_stock, stock, start_date, end_date, period, adjustment): stock
-            for stock in stock_list
-        }
-        
-        # 使用tqdm显示进度条
-        for future in tqdm(concurrent.futures.as_completed(future_to_stock), 
-                          total=len(future_to_stock), 
-                          desc="下载进度"):
-            stock = future_to_stock[future]
+    # 按批次切分股票列表
+    chunk_size = estimate_chunk_size(start_date, end_date, period, batch_size)
+    chunks = [formatted_codes[i:i + chunk_size] for i in range(0, len(formatted_codes), chunk_size)]
+    logger.info(f"股票分为 {len(chunks)} 批下载，每批最多 {chunk_size} 只")
+    
+    # 存储已格式化代码到数据的映射，以及重试用尽后仍下载失败的股票
+    fetched = {}
+    failed_codes = set()
+    
+    # 使用tqdm显示进度条，按股票数量计数
+    with tqdm(total=len(formatted_codes), desc="下载进度") as progress:
+        def collect(period, chunk, future):
+            """合并一个批次的结果，返回该批次是否失败"""
             try:
-                data = future.result()
-                results[stock] = data
-                logger.debug(f"股票 {stock} 数据处理完成")
+                result = future.result()
+                fetched.update(result)
+                logger.debug(f"批次 {chunk[0]} 等 {len(chunk)} 只股票数据处理完成")
+                # 只有数据源调用失败才计为失败，没有数据（如停牌）的股票不影响并发调整
+                chunk_failed = set(getattr(result, 'failed', ()))
             except Exception as e:
-                logger.error(f"处理股票 {stock} 时发生未预期的错误: {str(e)}")
-                print(f"处理股票 {stock} 时发生未预期的错误: {str(e)}")
-                results[stock] = None
+                logger.error(f"处理批次 {chunk[0]} 等 {len(chunk)} 只股票时发生未预期的错误: {str(e)}")
+                print(f"处理批次 {chunk[0]} 等 {len(chunk)} 只股票时发生未预期的错误: {str(e)}")
+                fetched.update({code: None for code in chunk})
+                chunk_failed = set(chunk)
+            failed_codes.update(chunk_failed)
+            failed = bool(chunk_failed)
+            progress.update(len(chunk))
+            return failed
+        
+        # 使用线程池执行器
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as executor:
+            if adaptive:
+                jobs = [(period, chunk) for chunk in chunks]
+                _download_chunks_adaptive(executor, jobs, start_date, end_date, adjustment, cache, min_threads,
+                                          max_threads, collect)
+            else:
+                # 提交所有批次
+                future_to_chunk = {
+                    executor.submit(download_stock_chunk, chunk, start_date, end_date, period, adjustment, cache): chunk
+                    for chunk in chunks
+                }
+                for future in concurrent.futures.as_completed(future_to_chunk):
+                    collect(period, future_to_chunk[future], future)
+    
+    # 按原始股票代码返回结果
+    results = FetchResults({stock: fetched.get(formatted_code) for stock, formatted_code in code_map.items()},
+                           failed=_report_failures(code_map, failed_codes, period))
     
     logger.info("所有股票数据下载完成")
-    return results
\ No newline at end of file
+    return results
+
+
+def _download_chunks_adaptive(executor, jobs, start_date, end_date, adjustment, cache, min_threads, max_threads,
+                              collect):
+    """
+    按AIMD控制器给出的并发数量逐步提交下载任务
+    
+    每个数据周期使用各自的控制器，分钟线和日线的耗时基准互不影响；多个周期共用线程池时，
+    所有周期的在途任务总数不超过max_threads。待提交的任务按jobs中的顺序（即优先级）提交。
+    
+    Args:
+        executor (ThreadPoolExecutor): 线程池，线程数为并发上限
+        jobs (list): 按执行顺序排列的(数据周期, 股票批次)任务列表
+        start_date (str): 开始日期
+        end_date (str): 结束日期
+        adjustment (str): 复权方式
+        cache (BarCache): K线本地缓存
+        min_threads (int): 并发下限
+        max_threads (int): 并发上限
+        collect (callable): 合并任务结果的函数，参数为(数据周期, 股票批次, future)，返回该任务是否失败
+        
+    Returns:
+        dict: 数据周期到并发控制器的映射，控制器包含最终稳定的并发数量
+    """
+    from stock_backtester.feeds.resilience import AdaptiveConcurrency
+    
+    controllers = {}
+    for period, _ in jobs:
+        if period not in controllers:
+            controllers[period] = AdaptiveConcurrency(min_threads, max_threads)
+    pending = list(jobs)
+    in_flight = {}
+    running = {period: 0 for period in controllers}
+    while pending or in_flight:
+        # 在途任务少于所属周期的当前并发时按优先级顺序补充提交
+        remaining = []
+        for period, chunk in pending:
+            if len(in_flight) < max_threads and running[period] < controllers[period].limit:
+                future = executor.submit(download_stock_chunk, chunk, start_date, end_date, period, adjustment, cache)
+                in_flight[future] = (period, chunk, time.monotonic())
+                running[period] += 1
+            else:
+                remaining.append((period, chunk))
+        pending = remaining
+        
+        done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            period, chunk, submitted = in_flight.pop(future)
+            running[period] -= 1
+            failed = collect(period, chunk, future)
+            controllers[period].record(time.monotonic() - submitted, len(chunk), failed)
+    
+    for period, controller in controllers.items():
+        logger.info(f"{period} 周期自适应并发稳定在 {controller.limit} (范围 {controller.min_limit}-{controller.max_limit}, "
+                    f"成功 {controller.successes} 批, 失败 {controller.errors} 批)")
+        print(f"{period} 周期自适应并发稳定在 {controller.limit}")
+    return controllers
+
+
+def schedule_download_jobs(chunks_by_period, priority_periods=None):
+    """
+    生成多周期下载任务的执行顺序
+    
+    优先周期按priority_periods中的顺序排在前面，其余周期排在最后；优先级相同的周期之间按批次轮流排列，
+    使慢的分钟线批次与快的日线批次在同一个线程池中交替执行。
+    
+    Args:
+        chunks_by_period (dict): 数据周期到股票批次列表的映射
+        priority_periods (list): 优先下载的数据周期，如当前筛选链需要的周期
+        
+    Returns:
+        list: 按执行顺序排列的(数据周期, 股票批次)任务列表
+    """
+    priority_periods = [period for period in (priority_periods or []) if period in chunks_by_period]
+    
+    def rank(period):
+        return priority_periods.index(period) if period in priority_periods else len(priority_periods)
+    
+    # 排序键: (周期优先级, 批次序号, 周期原始顺序)，同优先级的周期按批次轮流
+    jobs = [(rank(period), index, order, period, chunk)
+            for order, (period, chunks) in enumerate(chunks_by_period.items())
+            for index, chunk in enumerate(chunks)]
+    jobs.sort(key=lambda job: job[:3])
+    return [(period, chunk) for _, _, _, period, chunk in jobs]
+
+
+def download_all_periods(stock_list, start_date, end_date, periods, adjustment='pre', max_threads=4, cache=None,
+                         batch_size=500, priority_periods=None, adaptive=False, min_threads=1,
+                         cache_only_periods=None):
+    """
+    在一个线程池中下载所有股票所有周期的数据
+    
+    每个(数据周期, 股票批次)是一个下载任务，全部周期的任务按schedule_download_jobs给出的优先级顺序
+    提交到同一个线程池，线程池不会在周期之间排空再重新填满，慢的分钟线任务可以与快的日线任务重叠执行，
+    所有任务共用一个进度条。开启adaptive时每个周期的在途任务数量由各自的AIMD控制器动态调整。
+    配置了缓存时，cache_only_periods中的周期（如数据量大的分钟线）每批写入缓存后即丢弃数据，
+    结果中只记录每只股票是否有数据，之后从缓存构建内存映射存储，峰值内存只包含在途的批次。
+    
+    Args:
+        stock_list (list): 股票代码列表
+        start_date (str): 开始日期
+        end_date (str): 结束日期
+        periods (list): 数据周期列表
+        adjustment (str): 复权方式
+        max_threads (int): 最大线程数
+        cache (BarCache): K线本地缓存，为None时直接从数据源下载
+        batch_size (int): 每批股票数量的上限
+        priority_periods (list): 优先下载的数据周期，如当前筛选链需要的周期
+        adaptive (bool): 是否自适应调整并发数量，max_threads为并发上限
+        min_threads (int): 自适应调整时每个周期的并发下限
+        cache_only_periods (list): 只写入缓存、不在结果中保留数据的周期，未配置缓存时忽略
+        
+    Returns:
+        dict: 数据周期到FetchResults(股票代码到数据的映射)的映射，每个周期的股票顺序与stock_list一致，
+              下载失败的股票记录在各周期结果的failed中；cache_only_periods中的周期有数据的股票对应True
+    """
+    from stock_backtester.feeds.xtquant_feed import estimate_chunk_size
+    
+    periods = list(dict.fromkeys(periods))
+    logger.info(f"开始多周期并发下载，股票数量: {len(stock_list)}, 周期: {periods}, 最大线程数: {max_threads}")
+    
+    code_map, formatted_codes = _format_stock_list(stock_list)
+    
+    # 每个周期按各自的内存上限切分批次
+    chunks_by_period = {}
+    for period in periods:
+        chunk_size = estimate_chunk_size(start_date, end_date, period, batch_size)
+        chunks_by_period[period] = [formatted_codes[i:i + chunk_size]
+                                    for i in range(0, len(formatted_codes), chunk_size)]
+    jobs = schedule_download_jobs(chunks_by_period, priority_periods)
+    logger.info(f"下载任务数量: {len(jobs)}, 执行顺序中的周期优先级: {list(dict.fromkeys(p for p, _ in jobs))}")
+    
+    cache_only = set(cache_only_periods or []) if cache is not None else set()
+    if cache_only:
+        logger.info(f"{sorted(cache_only)} 周期的数据只写入缓存，不在内存中保留")
+    
+    fetched = {period: {} for period in periods}
+    failed_codes = {period: set() for period in periods}
+    with tqdm(total=len(formatted_codes) * len(periods), desc="下载进度") as progress:
+        def collect(period, chunk, future):
+            """合并一个任务的结果，返回该任务是否失败"""
+            try:
+                result = future.result()
+                if period in cache_only:
+                    # 数据已写入缓存，丢弃本批数据，只记录是否有数据
+                    fetched[period].update({code: True if data is not None else None for code, data in result.items()})
+                else:
+                    fetched[period].update(result)
+                logger.debug(f"{period} 周期批次 {chunk[0]} 等 {len(chunk)} 只股票数据处理完成")
+                chunk_failed = set(getattr(result, 'failed', ()))
+            except Exception as e:
+                logger.error(f"处理 {period} 周期批次 {chunk[0]} 等 {len(chunk)} 只股票时发生未预期的错误: {str(e)}")
+                print(f"处理 {period} 周期批次 {chunk[0]} 等 {len(chunk)} 只股票时发生未预期的错误: {str(e)}")
+                fetched[period].update({code: None for code in chunk})
+                chunk_failed = set(chunk)
+            failed_codes[period].update(chunk_failed)
+            failed = bool(chunk_failed)
+            progress.update(len(chunk))
+            return failed
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as executor:
+            if adaptive:
+                _download_chunks_adaptive(executor, jobs, start_date, end_date, adjustment, cache, min_threads,
+                                          max_threads, collect)
+            else:
+                # 线程池按提交顺序执行，提交顺序即优先级顺序
+                future_to_job = {
+                    executor.submit(download_stock_chunk, chunk, start_date, end_date, period, adjustment, cache):
+                        (period, chunk)
+                    for period, chunk in jobs
+                }
+                for future in concurrent.futures.as_completed(future_to_job):
+                    period, chunk = future_to_job[future]
+                    collect(period, chunk, future)
+    
+    # 按原始股票代码返回结果
+    results = {period: FetchResults({stock: fetched[period].get(formatted_code)
+                                     for stock, formatted_code in code_map.items()},
+                                    failed=_report_failures(code_map, failed_codes[period], period))
+               for period in periods}
+    
+    logger.info("所有周期的股票数据下载完成")
+    return results
+
+
+async def download_all_stocks_async(stock_list, start_date, end_date, periods='1d', adjustment='pre',
+                                    max_concurrency=4, cache=None):
+    """
+    异步下载所有股票的数据，按完成顺序逐个产出结果
+    
+    每个(股票, 周期)是一个下载任务，同时进行的任务数量由信号量限制；阻塞的xtquant调用在线程池中执行，
+    不阻塞事件循环，调用方可以在下载的同时计算指标或处理其他请求。提前结束迭代时取消尚未开始的任务。
+    
+    Args:
+        stock_list (list): 股票代码列表
+        start_date (str): 开始日期
+        end_date (str): 结束日期
+        periods (str | list): 数据周期，或数据周期列表
+        adjustment (str): 复权方式
+        max_concurrency (int): 同时进行的下载任务数量上限
+        cache (BarCache): K线本地缓存，为None时直接从数据源下载
+        
+    Yields:
+        tuple: (股票代码, 数据周期, 股票数据)，无数据时股票数据为None；
+            下载失败时为抛出的异常对象（如FeedError），与无数据区分
+    """
+    periods = [periods] if isinstance(periods, str) else list(periods)
+    jobs = [(stock, period) for period in periods for stock in stock_list]
+    logger.info(f"开始异步下载股票数据，任务数量: {len(jobs)}, 最大并发数: {max_concurrency}")
+    
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency)
+    
+    async def fetch(stock, period):
+        """在信号量限制下于线程池中下载一只股票一个周期的数据"""
+        async with semaphore:
+            call = functools.partial(download_single_stock, stock, start_date, end_date, period, adjustment, cache)
+            try:
+                data = await loop.run_in_executor(executor, call)
+            except Exception as e:
+                return stock, period, e
+        if not isinstance(data, pd.DataFrame) or data.empty:
+            data = None
+        return stock, period, data
+    
+    tasks = [asyncio.ensure_future(fetch(stock, period)) for stock, period in jobs]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+        logger.info("异步下载全部完成")
+    finally:
+        # 调用方提前结束迭代时取消剩余任务，已在线程中执行的下载会继续完成
+        for task in tasks:
+            task.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def refresh_all_stocks(stock_list, cache, period='1d', adjustment='pre', max_threads=4, end_date=None, batch_size=500):
+    """
+    增量刷新所有股票的缓存数据
+    
+    已有缓存的股票只下载最后一条已缓存K线之后的数据并追加到缓存，历史数据因除权除息
+    发生变化时自动整体重新获取；没有缓存的股票按默认时间范围完整下载。
+    
+    Args:
+        stock_list (list): 股票代码列表
+        cache (BarCache): K线本地缓存
+        period (str): 数据周期
+        adjustment (str): 复权方式
+        max_threads (int): 最大线程数
+        end_date (str): 刷新截止日期，格式为YYYY-MM-DD，默认为今天
+        batch_size (int): 每批股票数量的上限
+        
+    Returns:
+        dict: 股票代码到本次新增数据的映射，顺序与stock_list一致
+    """
+    from stock_backtester.feeds.xtquant_feed import format_stock_code, download_stock_data_batch
+    
+    if end_date is None:
+        end_date = datetime.date.today().strftime('%Y-%m-%d')
+    logger.info(f"开始增量刷新所有股票数据，股票数量: {len(stock_list)}, 周期: {period}, 截止日期: {end_date}")
+    
+    code_map = {stock: format_stock_code(stock) for stock in stock_list}
+    formatted_codes = list(dict.fromkeys(code for code in code_map.values() if code is not None))
+    chunks = [formatted_codes[i:i + batch_size] for i in range(0, len(formatted_codes), batch_size)]
+    
+    incremental_fetcher = functools.partial(download_stock_data_batch, chunk_size=batch_size, incrementally=True)
+    full_start_date, _ = calculate_time_range(None, end_date)
+    
+    def refresh_chunk(chunk):
+        """刷新一批股票，没有缓存的股票按默认时间范围完整下载"""
+        refreshed = cache.refresh_many(chunk, end_date, period, adjustment, incremental_fetcher)
+        uncached = [code for code in chunk if cache.last_bar(code, period, adjustment) is None]
+        if uncached:
+            logger.info(f"{len(uncached)} 只股票没有缓存，按默认时间范围完整下载")
+            refreshed.update(cache.get_or_fetch_many(uncached, full_start_date, end_date, period, adjustment,
+                                                     download_stock_data_batch))
+        return refreshed
+    
+    fetched = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as executor:
+        future_to_chunk = {executor.submit(refresh_chunk, chunk): chunk for chunk in chunks}
+        with tqdm(total=len(formatted_codes), desc="刷新进度") as progress:
+            for future in concurrent.futures.as_completed(future_to_chunk):
+                chunk = future_to_chunk[future]
+                try:
+                    fetched.update(future.result())
+                except Exception as e:
+                    logger.error(f"刷新批次 {chunk[0]} 等 {len(chunk)} 只股票时发生未预期的错误: {str(e)}")
+                    print(f"刷新批次 {chunk[0]} 等 {len(chunk)} 只股票时发生未预期的错误: {str(e)}")
+                    fetched.update({code: None for code in chunk})
+                progress.update(len(chunk))
+    
+    results = {stock: fetched.get(formatted_code) for stock, formatted_code in code_map.items()}
+    new_bars = sum(len(data) for data in results.values() if data is not None)
+    logger.info(f"增量刷新完成，共新增 {new_bars} 条K线")
+    return results
@@ -0,0 +1,433 @@
+"""
+K线本地缓存模块，按(周期, 复权方式, 股票代码)分区将K线数据以列式格式持久化到磁盘
+"""
+import os
+import json
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+from .resilience import FetchResults
+from ..logger import get_logger
+
+# 获取日志记录器
+logger = get_logger(__name__)
+
+# 缓存中保存的K线字段，每个字段单独存储为一个.npy文件
+BAR_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume', 'amount']
+
+# 分区元数据文件名
+META_FILE = 'meta.json'
+
+# A股收盘时间，收盘后当日数据视为完整
+MARKET_CLOSE_TIME = datetime.time(15, 30)
+
+# 增量刷新时判断历史数据是否因除权除息发生变化的相对误差阈值
+ADJUSTMENT_TOLERANCE = 1e-6
+
+
+def _parse_date(date_str):
+    """将YYYY-MM-DD格式的字符串转换为date对象"""
+    return datetime.datetime.strptime(date_str, '%Y-%m-%d').date()
+
+
+def _format_date(date_obj):
+    """将date对象转换为YYYY-MM-DD格式的字符串"""
+    return date_obj.strftime('%Y-%m-%d')
+
+
+def _empty_bars():
+    """构建没有K线的数据，字段类型与缓存文件一致"""
+    data = pd.DataFrame({column: np.array([], dtype=float) for column in BAR_COLUMNS})
+    data['date'] = np.array([], dtype='datetime64[ns]')
+    return data
+
+
+def _complete_through():
+    """获取数据已完整的最后一个日期，当日收盘前的数据可能还会变化"""
+    now = datetime.datetime.now()
+    if now.time() >= MARKET_CLOSE_TIME:
+        return now.date()
+    return now.date() - datetime.timedelta(days=1)
+
+
+class BarCache:
+    """
+    持久化的K线缓存
+
+    目录结构为 root_dir/<period>/<adjustment>/<stock_code>/，每个分区下每个字段
+    保存为一个独立的.npy文件，meta.json记录该分区已完整覆盖的日期范围。
+    读取时只为未覆盖的头部/尾部区间调用数据源，其余部分直接从磁盘返回。
+    """
+
+    def __init__(self, root_dir):
+        """
+        初始化K线缓存
+
+        Args:
+            root_dir (str): 缓存根目录
+        """
+        self.root_dir = root_dir
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+        logger.debug(f"初始化K线缓存，缓存目录: {root_dir}")
+
+    def _partition_dir(self, stock_code, period, adjustment):
+        """获取分区目录路径"""
+        return os.path.join(self.root_dir, period, adjustment, stock_code)
+
+    def _lock_for(self, stock_code, period, adjustment):
+        """获取分区级别的锁，保证同一分区的读-合并-写过程串行执行"""
+        key = (stock_code, period, adjustment)
+        with self._locks_guard:
+            if key not in self._locks:
+                self._locks[key] = threading.RLock()
+            return self._locks[key]
+
+    def coverage(self, stock_code, period='1d', adjustment='pre'):
+        """
+        获取分区已覆盖的日期范围
+
+        Args:
+            stock_code (str): 股票代码，格式为 '600000.SH'
+            period (str): 数据周期
+            adjustment (str): 复权方式
+
+        Returns:
+            tuple: (start_date, end_date) 格式为YYYY-MM-DD，没有缓存时返回None
+        """
+        meta = self._read_meta(stock_code, period, adjustment)
+        if not meta.get('start') or not meta.get('end'):
+            return None
+        return meta['start'], meta['end']
+
+    def _read_meta(self, stock_code, period, adjustment):
+        """读取分区元数据，不存在或损坏时返回空字典"""
+        meta_path = os.path.join(self._partition_dir(stock_code, period, adjustment), META_FILE)
+        if not os.path.exists(meta_path):
+            return {}
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取缓存元数据失败，视为无缓存: {meta_path}, {str(e)}")
+            return {}
+
+    def last_bar(self, stock_code, period='1d', adjustment='pre'):
+        """
+        获取分区中最后一条K线的时间，即增量刷新的水位线
+
+        Args:
+            stock_code (str): 股票代码，格式为 '600000.SH'
+            period (str): 数据周期
+            adjustment (str): 复权方式
+
+        Returns:
+            pandas.Timestamp: 已覆盖范围内最后一条K线的时间，没有缓存时返回None
+        """
+        last_bar = self._read_meta(stock_code, period, adjustment).get('last_bar')
+        if last_bar:
+            return pd.Timestamp(last_bar)
+        # 元数据中没有记录水位线时，从已缓存的数据中读取，不计入覆盖范围之后尚未收盘的K线
+        data = self.load(stock_code, period, adjustment)
+        covered = self.coverage(stock_code, period, adjustment)
+        if data is None or data.empty or covered is None:
+            return None
+        dates = data['date'][data['date'] < pd.Timestamp(covered[1]) + pd.Timedelta(days=1)]
+        return pd.Timestamp(dates.iloc[-1]) if not dates.empty else None
+
+    def load(self, stock_code, period='1d', adjustment='pre'):
+        """
+        读取分区中全部已缓存的K线数据
+
+        Args:
+            stock_code (str): 股票代码，格式为 '600000.SH'
+            period (str): 数据周期
+            adjustment (str): 复权方式
+
+        Returns:
+            pandas.DataFrame: 已缓存的K线数据，没有缓存时返回None
+        """
+        partition_dir = self._partition_dir(stock_code, period, adjustment)
+        columns = {}
+        for column in BAR_COLUMNS:
+            column_path = os.path.join(partition_dir, f'{column}.npy')
+            if not os.path.exists(column_path):
+                return None
+            columns[column] = np.load(column_path, allow_pickle=False)
+        return pd.DataFrame(columns)
+
+    def missing_ranges(self, stock_code, start_date, end_date, period='1d', adjustment='pre'):
+        """
+        计算请求范围中缓存尚未覆盖的区间
+
+        Args:
+            stock_code (str): 股票代码，格式为 '600000.SH'
+            start_date (str): 开始日期，格式为YYYY-MM-DD
+            end_date (str): 结束日期，格式为YYYY-MM-DD
+            period (str): 数据周期
+            adjustment (str): 复权方式
+
+        Returns:
+            list: 需要从数据源获取的 (start_date, end_date) 区间列表
+        """
+        covered = self.coverage(stock_code, period, adjustment)
+        if covered is None:
+            return [(start_date, end_date)]
+
+        start, end = _parse_date(start_date), _parse_date(end_date)
+        covered_start, covered_end = _parse_date(covered[0]), _parse_date(covered[1])
+
+        # 请求范围与已覆盖范围不相交时，缺口也一并获取，保证覆盖范围始终连续
+        ranges = []
+        if start < covered_start:
+            ranges.append((start_date, _format_date(covered_start - datetime.timedelta(days=1))))
+        if end > covered_end:
+            ranges.append((_format_date(covered_end + datetime.timedelta(days=1)), end_date))
+        return ranges
+
+    def store(self, stock_code, data, start_date, end_date, period='1d', adjustment='pre', replace=False):
+        """
+        将新获取的K线数据合并写入缓存，并扩展已覆盖的日期范围
+
+        Args:
+            stock_code (str): 股票代码，格式为 '600000.SH'
+            data (pandas.DataFrame): 新获取的K线数据，为None或为空时只扩展覆盖范围（如区间内全是节假日）
+            start_date (str): 本次获取的开始日期，格式为YYYY-MM-DD
+            end_date (str): 本次获取的结束日期，格式为YYYY-MM-DD
+            period (str): 数据周期
+            adjustment (str): 复权方式
+            replace (bool): 是否丢弃已缓存的数据和覆盖范围，用新数据整体替换
+        """
+        if data is None or data.empty:
+            data = _empty_bars()
+        with self._lock_for(stock_code, period, adjustment):
+            existing = None if replace else self.load(stock_code, period, adjustment)
+            frames = [df for df in (existing, data[BAR_COLUMNS]) if df is not None and not df.empty]
+            merged = pd.concat(frames, ignore_index=True) if frames else data[BAR_COLUMNS]
+            merged['date'] = pd.to_datetime(merged['date'])
+            # 同一时间的K线以新获取的数据为准
+            merged = merged.drop_duplicates(subset='date', keep='last').sort_values('date').reset_index(drop=True)
+
+            # 当日数据可能尚未收盘，不计入已覆盖范围，下次请求时重新获取
+            start = _parse_date(start_date)
+            end = min(_parse_date(end_date), _complete_through())
+            covered = None if replace else self.coverage(stock_code, period, adjustment)
+            if covered is not None:
+                start = min(start, _parse_date(covered[0]))
+                end = max(end, _parse_date(covered[1]))
+            meta = {'start': _format_date(start), 'end': _format_date(end)} if start <= end else {}
+            meta['rows'] = len(merged)
+            # 水位线只取已覆盖范围内的最后一条K线，当日未收盘的K线之后还会变化，不能作为增量刷新的起点
+            complete = merged['date'] < pd.Timestamp(end + datetime.timedelta(days=1)) if 'end' in meta else None
+            if complete is not None and complete.any():
+                meta['last_bar'] = merged['date'][complete].iloc[-1].isoformat()
+
+            self._write_partition(stock_code, merged, meta, period, adjustment)
+            logger.debug(f"缓存写入完成: {stock_code} {period} {adjustment}, 覆盖范围: {meta.get('start')} - {meta.get('end')}, 共 {len(merged)} 条记录")
+
+    def _write_partition(self, stock_code, data, meta, period, adjustment):
+        """将分区数据逐列写入磁盘，先写临时文件再替换，最后写入元数据"""
+        partition_dir = self._partition_dir(stock_code, period, adjustment)
+        os.makedirs(partition_dir, exist_ok=True)
+        for column in BAR_COLUMNS:
+            values = data[column].to_numpy()
+            if column == 'date':
+                values = values.astype('datetime64[ns]')
+            column_path = os.path.join(partition_dir, f'{column}.npy')
+            tmp_path = column_path + '.tmp'
+            with open(tmp_path, 'wb') as file:
+                np.save(file, values, allow_pickle=False)
+            os.replace(tmp_path, column_path)
+
+        meta_path = os.path.join(partition_dir, META_FILE)
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+        os.replace(tmp_path, meta_path)
+
+    def get(self, stock_code, start_date, end_date, period='1d', adjustment='pre'):
+        """
+        从缓存中读取指定日期范围的K线数据
+
+        Args:
+            stock_code (str): 股票代码，格式为 '600000.SH'
+            start_date (str): 开始日期，格式为YYYY-MM-DD
+            end_date (str): 结束日期，格式为YYYY-MM-DD
+            period (str): 数据周期
+            adjustment (str): 复权方式
+
+        Returns:
+            pandas.DataFrame: 指定范围内的K线数据，没有数据时返回None
+        """
+        data = self.load(stock_code, period, adjustment)
+        if data is None or data.empty:
+            return None
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+        result = data[(data['date'] >= start) & (data['date'] < end)].reset_index(drop=True)
+        if result.empty:
+            return None
+        return result
+
+    def get_or_fetch(self, stock_code, start_date, end_date, period='1d', adjustment='pre', fetcher=None):
+        """
+        读取指定日期范围的K线数据，只为缓存未覆盖的区间调用数据源
+
+        Args:
+            stock_code (str): 股票代码，格式为 '600000.SH'
+            start_date (str): 开始日期，格式为YYYY-MM-DD
+            end_date (str): 结束日期，格式为YYYY-MM-DD
+            period (str): 数据周期
+            adjustment (str): 复权方式
+            fetcher (callable): 数据源函数，签名与download_stock_data一致，下载失败时应抛出异常
+
+        Returns:
+            pandas.DataFrame: 指定范围内的K线数据，没有数据时返回None
+        """
+        if fetcher is None:
+            from .xtquant_feed import download_stock_data
+            fetcher = download_stock_data
+
+        with self._lock_for(stock_code, period, adjustment):
+            ranges = self.missing_ranges(stock_code, start_date, end_date, period, adjustment)
+            if not ranges:
+                logger.debug(f"缓存命中: {stock_code} {period} {adjustment} {start_date} - {end_date}")
+            for range_start, range_end in ranges:
+                logger.debug(f"缓存未覆盖区间，从数据源获取: {stock_code} {period} {range_start} - {range_end}")
+                # 下载失败时数据源抛出异常，覆盖范围不变；成功但没有数据（如全是节假日）的区间同样记为已覆盖
+                data = fetcher(stock_code, range_start, range_end, period, adjustment)
+                self.store(stock_code, data, range_start, range_end, period, adjustment)
+            return self.get(stock_code, start_date, end_date, period, adjustment)
+
+    def get_or_fetch_many(self, stock_codes, start_date, end_date, period='1d', adjustment='pre', batch_fetcher=None):
+        """
+        批量读取多只股票指定日期范围的K线数据，缺失区间相同的股票合并为一次批量请求
+
+        Args:
+            stock_codes (list): 股票代码列表，格式为 '600000.SH'
+            start_date (str): 开始日期，格式为YYYY-MM-DD
+            end_date (str): 结束日期，格式为YYYY-MM-DD
+            period (str): 数据周期
+            adjustment (str): 复权方式
+            batch_fetcher (callable): 批量数据源函数，签名与download_stock_data_batch一致
+
+        Returns:
+            FetchResults: 股票代码到K线数据的映射，没有数据的股票对应None，数据源下载失败的股票记录在failed中
+        """
+        if batch_fetcher is None:
+            from .xtquant_feed import download_stock_data_batch
+            batch_fetcher = download_stock_data_batch
+
+        # 按缺失区间对股票分组
+        groups = {}
+        for stock_code in stock_codes:
+            for missing_range in self.missing_ranges(stock_code, start_date, end_date, period, adjustment):
+                groups.setdefault(missing_range, []).append(stock_code)
+        logger.debug(f"批量读取缓存: {len(stock_codes)} 只股票, 需要获取的区间组数: {len(groups)}")
+
+        failed = set()
+        for (range_start, range_end), codes in groups.items():
+            fetched = batch_fetcher(codes, range_start, range_end, period, adjustment)
+            range_failed = set(getattr(fetched, 'failed', ())) | {code for code in codes if code not in fetched}
+            failed.update(range_failed)
+            for stock_code in codes:
+                # 下载失败的区间不记为已覆盖，成功但没有数据的区间同样记为已覆盖
+                if stock_code not in range_failed:
+                    self.store(stock_code, fetched[stock_code], range_start, range_end, period, adjustment)
+
+        return FetchResults({
+            stock_code: self.get(stock_code, start_date, end_date, period, adjustment)
+            for stock_code in stock_codes
+        }, failed=failed)
+
+    def refresh_many(self, stock_codes, end_date, period='1d', adjustment='pre', batch_fetcher=None):
+        """
+        增量刷新多只股票的缓存，只下载水位线之后的新K线并追加到缓存
+
+        每只股票从最后一条已缓存K线所在日期开始获取，重叠部分用于校验历史数据：
+        如果重叠K线的价格与缓存不一致，说明发生了除权除息等导致历史数据变化的事件，
+        此时对该股票的整个已覆盖范围重新完整获取。
+
+        Args:
+            stock_codes (list): 股票代码列表，格式为 '600000.SH'
+            end_date (str): 刷新截止日期，格式为YYYY-MM-DD
+            period (str): 数据周期
+            adjustment (str): 复权方式
+            batch_fetcher (callable): 批量数据源函数，签名与download_stock_data_batch一致
+
+        Returns:
+            dict: 股票代码到本次新增K线数据的映射；整体重新获取时为全部数据；
+                  没有缓存或获取失败的股票对应None
+        """
+        if batch_fetcher is None:
+            from .xtquant_feed import download_stock_data_batch
+            batch_fetcher = download_stock_data_batch
+
+        results = {stock_code: None for stock_code in stock_codes}
+
+        # 按水位线所在日期对股票分组，同一组只需一次批量请求
+        groups = {}
+        for stock_code in stock_codes:
+            watermark = self.last_bar(stock_code, period, adjustment)
+            if watermark is None:
+                logger.debug(f"股票 {stock_code} 没有缓存，跳过增量刷新")
+                continue
+            groups.setdefault(_format_date(watermark.date()), []).append(stock_code)
+
+        invalidated = []
+        for range_start, codes in groups.items():
+            if range_start > end_date:
+                continue
+            fetched = batch_fetcher(codes, range_start, end_date, period, adjustment)
+            for stock_code in codes:
+                data = fetched.get(stock_code)
+                if data is None or data.empty:
+                    continue
+                with self._lock_for(stock_code, period, adjustment):
+                    existing = self.load(stock_code, period, adjustment)
+                    watermark = self.last_bar(stock_code, period, adjustment)
+                    covered = self.coverage(stock_code, period, adjustment)
+                    if self._history_changed(existing, data, covered[1] if covered is not None else None):
+                        invalidated.append(stock_code)
+                        continue
+                    self.store(stock_code, data, range_start, end_date, period, adjustment)
+                results[stock_code] = data[pd.to_datetime(data['date']) > watermark].reset_index(drop=True)
+
+        if invalidated:
+            logger.info(f"{len(invalidated)} 只股票的历史数据发生变化（除权除息），重新完整获取")
+        for stock_code in invalidated:
+            covered = self.coverage(stock_code, period, adjustment)
+            range_start = covered[0] if covered is not None else end_date
+            data = batch_fetcher([stock_code], range_start, end_date, period, adjustment).get(stock_code)
+            if data is not None and not data.empty:
+                self.store(stock_code, data, range_start, end_date, period, adjustment, replace=True)
+                results[stock_code] = data
+
+        refreshed = sum(1 for data in results.values() if data is not None)
+        logger.info(f"增量刷新完成: {period} {adjustment}, 成功 {refreshed} 只, 重新完整获取 {len(invalidated)} 只")
+        return results
+
+    @staticmethod
+    def _history_changed(existing, data, covered_end=None):
+        """
+        比较新获取的数据与缓存中时间重叠的K线，判断历史价格是否发生变化
+
+        只比较已覆盖范围内（covered_end及之前）的K线，之后的K线是盘中写入的未完成K线，收盘后价格不同属于正常情况。
+        """
+        if existing is None or existing.empty:
+            return False
+        if covered_end is not None:
+            existing = existing[existing['date'] < pd.Timestamp(covered_end) + pd.Timedelta(days=1)]
+        new_data = data[BAR_COLUMNS].copy()
+        new_data['date'] = pd.to_datetime(new_data['date'])
+        overlap = existing.merge(new_data, on='date', suffixes=('_cached', '_new'))
+        if overlap.empty:
+            return False
+        for column in ['open', 'high', 'low', 'close']:
+            cached = overlap[f'{column}_cached'].to_numpy(dtype=float)
+            new = overlap[f'{column}_new'].to_numpy(dtype=float)
+            if not np.allclose(cached, new, rtol=ADJUSTMENT_TOLERANCE, atol=0, equal_nan=True):
+                return True
+        return False
@@ -0,0 +1,207 @@
+"""
+内存映射的列式K线存储，将全市场的K线按字段保存为连续的数组文件
+
+每个字段（date, open, high, low, close, volume, amount）保存为一个二进制文件，
+所有股票的数据首尾相连，index.json记录每只股票在数组中的起始位置和长度。
+读取时通过numpy.memmap映射文件，按股票切片不复制数据，多个进程打开同一存储时共享页缓存。
+"""
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from ..logger import get_logger
+
+# 获取日志记录器
+logger = get_logger(__name__)
+
+# 存储的K线字段及其数据类型
+FIELD_DTYPES = {
+    'date': 'datetime64[ns]',
+    'open': 'float64',
+    'high': 'float64',
+    'low': 'float64',
+    'close': 'float64',
+    'volume': 'float64',
+    'amount': 'float64',
+}
+
+# 索引文件名
+INDEX_FILE = 'index.json'
+
+
+class MmapBarStore:
+    """内存映射的列式K线存储"""
+
+    def __init__(self, root_dir):
+        """
+        打开已构建的存储
+
+        Args:
+            root_dir (str): 存储目录
+        """
+        index_path = os.path.join(root_dir, INDEX_FILE)
+        if not os.path.exists(index_path):
+            logger.error(f"K线存储不存在: {root_dir}")
+            raise FileNotFoundError(f"K线存储不存在: {root_dir}")
+
+        with open(index_path, 'r', encoding='utf-8') as file:
+            index = json.load(file)
+
+        self.root_dir = root_dir
+        self.symbols = index['symbols']
+        self.offsets = np.asarray(index['offsets'], dtype=np.int64)
+        self.lengths = np.asarray(index['lengths'], dtype=np.int64)
+        self._positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self._arrays = {}
+        total = int(self.lengths.sum())
+        for field, dtype in index['fields'].items():
+            # 空文件无法映射，没有数据时使用空数组
+            if total == 0:
+                self._arrays[field] = np.empty(0, dtype=dtype)
+            else:
+                self._arrays[field] = np.memmap(os.path.join(root_dir, f'{field}.bin'), dtype=dtype, mode='r',
+                                                shape=(total,))
+        logger.debug(f"打开K线存储: {root_dir}, 股票数量: {len(self.symbols)}, K线总数: {total}")
+
+    @classmethod
+    def build(cls, root_dir, stock_data):
+        """
+        构建存储，逐只股票顺序写入，不需要在内存中同时持有全部数据
+
+        Args:
+            root_dir (str): 存储目录，已存在时整体替换
+            stock_data: 股票代码到K线数据的映射，或(股票代码, K线数据)的可迭代对象
+
+        Returns:
+            MmapBarStore: 构建完成并打开的存储
+        """
+        items = stock_data.items() if isinstance(stock_data, dict) else stock_data
+        tmp_dir = root_dir.rstrip(os.sep) + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        symbols, offsets, lengths = [], [], []
+        offset = 0
+        files = {field: open(os.path.join(tmp_dir, f'{field}.bin'), 'wb') for field in FIELD_DTYPES}
+        try:
+            for stock_code, data in items:
+                if not isinstance(data, pd.DataFrame) or data.empty:
+                    continue
+                data = data.sort_values('date')
+                for field, dtype in FIELD_DTYPES.items():
+                    values = np.ascontiguousarray(data[field].to_numpy().astype(dtype))
+                    files[field].write(values.tobytes())
+                symbols.append(stock_code)
+                offsets.append(offset)
+                lengths.append(len(data))
+                offset += len(data)
+        finally:
+            for file in files.values():
+                file.close()
+
+        index = {'symbols': symbols, 'offsets': offsets, 'lengths': lengths, 'fields': FIELD_DTYPES}
+        with open(os.path.join(tmp_dir, INDEX_FILE), 'w', encoding='utf-8') as file:
+            json.dump(index, file)
+
+        shutil.rmtree(root_dir, ignore_errors=True)
+        os.replace(tmp_dir, root_dir)
+        logger.info(f"K线存储构建完成: {root_dir}, 股票数量: {len(symbols)}, K线总数: {offset}")
+        return cls(root_dir)
+
+    @classmethod
+    def build_from_cache(cls, root_dir, cache, stock_codes, start_date=None, end_date=None, period='1m',
+                         adjustment='pre'):
+        """
+        由K线本地缓存构建存储，每次只读取一只股票
+
+        Args:
+            root_dir (str): 存储目录
+            cache (BarCache): K线本地缓存
+            stock_codes (list): 股票代码列表，格式为 '600000.SH'
+            start_date (str): 开始日期，为None时使用全部缓存数据
+            end_date (str): 结束日期，为None时使用全部缓存数据
+            period (str): 数据周期
+            adjustment (str): 复权方式
+
+        Returns:
+            MmapBarStore: 构建完成并打开的存储
+        """
+        def iter_cached():
+            for stock_code in stock_codes:
+                if start_date is None or end_date is None:
+                    yield stock_code, cache.load(stock_code, period, adjustment)
+                else:
+                    yield stock_code, cache.get(stock_code, start_date, end_date, period, adjustment)
+
+        return cls.build(root_dir, iter_cached())
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, stock_code):
+        return stock_code in self._positions
+
+    @property
+    def fields(self):
+        """存储中的字段列表"""
+        return list(self._arrays)
+
+    def field(self, name):
+        """
+        获取全市场某个字段的连续数组
+
+        Args:
+            name (str): 字段名
+
+        Returns:
+            numpy.ndarray: 内存映射的只读数组
+        """
+        return self._arrays[name]
+
+    def get_arrays(self, stock_code, fields=None, start_date=None, end_date=None):
+        """
+        获取单只股票的字段数组，返回的是内存映射数组的切片，不复制数据
+
+        Args:
+            stock_code (str): 股票代码
+            fields (list): 字段列表，默认为全部字段
+            start_date (str): 开始日期，格式为YYYY-MM-DD，为None时不限制
+            end_date (str): 结束日期，格式为YYYY-MM-DD，为None时不限制
+
+        Returns:
+            dict: 字段名到数组的映射，股票不存在时返回None
+        """
+        position = self._positions.get(stock_code)
+        if position is None:
+            return None
+        start = int(self.offsets[position])
+        stop = start + int(self.lengths[position])
+
+        # 每只股票的数据按时间排序，用二分查找定位日期范围
+        if start_date is not None or end_date is not None:
+            dates = self._arrays['date'][start:stop]
+            if start_date is not None:
+                start += int(np.searchsorted(dates, np.datetime64(start_date, 'ns'), side='left'))
+            if end_date is not None:
+                end_bound = np.datetime64(end_date, 'D') + np.timedelta64(1, 'D')
+                stop = int(self.offsets[position]) + int(np.searchsorted(dates, end_bound.astype('datetime64[ns]'),
+                                                                         side='left'))
+        return {name: self._arrays[name][start:stop] for name in (fields or self._arrays)}
+
+    def get(self, stock_code, start_date=None, end_date=None):
+        """
+        获取单只股票的K线数据
+
+        Args:
+            stock_code (str): 股票代码
+            start_date (str): 开始日期，格式为YYYY-MM-DD，为None时不限制
+            end_date (str): 结束日期，格式为YYYY-MM-DD，为None时不限制
+
+        Returns:
+            pd.DataFrame: K线数据，股票不存在或范围内没有数据时返回None
+        """
+        arrays = self.get_arrays(stock_code, start_date=start_date, end_date=end_date)
+        if arrays is None or len(arrays['date']) == 0:
+            return None
+        return pd.DataFrame(arrays)
@@ -0,0 +1,144 @@
+"""
+K线周期合成模块，在本地由基础周期K线合成更高周期的K线
+
+与QMT的合成规则一致：分钟级合成周期由1m/5m合成，日线以上周期由日线合成。
+分钟K线的时间为该K线的结束时间（如09:31的1分钟K线对应09:30-09:31），
+合成时按A股交易时段（09:30-11:30, 13:00-15:00）切分，跨越午休的K线不会被合并。
+"""
+import numpy as np
+import pandas as pd
+from ..logger import get_logger
+
+# 获取日志记录器
+logger = get_logger(__name__)
+
+# 合成周期对应的基础周期
+DERIVED_PERIODS = {
+    '3m': '1m',
+    '10m': '5m',
+    '15m': '5m',
+    '30m': '5m',
+    '60m': '5m',
+    '1h': '5m',
+    '2h': '5m',
+    '1w': '1d',
+    '1mon': '1d',
+}
+
+# 分钟级周期对应的分钟数
+PERIOD_MINUTES = {'1m': 1, '3m': 3, '5m': 5, '10m': 10, '15m': 15, '30m': 30, '60m': 60, '1h': 60, '2h': 120}
+
+# 上午开盘时间 09:30、上午收盘时间 11:30、下午开盘时间 13:00（单位：当日分钟数）
+MORNING_OPEN = 9 * 60 + 30
+MORNING_CLOSE = 11 * 60 + 30
+AFTERNOON_OPEN = 13 * 60
+
+# 上午交易时段分钟数和全天交易分钟数
+MORNING_MINUTES = MORNING_CLOSE - MORNING_OPEN
+TRADING_MINUTES = 240
+
+# K线字段的合成方式
+AGGREGATIONS = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'volume': 'sum',
+    'amount': 'sum',
+}
+
+
+def base_period(period):
+    """
+    获取周期对应的基础周期
+
+    Args:
+        period (str): 数据周期
+
+    Returns:
+        str: 基础周期，本身就是基础周期时原样返回
+    """
+    return DERIVED_PERIODS.get(period, period)
+
+
+def is_derived_period(period):
+    """
+    判断周期是否可以由基础周期在本地合成
+
+    Args:
+        period (str): 数据周期
+
+    Returns:
+        bool: 是否为合成周期
+    """
+    return period in DERIVED_PERIODS
+
+
+def _minute_labels(dates, minutes):
+    """计算每根分钟K线所属的合成K线的结束时间"""
+    clock = (dates.dt.hour * 60 + dates.dt.minute).to_numpy()
+
+    # 换算为当日第几个交易分钟（1-240），集合竞价等时段外的K线并入最近的交易时段
+    trading_minute = np.where(clock <= MORNING_CLOSE,
+                              clock - MORNING_OPEN,
+                              clock - AFTERNOON_OPEN + MORNING_MINUTES)
+    trading_minute = np.clip(trading_minute, 1, TRADING_MINUTES)
+
+    # 向上取整到合成周期的整数倍，得到合成K线结束时的交易分钟
+    end_minute = np.minimum(np.ceil(trading_minute / minutes) * minutes, TRADING_MINUTES)
+    end_clock = np.where(end_minute <= MORNING_MINUTES,
+                         MORNING_OPEN + end_minute,
+                         AFTERNOON_OPEN + end_minute - MORNING_MINUTES)
+    return dates.dt.normalize() + pd.to_timedelta(end_clock, unit='m')
+
+
+def _calendar_labels(dates, period):
+    """计算每根日K线所属的周/月分组，合成K线的时间为组内最后一个交易日"""
+    freq = 'W' if period == '1w' else 'M'
+    groups = dates.dt.to_period(freq)
+    return dates.groupby(groups).transform('max')
+
+
+def resample_bars(stock_data, target_period, source_period=None):
+    """
+    将K线数据合成为更高周期的K线
+
+    Args:
+        stock_data (pd.DataFrame): 按时间排序的K线数据，包含date, open, high, low, close, volume, amount列
+        target_period (str): 目标周期，如'15m', '30m', '60m', '1w', '1mon'
+        source_period (str): 源数据周期，默认为目标周期的基础周期
+
+    Returns:
+        pd.DataFrame: 合成后的K线数据，没有数据时返回None
+    """
+    if source_period is None:
+        source_period = base_period(target_period)
+    if stock_data is None or stock_data.empty:
+        return None
+    if source_period == target_period:
+        return stock_data
+
+    logger.debug(f"合成K线: {source_period} -> {target_period}, 源数据 {len(stock_data)} 条")
+    dates = pd.to_datetime(stock_data['date'])
+
+    if target_period in PERIOD_MINUTES:
+        if source_period not in PERIOD_MINUTES:
+            raise ValueError(f"无法由 {source_period} 周期合成 {target_period} 周期")
+        target_minutes = PERIOD_MINUTES[target_period]
+        if target_minutes % PERIOD_MINUTES[source_period] != 0 or MORNING_MINUTES % target_minutes != 0:
+            raise ValueError(f"无法由 {source_period} 周期合成 {target_period} 周期")
+        labels = _minute_labels(dates, target_minutes)
+    elif target_period in ('1w', '1mon'):
+        if source_period != '1d':
+            raise ValueError(f"无法由 {source_period} 周期合成 {target_period} 周期")
+        labels = _calendar_labels(dates, target_period)
+    else:
+        raise ValueError(f"不支持的合成周期: {target_period}")
+
+    columns = {column: how for column, how in AGGREGATIONS.items() if column in stock_data.columns}
+    result = stock_data[list(columns)].groupby(labels.to_numpy(), sort=True).agg(columns)
+    result.index.name = 'date'
+    result = result.reset_index()
+
+    logger.debug(f"K线合成完成: {target_period}, 共 {len(result)} 条")
+    return result
@@ -0,0 +1,426 @@
+"""
+数据源调用保护模块，为xtquant调用提供限流、重试、超时和熔断
+
+QMT客户端被限流或短暂不可用时，直接失败会让该批股票在本次运行中丢失，而立即重试又会形成错误风暴。
+所有数据源调用经过FeedCaller：
+- 令牌桶限流，使持续调用速率不超过客户端的上限
+- 按异常类型区分可重试的错误（超时、连接断开、限流等）和不可重试的错误（参数错误等）
+- 可重试的错误按带随机抖动的指数退避重试
+- 单次调用超时
+- 连续失败达到阈值时熔断，熔断期间所有调用方暂停等待，冷却后放行一次试探调用
+"""
+import time
+import random
+import threading
+from collections import deque
+from ..logger import get_logger
+
+# 获取日志记录器
+logger = get_logger(__name__)
+
+# 错误信息中出现这些关键字时视为可重试的错误
+RETRYABLE_KEYWORDS = ('timeout', 'timed out', 'busy', 'limit', 'too many', 'disconnect', 'not connected',
+                      'connection', 'unavailable', '超时', '频繁', '限流', '断开', '未连接', '连接失败')
+
+# 不可重试的异常类型，通常是调用参数或数据格式错误
+NON_RETRYABLE_ERRORS = (ValueError, TypeError, KeyError, AttributeError, ImportError)
+
+
+class FeedCallTimeout(TimeoutError):
+    """数据源调用超时"""
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器处于打开状态，调用被拒绝"""
+
+
+class FeedError(RuntimeError):
+    """数据源调用在重试用尽或熔断后仍失败，与数据源正常返回但没有数据区分"""
+
+
+class FetchResults(dict):
+    """
+    批量下载结果，股票代码到K线数据的映射，没有数据的股票对应None
+
+    下载失败的股票同样对应None，并记录在failed中，调用方据此区分“没有数据”和“下载失败”
+    """
+
+    def __init__(self, *args, failed=(), **kwargs):
+        """
+        初始化批量下载结果
+
+        Args:
+            *args: 与dict相同
+            failed (Iterable[str]): 下载失败的股票代码
+            **kwargs: 与dict相同
+        """
+        super().__init__(*args, **kwargs)
+        self.failed = set(failed)
+
+
+def is_retryable(error):
+    """
+    判断数据源调用的异常是否值得重试
+
+    Args:
+        error (Exception): 调用抛出的异常
+
+    Returns:
+        bool: 是否为可重试的错误
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, NON_RETRYABLE_ERRORS):
+        return False
+    message = str(error).lower()
+    return any(keyword in message for keyword in RETRYABLE_KEYWORDS)
+
+
+class TokenBucket:
+    """令牌桶限流器，线程安全"""
+
+    def __init__(self, rate, capacity=None):
+        """
+        初始化令牌桶
+
+        Args:
+            rate (float): 每秒补充的令牌数量，即持续调用速率上限
+            capacity (float): 桶容量，即允许的突发调用数量，默认与rate相同
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """按经过的时间补充令牌"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        """
+        获取令牌，令牌不足时阻塞等待
+
+        Args:
+            tokens (float): 需要的令牌数量
+
+        Returns:
+            float: 本次等待的秒数
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class CircuitBreaker:
+    """
+    熔断器，线程安全
+
+    连续失败failure_threshold次后打开，打开期间调用方在wait中暂停；经过reset_timeout秒后进入半开状态，
+    只放行一次试探调用，成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """
+        初始化熔断器
+
+        Args:
+            failure_threshold (int): 触发熔断的连续失败次数
+            reset_timeout (float): 熔断后的冷却时间（秒）
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._condition = threading.Condition()
+
+    def wait(self, timeout=None):
+        """
+        等待熔断器允许调用，熔断期间阻塞调用方
+
+        Args:
+            timeout (float): 最长等待时间（秒），为None时一直等待
+
+        Raises:
+            CircuitOpenError: 超过等待时间熔断器仍未放行
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                if self.state == self.CLOSED:
+                    return
+                now = time.monotonic()
+                if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                    self.state = self.HALF_OPEN
+                    logger.info("熔断器进入半开状态，放行一次试探调用")
+                if self.state == self.HALF_OPEN and not self._probing:
+                    self._probing = True
+                    return
+
+                remaining = self._opened_at + self.reset_timeout - now if self.state == self.OPEN else None
+                if deadline is not None:
+                    if now >= deadline:
+                        raise CircuitOpenError("熔断器处于打开状态，数据源调用被暂停")
+                    remaining = deadline - now if remaining is None else min(remaining, deadline - now)
+                self._condition.wait(remaining)
+
+    def record_success(self):
+        """记录一次成功调用"""
+        with self._condition:
+            if self.state != self.CLOSED:
+                logger.info("试探调用成功，熔断器关闭")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+            self._condition.notify_all()
+
+    def record_failure(self):
+        """记录一次失败调用"""
+        with self._condition:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"数据源连续失败 {self.failures} 次，熔断 {self.reset_timeout} 秒")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+            self._condition.notify_all()
+
+
+class FeedCaller:
+    """带限流、重试、超时和熔断的数据源调用器，多个线程共享同一个实例"""
+
+    def __init__(self, rate_limit=None, burst=None, max_retries=3, base_delay=0.5, max_delay=10.0, timeout=None,
+                 failure_threshold=5, reset_timeout=30.0, max_call_threads=16):
+        """
+        初始化数据源调用器
+
+        Args:
+            rate_limit (float): 每秒最多调用次数，为None时不限流
+            burst (float): 允许的突发调用次数，默认与rate_limit相同
+            max_retries (int): 可重试错误的最大重试次数
+            base_delay (float): 第一次重试的退避时间上限（秒）
+            max_delay (float): 退避时间上限（秒）
+            timeout (float): 单次调用超时时间（秒），为None时不限制
+            failure_threshold (int): 触发熔断的连续失败次数
+            reset_timeout (float): 熔断后的冷却时间（秒）
+            max_call_threads (int): 设置timeout时同时存在的调用线程数量上限，超时被放弃的调用在返回前仍占用名额
+        """
+        self.bucket = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.max_call_threads = max_call_threads
+        self.abandoned = 0
+        self._call_slots = threading.BoundedSemaphore(max_call_threads)
+        self._abandoned_lock = threading.Lock()
+
+    def _call_with_timeout(self, func, args, kwargs):
+        """在守护线程中执行调用，超过timeout秒未返回时抛出FeedCallTimeout"""
+        if self.timeout is None:
+            return func(*args, **kwargs)
+
+        # 阻塞的客户端调用无法中断，超时后线程仍会继续运行，用名额限制同时存在的调用线程数量
+        if not self._call_slots.acquire(timeout=self.timeout):
+            raise FeedCallTimeout(f"{self.max_call_threads} 个数据源调用线程均未返回，等待超过 {self.timeout} 秒")
+
+        outcome = {}
+
+        def target():
+            try:
+                outcome['result'] = func(*args, **kwargs)
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                self._call_slots.release()
+
+        worker = threading.Thread(target=target, daemon=True)
+        worker.start()
+        worker.join(self.timeout)
+        if worker.is_alive():
+            # 放弃等待其结果，线程返回后释放名额
+            with self._abandoned_lock:
+                self.abandoned += 1
+                abandoned = self.abandoned
+            logger.warning(f"数据源调用 {getattr(func, '__name__', func)} 超时（{self.timeout} 秒），放弃等待其结果，"
+                           f"累计放弃 {abandoned} 次")
+            raise FeedCallTimeout(f"数据源调用超时（{self.timeout} 秒）")
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+
+    def backoff(self, attempt):
+        """
+        计算第attempt次重试前的等待时间，使用完全随机抖动避免多个线程同时重试
+
+        Args:
+            attempt (int): 重试序号，从0开始
+
+        Returns:
+            float: 等待秒数
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, func, *args, **kwargs):
+        """
+        调用数据源函数
+
+        Args:
+            func (callable): 数据源函数，失败时应抛出异常
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            Any: 数据源函数的返回值
+
+        Raises:
+            Exception: 不可重试的错误，或重试次数用尽后的最后一次错误
+        """
+        attempt = 0
+        while True:
+            self.breaker.wait()
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                result = self._call_with_timeout(func, args, kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    # 不可重试的错误说明客户端可用，不计入熔断
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    logger.error(f"数据源调用 {getattr(func, '__name__', func)} 重试 {attempt} 次后仍失败: {str(e)}")
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f"数据源调用 {getattr(func, '__name__', func)} 失败，{delay:.2f} 秒后第 {attempt + 1} 次重试: "
+                               f"{str(e)}")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+
+# 数据源模块共用的调用器，默认不限流、不超时，只做重试和熔断
+_feed_caller = FeedCaller()
+
+
+def get_feed_caller():
+    """
+    获取数据源模块共用的调用器
+
+    Returns:
+        FeedCaller: 数据源调用器
+    """
+    return _feed_caller
+
+
+def configure_feed_caller(**kwargs):
+    """
+    按配置重新创建数据源模块共用的调用器
+
+    Args:
+        **kwargs: FeedCaller的初始化参数，如rate_limit, max_retries, timeout等
+
+    Returns:
+        FeedCaller: 新的数据源调用器
+    """
+    global _feed_caller
+    _feed_caller = FeedCaller(**kwargs)
+    logger.info(f"数据源调用保护配置: {kwargs}")
+    return _feed_caller
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD自适应并发控制器，线程安全
+
+    以最近baseline_window个成功任务中最低的单只股票耗时作为基准：一轮（约limit个任务）内没有出错且耗时未明显超过基准时并发加1；
+    出错时并发减半，耗时超过基准的latency_tolerance倍时并发乘以0.75，每轮最多减少一次，
+    并发始终限制在[min_limit, max_limit]之间。
+    基准只取最近的样本，命中缓存等偶发的极快任务移出窗口后不再压低基准，数据源整体变慢后基准也会随之调整。
+    """
+
+    def __init__(self, min_limit=1, max_limit=16, initial=None, latency_tolerance=2.0, baseline_window=64):
+        """
+        初始化自适应并发控制器
+
+        Args:
+            min_limit (int): 并发下限
+            max_limit (int): 并发上限
+            initial (int): 初始并发，默认为下限
+            latency_tolerance (float): 单只股票耗时超过基准的倍数时视为拥塞
+            baseline_window (int): 计算基准时取最近成功任务的数量
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.latency_tolerance = latency_tolerance
+        self._limit = float(min(max(initial or self.min_limit, self.min_limit), self.max_limit))
+        self.baseline = None
+        self._samples = deque(maxlen=max(1, baseline_window))
+        self.successes = 0
+        self.errors = 0
+        self._since_decrease = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        """当前允许的并发数量"""
+        return int(self._limit)
+
+    def record(self, latency, items=1, error=False):
+        """
+        记录一个任务的结果并调整并发
+
+        Args:
+            latency (float): 任务耗时（秒）
+            items (int): 任务包含的股票数量，用于换算单只股票耗时
+            error (bool): 任务是否失败
+
+        Returns:
+            int: 调整后的并发数量
+        """
+        with self._lock:
+            self._since_decrease += 1
+            # 同一轮中在途的任务都是在旧的并发下发出的，每轮最多减少一次
+            can_decrease = self._since_decrease >= self.limit
+            if error:
+                self.errors += 1
+                if can_decrease:
+                    self._decrease(0.5)
+                return self.limit
+
+            self.successes += 1
+            per_item = latency / max(items, 1)
+            self._samples.append(per_item)
+            self.baseline = min(self._samples)
+            if per_item > self.baseline * self.latency_tolerance:
+                if can_decrease:
+                    self._decrease(0.75)
+            else:
+                # 加性增长：每轮完成的任务累计使并发加1
+                self._limit = min(self.max_limit, self._limit + 1.0 / self.limit)
+            return self.limit
+
+    def _decrease(self, factor):
+        """乘性减少并发"""
+        self._limit = max(self.min_limit, self._limit * factor)
+        self._since_decrease = 0
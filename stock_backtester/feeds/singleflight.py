@@ -0,0 +1,86 @@
+"""
+请求合并模块，相同的请求同时进行时只执行一次，所有等待者得到同一个结果
+
+多个筛选器、线程池中的多个线程或多个用户的筛选链同时请求同一份K线数据时，
+第一个请求执行实际的获取，其余请求等待它完成并共享结果（或共享同一个异常）。
+请求完成后不保留结果，之后的相同请求重新执行，结果缓存由调用方负责。
+"""
+import threading
+from ..logger import get_logger
+
+# 获取日志记录器
+logger = get_logger(__name__)
+
+
+class _Flight:
+    """一个正在进行的请求"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """请求合并器，线程安全"""
+
+    def __init__(self):
+        """初始化请求合并器"""
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        执行请求，相同key的请求正在进行时等待其结果
+
+        Args:
+            key (hashable): 请求键，相同的键视为相同的请求
+            func (callable): 执行请求的函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            Any: 请求结果，合并的请求与执行者得到同一个对象
+
+        Raises:
+            Exception: 执行者抛出的异常，所有等待者抛出同一个异常
+        """
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                flight.waiters += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            logger.debug(f"合并相同的进行中请求: {key}")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func(*args, **kwargs)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    @property
+    def in_flight(self):
+        """正在进行的请求数量"""
+        with self._lock:
+            return len(self._flights)
@@ -3,6 +3,7 @@
 """
 import re
 import pandas as pd
+from .resilience import get_feed_caller, FeedError, FetchResults
 from ..logger import get_logger
 
 # 获取日志记录器
@@ -68,7 +69,76 @@ def format_stock_code(stock_code):
     return None
 
 
-def download_stock_data(stock_code, start_date, end_date, period='1d', adjustment='pre'):
+# 每个周期每个交易日的K线条数，用于估算批量下载的内存占用
+BARS_PER_TRADING_DAY = {'1m': 240, '5m': 48, '15m': 16, '30m': 8, '1h': 4, '1d': 1}
+
+# 每条K线在内存中占用的估算字节数（7个字段，包含DataFrame的额外开销）
+BYTES_PER_BAR = 7 * 8 * 2
+
+
+def _dividend_type(adjustment):
+    """
+    将复权方式转换为xtquant的dividend_type参数
+    
+    Args:
+        adjustment (str): 复权方式，pre(前复权), post(后复权), none(不复权)
+        
+    Returns:
+        str: xtquant的复权类型
+    """
+    if adjustment == 'pre':
+        return 'front'  # 前复权
+    elif adjustment == 'post':
+        return 'back'   # 后复权
+    return 'none'  # 默认不复权
+
+
+def _format_bar_data(df):
+    """
+    将xtquant返回的K线数据转换为统一格式
+    
+    Args:
+        df (pandas.DataFrame): get_market_data_ex返回的单只股票数据
+        
+    Returns:
+        pandas.DataFrame: 包含date, open, high, low, close, volume, amount列的K线数据
+    """
+    # 重命名列以匹配需求
+    df = df.rename(columns={
+        'time': 'date',
+        'open': 'open',
+        'high': 'high',
+        'low': 'low',
+        'close': 'close',
+        'volume': 'volume',
+        'amount': 'amount'
+    })
+    
+    # 将时间戳转换为日期格式
+    # xtquant返回的时间可能是时间戳格式，需要转换
+    if not df.empty:
+        # 尝试不同的日期解析方式
+        try:
+            # 如果是时间戳格式（毫秒）
+            df['date'] = pd.to_datetime(df['date'], unit='ms')
+            # 将UTC时间转换为北京时间（UTC+8）
+            df['date'] = df['date'] + pd.Timedelta(hours=8)
+            logger.debug("时间戳格式转换完成")
+        except:
+            try:
+                # 如果是YYYYMMDD格式
+                df['date'] = pd.to_datetime(df['date'], format='%Y%m%d', errors='coerce')
+                logger.debug("YYYYMMDD格式转换完成")
+            except:
+                # 如果是其他格式，让pandas自动推断
+                df['date'] = pd.to_datetime(df['date'], errors='coerce')
+                logger.debug("自动推断日期格式完成")
+    
+    # 重置索引
+    return df.reset_index(drop=True)
+
+
+def download_stock_data(stock_code, start_date, end_date, period='1d', adjustment='pre', incrementally=False):
     """
     从xtquant下载股票数据
     
@@ -78,9 +148,13 @@ def download_stock_data(stock_code, start_date, end_date, period='1d', adjustmen
         end_date (str): 结束日期，格式为YYYY-MM-DD
         period (str): 数据周期，支持1m, 5m, 30m, 1d
         adjustment (str): 复权方式，pre(前复权), post(后复权), none(不复权)
+        incrementally (bool): 是否让客户端从本地最后一条数据往后增量下载历史数据
         
     Returns:
-        pandas.DataFrame: 股票K线数据
+        pandas.DataFrame: 股票K线数据，数据源正常返回但没有数据时返回None
+
+    Raises:
+        FeedError: 数据源调用在重试用尽或熔断后仍失败
     """
     logger.info(f"开始下载股票数据: {stock_code}, 时间范围: {start_date} 到 {end_date}, 周期: {period}, 复权: {adjustment}")
     
@@ -94,31 +168,38 @@ def download_stock_data(stock_code, start_date, end_date, period='1d', adjustmen
         
         logger.debug(f"转换日期格式: {start_date} -> {start_date_xt}, {end_date} -> {end_date_xt}")
         
-        # 下载历史数据
-        # 注意：xtquant的download_history_data函数不直接返回数据，而是将数据保存在本地
-        # 我们需要使用get_market_data_ex来获取数据
-        logger.debug(f"调用xtdata.download_history_data下载历史数据")
-        xtdata.download_history_data(stock_code, period, start_date_xt, end_date_xt)
-        
         # 获取复权类型
-        dividend_type = 'none'  # 默认不复权
-        if adjustment == 'pre':
-            dividend_type = 'front'  # 前复权
-        elif adjustment == 'post':
-            dividend_type = 'back'   # 后复权
-        
+        dividend_type = _dividend_type(adjustment)
         logger.debug(f"复权类型: {dividend_type}")
         
-        # 获取数据
-        logger.debug(f"调用xtdata.get_market_data_ex获取数据")
-        data = xtdata.get_market_data_ex(
-            field_list=['time', 'open', 'high', 'low', 'close', 'volume', 'amount'],  # 正确的参数名是field_list
-            stock_list=[stock_code],  # 正确的参数名是stock_list
-            period=period,
-            start_time=start_date_xt,
-            end_time=end_date_xt,
-            dividend_type=dividend_type
-        )
+        def fetch():
+            # 下载历史数据
+            # 注意：xtquant的download_history_data函数不直接返回数据，而是将数据保存在本地
+            # 我们需要使用get_market_data_ex来获取数据
+            logger.debug(f"调用xtdata.download_history_data下载历史数据")
+            if incrementally:
+                # 部分版本客户端可能不支持incrementally参数，只在需要时传递
+                xtdata.download_history_data(stock_code, period, start_date_xt, end_date_xt, incrementally=True)
+            else:
+                xtdata.download_history_data(stock_code, period, start_date_xt, end_date_xt)
+            
+            # 获取数据
+            logger.debug(f"调用xtdata.get_market_data_ex获取数据")
+            return xtdata.get_market_data_ex(
+                field_list=['time', 'open', 'high', 'low', 'close', 'volume', 'amount'],  # 正确的参数名是field_list
+                stock_list=[stock_code],  # 正确的参数名是stock_list
+                period=period,
+                start_time=start_date_xt,
+                end_time=end_date_xt,
+                dividend_type=dividend_type
+            )
+        
+        # 经过限流、重试和熔断保护调用客户端，客户端短暂不可用时不会直接丢失该股票
+        try:
+            data = get_feed_caller().call(fetch)
+        except Exception as e:
+            # 重试用尽后抛出FeedError，调用方不会把下载失败当作没有数据
+            raise FeedError(f"下载股票 {stock_code} 数据失败: {str(e)}") from e
         
         # 检查是否有数据
         if not data or stock_code not in data or data[stock_code] is None or len(data[stock_code]) == 0:
@@ -135,39 +216,8 @@ def download_stock_data(stock_code, start_date, end_date, period='1d', adjustmen
         
         logger.debug(f"获取到 {len(df)} 条数据记录")
         
-        # 重命名列以匹配需求
-        df = df.rename(columns={
-            'time': 'date',
-            'open': 'open',
-            'high': 'high',
-            'low': 'low',
-            'close': 'close',
-            'volume': 'volume',
-            'amount': 'amount'
-        })
-        
-        # 将时间戳转换为日期格式
-        # xtquant返回的时间可能是时间戳格式，需要转换
-        if not df.empty:
-            # 尝试不同的日期解析方式
-            try:
-                # 如果是时间戳格式（毫秒）
-                df['date'] = pd.to_datetime(df['date'], unit='ms')
-                # 将UTC时间转换为北京时间（UTC+8）
-                df['date'] = df['date'] + pd.Timedelta(hours=8)
-                logger.debug("时间戳格式转换完成")
-            except:
-                try:
-                    # 如果是YYYYMMDD格式
-                    df['date'] = pd.to_datetime(df['date'], format='%Y%m%d', errors='coerce')
-                    logger.debug("YYYYMMDD格式转换完成")
-                except:
-                    # 如果是其他格式，让pandas自动推断
-                    df['date'] = pd.to_datetime(df['date'], errors='coerce')
-                    logger.debug("自动推断日期格式完成")
-        
-        # 重置索引
-        df = df.reset_index(drop=True)
+        # 转换为统一的K线数据格式
+        df = _format_bar_data(df)
         
         logger.info(f"股票 {stock_code} 数据下载完成，共 {len(df)} 条记录")
         return df
@@ -177,6 +227,10 @@ def download_stock_data(stock_code, start_date, end_date, period='1d', adjustmen
         logger.warning("未安装xtquant库，使用模拟数据")
         print("警告: 未安装xtquant库，使用模拟数据")
         return _simulate_download_stock_data(stock_code, start_date, end_date, period, adjustment)
+    except FeedError as e:
+        logger.error(str(e))
+        print(str(e))
+        raise
     except Exception as e:
         # 记录错误并返回None
         logger.error(f"下载股票 {stock_code} 数据时出错: {str(e)}")
@@ -184,6 +238,143 @@ def download_stock_data(stock_code, start_date, end_date, period='1d', adjustmen
         return None
 
 
+def estimate_chunk_size(start_date, end_date, period='1d', batch_size=500, memory_limit_mb=512):
+    """
+    根据内存上限估算批量下载时每批的股票数量
+    
+    Args:
+        start_date (str): 开始日期，格式为YYYY-MM-DD
+        end_date (str): 结束日期，格式为YYYY-MM-DD
+        period (str): 数据周期
+        batch_size (int): 每批股票数量的上限
+        memory_limit_mb (int): 单批数据允许占用的内存上限（MB）
+        
+    Returns:
+        int: 每批的股票数量，至少为1
+    """
+    from datetime import datetime
+    
+    days = (datetime.strptime(end_date, '%Y-%m-%d') - datetime.strptime(start_date, '%Y-%m-%d')).days + 1
+    # 按每年约245个交易日估算交易日数量
+    trading_days = max(1, days * 245 // 365)
+    bars_per_stock = trading_days * BARS_PER_TRADING_DAY.get(period, 1)
+    max_stocks = memory_limit_mb * 1024 * 1024 // (bars_per_stock * BYTES_PER_BAR)
+    chunk_size = max(1, min(batch_size, max_stocks))
+    logger.debug(f"估算批量下载每批股票数量: {chunk_size} (周期: {period}, 每只股票约 {bars_per_stock} 条K线)")
+    return chunk_size
+
+
+def download_stock_data_batch(stock_codes, start_date, end_date, period='1d', adjustment='pre', chunk_size=500,
+                              incrementally=False):
+    """
+    从xtquant批量下载多只股票的数据
+    
+    按chunk_size将股票分批，每批只调用一次历史数据下载和一次get_market_data_ex，
+    将单次调用的开销分摊到整批股票上。
+    
+    Args:
+        stock_codes (list): 股票代码列表，格式为 '600000.SH'
+        start_date (str): 开始日期，格式为YYYY-MM-DD
+        end_date (str): 结束日期，格式为YYYY-MM-DD
+        period (str): 数据周期，支持1m, 5m, 30m, 1d
+        adjustment (str): 复权方式，pre(前复权), post(后复权), none(不复权)
+        chunk_size (int): 每批股票数量
+        incrementally (bool): 是否让客户端从本地最后一条数据往后增量下载历史数据
+        
+    Returns:
+        FetchResults: 股票代码到K线数据的映射，没有数据或下载失败的股票对应None，下载失败的股票记录在failed中
+    """
+    logger.info(f"开始批量下载股票数据: {len(stock_codes)} 只, 时间范围: {start_date} 到 {end_date}, 周期: {period}, 复权: {adjustment}, 每批: {chunk_size}")
+    
+    try:
+        # 导入xtquant库
+        from xtquant import xtconstant, xtdata
+    except ImportError:
+        # 如果没有安装xtquant，使用模拟数据
+        logger.warning("未安装xtquant库，使用模拟数据")
+        print("警告: 未安装xtquant库，使用模拟数据")
+        return FetchResults({
+            stock_code: _simulate_download_stock_data(stock_code, start_date, end_date, period, adjustment)
+            for stock_code in stock_codes
+        })
+    
+    # 转换日期格式为xtquant要求的格式 (YYYYMMDD)
+    start_date_xt = start_date.replace('-', '')
+    end_date_xt = end_date.replace('-', '')
+    dividend_type = _dividend_type(adjustment)
+    
+    # 部分版本客户端可能不支持incrementally参数，只在需要时传递
+    extra_args = {'incrementally': True} if incrementally else {}
+    
+    def fetch_chunk(chunk):
+        # 下载历史数据，客户端支持时整批下载
+        if hasattr(xtdata, 'download_history_data2'):
+            xtdata.download_history_data2(chunk, period, start_date_xt, end_date_xt, **extra_args)
+        else:
+            for stock_code in chunk:
+                xtdata.download_history_data(stock_code, period, start_date_xt, end_date_xt, **extra_args)
+        
+        # 整批获取数据
+        return xtdata.get_market_data_ex(
+            field_list=['time', 'open', 'high', 'low', 'close', 'volume', 'amount'],
+            stock_list=chunk,
+            period=period,
+            start_time=start_date_xt,
+            end_time=end_date_xt,
+            dividend_type=dividend_type
+        ) or {}
+    
+    caller = get_feed_caller()
+    results = FetchResults()
+    for offset in range(0, len(stock_codes), chunk_size):
+        chunk = list(stock_codes[offset:offset + chunk_size])
+        try:
+            logger.debug(f"下载第 {offset // chunk_size + 1} 批历史数据，股票数量: {len(chunk)}")
+            # 经过限流、重试和熔断保护调用客户端，整批重试而不是逐只重试
+            data = caller.call(fetch_chunk, chunk)
+        except Exception as e:
+            # 整批失败时记录错误，该批股票均视为下载失败
+            logger.error(f"批量下载股票数据时出错: {chunk[0]} 等 {len(chunk)} 只, {str(e)}")
+            print(f"批量下载股票数据时出错: {chunk[0]} 等 {len(chunk)} 只, {str(e)}")
+            results.failed.update(chunk)
+            data = {}
+        
+        for stock_code in chunk:
+            df = data.get(stock_code)
+            if df is None or len(df) == 0:
+                if stock_code not in results.failed:
+                    logger.warning(f"未获取到股票 {stock_code} 的数据")
+                results[stock_code] = None
+                continue
+            results[stock_code] = _format_bar_data(df)
+    
+    successful = sum(1 for df in results.values() if df is not None)
+    logger.info(f"批量下载完成，成功 {successful} 只，无数据 {len(results) - successful - len(results.failed)} 只，"
+                f"失败 {len(results.failed)} 只")
+    return results
+
+
+def download_panel(stock_codes, start_date, end_date, period='1d', adjustment='pre', chunk_size=500):
+    """
+    批量下载多只股票的数据并直接构建为面板
+    
+    Args:
+        stock_codes (list): 股票代码列表，格式为 '600000.SH'
+        start_date (str): 开始日期，格式为YYYY-MM-DD
+        end_date (str): 结束日期，格式为YYYY-MM-DD
+        period (str): 数据周期，支持1m, 5m, 30m, 1d
+        adjustment (str): 复权方式，pre(前复权), post(后复权), none(不复权)
+        chunk_size (int): 每批股票数量
+        
+    Returns:
+        Panel: 面板数据，股票顺序与stock_codes一致
+    """
+    from ..panel import Panel
+    
+    stock_data = download_stock_data_batch(stock_codes, start_date, end_date, period, adjustment, chunk_size)
+    return Panel.from_frames(stock_data)
+
+
 def _simulate_download_stock_data(stock_code, start_date, end_date, period='1d', adjustment='pre'):
     """
     模拟下载股票数据的实现（用于测试或xtquant不可用时）
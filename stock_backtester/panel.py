@@ -0,0 +1,265 @@
+"""
+面板数据模块，将多只股票的K线对齐为(股票 × 时间)的二维数组，便于对全市场做向量化计算
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from .logger import get_logger
+
+# 获取日志记录器
+logger = get_logger(__name__)
+
+# 面板默认包含的K线字段
+PANEL_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+
+def _dates(data):
+    """读取K线的日期列，已是datetime类型时不再逐个解析"""
+    dates = data['date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates)
+    return dates.to_numpy(dtype='datetime64[ns]')
+
+
+class Panel:
+    """
+    (股票 × 时间 × 字段) 面板数据
+
+    每个字段是一个形状为(股票数量, 时间点数量)的二维float数组，股票在第0维，
+    时间在第1维，所有股票共用同一时间轴；某只股票在某个时间点没有K线（如停牌）时为NaN。
+    """
+
+    def __init__(self, symbols, timestamps, fields):
+        """
+        初始化面板数据
+
+        Args:
+            symbols (list): 股票代码列表，对应第0维
+            timestamps (numpy.ndarray): 按时间排序的datetime64[ns]数组，对应第1维
+            fields (dict): 字段名到二维数组的映射
+        """
+        self.symbols = list(symbols)
+        self.timestamps = np.asarray(timestamps, dtype='datetime64[ns]')
+        self.fields = fields
+        self._positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+        for name, values in fields.items():
+            if values.shape != self.shape:
+                raise ValueError(f"字段 {name} 的形状 {values.shape} 与面板形状 {self.shape} 不一致")
+
+    @classmethod
+    def from_frames(cls, stock_data, fields=None):
+        """
+        由逐只股票的K线数据构建面板
+
+        Args:
+            stock_data (dict): 股票代码到K线数据的映射，数据为None的股票整行为NaN
+            fields (list): 字段列表，默认为PANEL_FIELDS
+
+        Returns:
+            Panel: 面板数据
+        """
+        fields = fields or PANEL_FIELDS
+        symbols = list(stock_data)
+        frames = [(i, data) for i, data in enumerate(stock_data.values())
+                  if isinstance(data, pd.DataFrame) and not data.empty]
+
+        if not frames:
+            empty = {name: np.full((len(symbols), 0), np.nan) for name in fields}
+            return cls(symbols, np.array([], dtype='datetime64[ns]'), empty)
+
+        # 拼接所有股票的数据，统一计算行列位置后一次性填充
+        rows = np.concatenate([np.full(len(data), i, dtype=np.int64) for i, data in frames])
+        dates = np.concatenate([_dates(data) for _, data in frames])
+        timestamps = np.unique(dates)
+        columns = np.searchsorted(timestamps, dates)
+
+        arrays = {}
+        for name in fields:
+            values = np.full((len(symbols), len(timestamps)), np.nan)
+            values[rows, columns] = np.concatenate([data[name].to_numpy(dtype=float) for _, data in frames])
+            arrays[name] = values
+
+        logger.debug(f"构建面板数据: {len(symbols)} 只股票 × {len(timestamps)} 个时间点")
+        return cls(symbols, timestamps, arrays)
+
+    @classmethod
+    def from_store(cls, store, symbols=None, start_date=None, end_date=None, fields=None):
+        """
+        由内存映射K线存储构建面板
+
+        Args:
+            store (MmapBarStore): 内存映射的K线存储
+            symbols (list): 股票代码列表，默认为存储中的全部股票
+            start_date (str): 开始日期，为None时不限制
+            end_date (str): 结束日期，为None时不限制
+            fields (list): 字段列表，默认为PANEL_FIELDS
+
+        Returns:
+            Panel: 面板数据
+        """
+        fields = fields or PANEL_FIELDS
+        symbols = list(symbols) if symbols is not None else list(store.symbols)
+        stock_data = {}
+        for symbol in symbols:
+            arrays = store.get_arrays(symbol, ['date'] + fields, start_date, end_date)
+            stock_data[symbol] = pd.DataFrame(arrays) if arrays is not None else None
+        return cls.from_frames(stock_data, fields)
+
+    @property
+    def shape(self):
+        """面板形状 (股票数量, 时间点数量)"""
+        return len(self.symbols), len(self.timestamps)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self._positions
+
+    def field(self, name):
+        """
+        获取字段的二维数组
+
+        Args:
+            name (str): 字段名
+
+        Returns:
+            numpy.ndarray: 形状为(股票数量, 时间点数量)的数组
+        """
+        return self.fields[name]
+
+    def valid(self):
+        """
+        获取每个(股票, 时间点)是否有K线的掩码
+
+        Returns:
+            numpy.ndarray: 布尔数组，有K线的位置为True
+        """
+        return ~np.isnan(self.fields['close'])
+
+    def last_valid_index(self):
+        """
+        获取每只股票最后一根K线在时间轴上的位置
+
+        Returns:
+            numpy.ndarray: 每只股票最后一根K线的列号，没有数据的股票为-1
+        """
+        valid = self.valid()
+        if valid.shape[1] == 0:
+            return np.full(len(self.symbols), -1, dtype=np.int64)
+        last = valid.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+        return np.where(valid.any(axis=1), last, -1)
+
+    def last_values(self, values):
+        """
+        取出每只股票在其最后一根K线上的值，与逐只股票取iloc[-1]的语义一致
+
+        Args:
+            values (numpy.ndarray): 与面板形状一致的二维数组
+
+        Returns:
+            numpy.ndarray: 每只股票的最后值，没有数据的股票为NaN
+        """
+        last = self.last_valid_index()
+        result = np.full(len(self.symbols), np.nan)
+        has_data = last >= 0
+        result[has_data] = values[np.nonzero(has_data)[0], last[has_data]]
+        return result
+
+    def select(self, symbols):
+        """
+        选取部分股票构成新的面板
+
+        Args:
+            symbols (list): 股票代码列表，不在面板中的股票整行为NaN
+
+        Returns:
+            Panel: 新的面板数据
+        """
+        symbols = list(symbols)
+        rows = np.array([self._positions.get(symbol, -1) for symbol in symbols], dtype=np.int64)
+        arrays = {}
+        for name, values in self.fields.items():
+            selected = np.full((len(symbols), values.shape[1]), np.nan)
+            selected[rows >= 0] = values[rows[rows >= 0]]
+            arrays[name] = selected
+        return Panel(symbols, self.timestamps, arrays)
+
+
+def _compact(values, valid):
+    """将每行的有效值按原顺序移到左侧，返回压缩后的数组和还原用的列号"""
+    order = np.argsort(~valid, axis=1, kind='stable')
+    compacted = np.take_along_axis(values, order, axis=1)
+    return compacted, order
+
+
+def _expand(compacted, order, valid):
+    """将压缩后的计算结果还原到原来的列上，无效位置为NaN"""
+    result = np.full(compacted.shape, np.nan)
+    np.put_along_axis(result, order, compacted, axis=1)
+    result[~valid] = np.nan
+    return result
+
+
+def _rolling(values, window, valid, reducer):
+    """
+    按每只股票自身的K线序列计算滚动窗口统计量
+
+    停牌等没有K线的时间点不占用窗口，与逐只股票用pandas rolling计算的结果一致。
+    """
+    if valid is None:
+        valid = ~np.isnan(values)
+    n_symbols, n_times = values.shape
+    if n_times < window:
+        return np.full(values.shape, np.nan)
+
+    compacted, order = _compact(values, valid)
+    windows = sliding_window_view(compacted, window, axis=1)
+    result = np.full(values.shape, np.nan)
+    result[:, window - 1:] = reducer(windows, axis=-1)
+    return _expand(result, order, valid)
+
+
+def rolling_mean(values, window, valid=None):
+    """
+    滚动平均
+
+    Args:
+        values (numpy.ndarray): 形状为(股票数量, 时间点数量)的数组
+        window (int): 窗口长度
+        valid (numpy.ndarray): 有K线的位置掩码，默认由values的NaN判断
+
+    Returns:
+        numpy.ndarray: 与values形状一致的滚动平均值，K线不足window根的位置为NaN
+    """
+    return _rolling(values, window, valid, np.mean)
+
+
+def rolling_max(values, window, valid=None):
+    """
+    滚动最大值
+
+    Args:
+        values (numpy.ndarray): 形状为(股票数量, 时间点数量)的数组
+        window (int): 窗口长度
+        valid (numpy.ndarray): 有K线的位置掩码，默认由values的NaN判断
+
+    Returns:
+        numpy.ndarray: 与values形状一致的滚动最大值，K线不足window根的位置为NaN
+    """
+    return _rolling(values, window, valid, np.max)
+
+
+def rolling_min(values, window, valid=None):
+    """
+    滚动最小值
+
+    Args:
+        values (numpy.ndarray): 形状为(股票数量, 时间点数量)的数组
+        window (int): 窗口长度
+        valid (numpy.ndarray): 有K线的位置掩码，默认由values的NaN判断
+
+    Returns:
+        numpy.ndarray: 与values形状一致的滚动最小值，K线不足window根的位置为NaN
+    """
+    return _rolling(values, window, valid, np.min)
@@ -1,29 +1,74 @@
 """
 筛选器基类和接口定义
 """
+import inspect
+import functools
+import numpy as np
 import pandas as pd
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from ..logger import get_logger
 
 logger = get_logger(__name__)
 
 
+def sort_bars(stock_data: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """
+    将K线数据按日期排序，在载入数据时调用一次，之后计算指标时直接按位置截取窗口
+    
+    Args:
+        stock_data (pd.DataFrame): 股票数据
+        
+    Returns:
+        pd.DataFrame: 按日期排序的股票数据，无数据时返回None
+    """
+    if not isinstance(stock_data, pd.DataFrame) or stock_data.empty:
+        return None
+    if not stock_data['date'].is_monotonic_increasing:
+        stock_data = stock_data.sort_values('date').reset_index(drop=True)
+    return stock_data
+
+
+@functools.lru_cache(maxsize=None)
+def _accepts_context(method) -> bool:
+    """
+    判断筛选器方法是否接受context参数，兼容只接受(stock_codes, start_time, end_time)的旧版自定义筛选器
+
+    Args:
+        method (function): 筛选器类上定义的filter或evaluate函数
+
+    Returns:
+        bool: 方法有context参数或**kwargs时为True
+    """
+    try:
+        parameters = inspect.signature(method).parameters.values()
+    except (TypeError, ValueError):
+        return True
+    return any(parameter.name == 'context' or parameter.kind is inspect.Parameter.VAR_KEYWORD
+               for parameter in parameters)
+
+
 class Filter(ABC):
     """筛选器基类"""
     
-    def __init__(self, name: str):
+    # 是否支持在面板数据上批量筛选
+    supports_panel = False
+    
+    def __init__(self, name: str, data_period: str = '1d'):
         """
         初始化筛选器
         
         Args:
             name (str): 筛选器名称
+            data_period (str): 筛选使用的数据周期
         """
         self.name = name
+        self.data_period = data_period
         logger.debug(f"初始化筛选器: {name}")
     
     @abstractmethod
-    def filter(self, stock_codes: List[str], start_time: str = None, end_time: str = None) -> List[str]:
+    def filter(self, stock_codes: List[str], start_time: str = None, end_time: str = None, *,
+               context=None) -> List[str]:
         """
         执行筛选逻辑
         
@@ -31,16 +76,218 @@ class Filter(ABC):
             stock_codes (List[str]): 股票代码列表
             start_time (str): 数据开始时间
             end_time (str): 数据结束时间
+            context (DataContext): 筛选数据上下文，为None时直接下载数据
             
         Returns:
             List[str]: 通过筛选的股票代码列表
         """
         pass
+    
+    def evaluate(self, stock_code: str, start_time: str = None, end_time: str = None, *, context=None) -> bool:
+        """
+        判断单只股票是否通过筛选，默认实现为对单只股票调用filter，子类可直接实现单只股票的判断
+        
+        Args:
+            stock_code (str): 股票代码
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+            context (DataContext): 筛选数据上下文，为None时直接下载数据
+            
+        Returns:
+            bool: 是否通过筛选
+        """
+        return stock_code in self.call_filter([stock_code], start_time, end_time, context=context)
+
+    def call_filter(self, stock_codes: List[str], start_time: str = None, end_time: str = None, *,
+                    context=None) -> List[str]:
+        """
+        调用filter，旧版自定义筛选器的filter不接受context时按三个参数调用，此时不共享筛选数据上下文
+
+        Args:
+            stock_codes (List[str]): 股票代码列表
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+            context (DataContext): 筛选数据上下文
+
+        Returns:
+            List[str]: 通过筛选的股票代码列表
+        """
+        if _accepts_context(type(self).filter):
+            return self.filter(stock_codes, start_time, end_time, context=context)
+        return self.filter(stock_codes, start_time, end_time)
+
+    def call_evaluate(self, stock_code: str, start_time: str = None, end_time: str = None, *,
+                      context=None) -> bool:
+        """
+        调用evaluate，旧版自定义筛选器的evaluate不接受context时按三个参数调用
+
+        Args:
+            stock_code (str): 股票代码
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+            context (DataContext): 筛选数据上下文
+
+        Returns:
+            bool: 是否通过筛选
+        """
+        if _accepts_context(type(self).evaluate):
+            return self.evaluate(stock_code, start_time, end_time, context=context)
+        return self.evaluate(stock_code, start_time, end_time)
+    
+    def _filter_each(self, stock_codes: List[str], start_time: str = None, end_time: str = None,
+                     context=None) -> List[str]:
+        """
+        逐只股票调用evaluate，单只股票出错时视为未通过筛选
+        
+        Args:
+            stock_codes (List[str]): 股票代码列表
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+            context (DataContext): 筛选数据上下文
+            
+        Returns:
+            List[str]: 通过筛选的股票代码列表
+        """
+        filtered_stocks = []
+        for stock_code in stock_codes:
+            try:
+                if self.call_evaluate(stock_code, start_time, end_time, context=context):
+                    filtered_stocks.append(stock_code)
+            except Exception as e:
+                logger.error(f"筛选股票 {stock_code} 时出错: {str(e)}")
+                continue
+        return filtered_stocks
+    
+    def filter_panel(self, panel, context=None) -> np.ndarray:
+        """
+        在面板数据上批量执行筛选逻辑，用最后一根K线的数据判断
+        
+        Args:
+            panel (Panel): 候选股票在data_period周期上的面板数据
+            context (DataContext): 筛选数据上下文，用于共享技术指标的计算结果
+            
+        Returns:
+            np.ndarray: 与panel.symbols对应的布尔掩码，通过筛选的股票为True
+        """
+        raise NotImplementedError(f"筛选器 {self.name} 不支持面板筛选")
+    
+    def signal_panel(self, panel, context=None) -> np.ndarray:
+        """
+        在面板数据上判断每只股票在每根K线上是否通过筛选，用于生成历史信号矩阵
+        
+        Args:
+            panel (Panel): 股票在data_period周期上的面板数据
+            context (DataContext): 筛选数据上下文，用于共享技术指标的计算结果
+            
+        Returns:
+            np.ndarray: 与面板形状一致的布尔数组，没有K线的位置为False
+        """
+        raise NotImplementedError(f"筛选器 {self.name} 不支持历史信号计算")
+    
+    def indicators(self) -> List['Indicator']:
+        """
+        声明筛选器用到的技术指标，供执行计划合并和预先计算
+        
+        Returns:
+            List[Indicator]: 技术指标对象列表，在data_period周期的数据上计算
+        """
+        return []
+    
+    def lookback(self) -> int:
+        """
+        筛选器需要的K线回看长度
+        
+        Returns:
+            int: 所用技术指标中最长的回看K线数量，没有指标时为1
+        """
+        return max([indicator.lookback for indicator in self.indicators()] + [1])
+    
+    def _indicator_value(self, indicator, stock_code: str, data: pd.DataFrame, start_time: str = None,
+                         end_time: str = None, adjustment: str = None, context=None) -> float:
+        """
+        获取股票最后一根K线上的技术指标值，有筛选数据上下文时共享计算结果
+        
+        Args:
+            indicator (Indicator): 技术指标对象
+            stock_code (str): 股票代码
+            data (pd.DataFrame): 股票数据
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+            adjustment (str): 复权方式，为None时使用筛选数据上下文的复权方式
+            context (DataContext): 筛选数据上下文
+            
+        Returns:
+            float: 指标值，数据不足时为NaN
+        """
+        if context is None:
+            return indicator.value_at(data)
+        return context.indicator_value(stock_code, indicator, self.data_period, adjustment, start_time, end_time,
+                                       data=data)
+    
+    def _panel_last_values(self, panel, indicator, context=None) -> np.ndarray:
+        """
+        获取面板上每只股票最后一根K线上的技术指标值，有筛选数据上下文时共享计算结果
+        
+        Args:
+            panel (Panel): 面板数据
+            indicator (Indicator): 技术指标对象
+            context (DataContext): 筛选数据上下文
+            
+        Returns:
+            np.ndarray: 与panel.symbols对应的指标值，数据不足的股票为NaN
+        """
+        if context is None:
+            return panel.last_values(indicator.calculate_panel(panel))
+        return context.indicator_last_values(panel, indicator)
+    
+    def _panel_values(self, panel, indicator, context=None) -> np.ndarray:
+        """
+        获取面板上每只股票在每根K线上的技术指标值，有筛选数据上下文时共享计算结果
+        
+        Args:
+            panel (Panel): 面板数据
+            indicator (Indicator): 技术指标对象
+            context (DataContext): 筛选数据上下文
+            
+        Returns:
+            np.ndarray: 与面板形状一致的指标值数组
+        """
+        if context is None:
+            return indicator.calculate_panel(panel)
+        return context.indicator_panel(panel, indicator)
+    
+    def _load_data(self, stock_code: str, start_time: str = None, end_time: str = None,
+                   period: str = '1d', adjustment: str = None, context=None) -> pd.DataFrame:
+        """
+        获取筛选所需的股票数据，优先从筛选数据上下文中读取
+        
+        Args:
+            stock_code (str): 股票代码
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+            period (str): 数据周期
+            adjustment (str): 复权方式，为None时使用筛选数据上下文的复权方式，没有上下文时为前复权
+            context (DataContext): 筛选数据上下文
+            
+        Returns:
+            pd.DataFrame: 股票数据，无数据时返回None
+
+        Raises:
+            Exception: 下载失败时抛出，由_filter_each视为该股票未通过筛选
+        """
+        if context is not None:
+            return context.get(stock_code, period, adjustment, start_time, end_time)
+        
+        from ..engine import download_single_stock
+        return sort_bars(download_single_stock(stock_code, start_time, end_time, period, adjustment or 'pre'))
 
 
 class Indicator(ABC):
     """技术指标基类"""
     
+    # 在面板上计算指标用到的字段
+    panel_fields = ('open', 'high', 'low', 'close', 'volume', 'amount')
+    
     def __init__(self, name: str):
         """
         初始化技术指标
@@ -51,6 +298,11 @@ class Indicator(ABC):
         self.name = name
         logger.debug(f"初始化技术指标: {name}")
     
+    @property
+    def lookback(self) -> int:
+        """计算一根K线上的指标值需要的K线数量，子类按计算周期覆盖"""
+        return 1
+    
     @abstractmethod
     def calculate(self, stock_data: pd.DataFrame) -> pd.DataFrame:
         """
@@ -62,4 +314,51 @@ class Indicator(ABC):
         Returns:
             pd.DataFrame: 包含技术指标的股票数据
         """
-        pass
\ No newline at end of file
+        pass
+    
+    def calculate_panel(self, panel) -> np.ndarray:
+        """
+        在面板数据上一次性计算所有股票的技术指标
+        
+        Args:
+            panel (Panel): 面板数据
+            
+        Returns:
+            np.ndarray: 与面板形状一致的指标值数组
+        """
+        raise NotImplementedError(f"技术指标 {self.name} 不支持面板计算")
+    
+    def value_at(self, stock_data: pd.DataFrame, position: int = -1) -> float:
+        """
+        计算技术指标在指定K线上的值，默认实现为完整计算后取值，子类可只计算末尾窗口
+        
+        Args:
+            stock_data (pd.DataFrame): 按日期排序的股票数据，DataContext在载入数据时已排序
+            position (int): K线位置，负数表示从末尾倒数，默认为最后一根K线
+            
+        Returns:
+            float: 指标值，数据不足时为NaN
+        """
+        return self.calculate(stock_data.copy())[self.name].iloc[position]
+    
+    @staticmethod
+    def _trailing_window(stock_data: pd.DataFrame, length: int, position: int = -1) -> Optional[pd.DataFrame]:
+        """
+        截取以指定K线结尾、长度为length的窗口，直接按位置切片，不检查排序也不复制整段数据
+        
+        Args:
+            stock_data (pd.DataFrame): 按日期排序的股票数据
+            length (int): 窗口长度
+            position (int): K线位置，负数表示从末尾倒数
+            
+        Returns:
+            pd.DataFrame: 窗口内的K线数据，指定位置之前的K线不足length根时返回None
+        """
+        size = len(stock_data)
+        end = position + size if position < 0 else position
+        if end < 0 or end >= size:
+            raise IndexError(f"K线位置 {position} 超出范围，数据长度: {size}")
+        start = end - length + 1
+        if start < 0:
+            return None
+        return stock_data.iloc[start:end + 1]
\ No newline at end of file
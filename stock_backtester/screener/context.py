@@ -0,0 +1,334 @@
+"""
+筛选数据上下文，在一次筛选运行中共享K线数据，避免多个筛选器重复下载
+"""
+import threading
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+from ..panel import Panel
+from .base import sort_bars
+from .indicator_cache import IndicatorCache
+from ..feeds.singleflight import SingleFlight
+from ..feeds.resample import base_period, is_derived_period, resample_bars
+from ..logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class DataContext:
+    """
+    筛选数据上下文
+
+    按(股票代码, 数据周期, 复权方式, 开始时间, 结束时间)缓存K线数据，
+    同一份数据在一次筛选运行中只下载一次，也可以用download_all_stocks的结果预先填充；
+    多个线程同时请求尚未缓存的同一份数据时，只有一个线程获取，其余线程等待并共享结果。
+    合成周期（如30m、1w）默认由基础周期（5m、1d）在本地合成，不再单独下载。
+    """
+
+    def __init__(self, start_time: str = None, end_time: str = None, adjustment: str = 'pre', cache=None,
+                 derive_periods: bool = True, max_workers: int = 1):
+        """
+        初始化筛选数据上下文
+
+        Args:
+            start_time (str): 默认数据开始时间
+            end_time (str): 默认数据结束时间
+            adjustment (str): 默认复权方式
+            cache (BarCache): K线本地缓存，下载数据时透传给download_single_stock
+            derive_periods (bool): 是否由基础周期在本地合成合成周期的数据
+            max_workers (int): 构建面板时并发获取逐只股票数据的线程数
+        """
+        self.start_time = start_time
+        self.end_time = end_time
+        self.adjustment = adjustment
+        self.cache = cache
+        self.derive_periods = derive_periods
+        self.max_workers = max_workers
+        self.hits = 0
+        self.misses = 0
+        self._data: Dict[tuple, Optional[pd.DataFrame]] = {}
+        self._stores: Dict[tuple, object] = {}
+        self._panels: Dict[tuple, Panel] = {}
+        # 合并同时进行的相同数据请求，多个筛选器或线程同时请求同一份数据时只获取一次
+        self.flights = SingleFlight()
+        # 所有筛选器共享的技术指标缓存
+        self.indicators = IndicatorCache()
+        self._lock = threading.Lock()
+        logger.debug(f"初始化筛选数据上下文，时间范围: {start_time} - {end_time}, 复权方式: {adjustment}")
+
+    @staticmethod
+    def _normalize_code(stock_code: str) -> str:
+        """将股票代码统一为xtquant格式，无法识别的代码保持原样"""
+        from ..feeds.xtquant_feed import format_stock_code
+        formatted_code = format_stock_code(stock_code)
+        return formatted_code if formatted_code is not None else str(stock_code)
+
+    def _key(self, stock_code: str, period: str, adjustment: str, start_time: str, end_time: str) -> tuple:
+        """生成缓存键，未指定的参数使用上下文默认值"""
+        return (
+            self._normalize_code(stock_code),
+            period,
+            adjustment if adjustment is not None else self.adjustment,
+            start_time if start_time is not None else self.start_time,
+            end_time if end_time is not None else self.end_time,
+        )
+
+    def set_data_range(self, start_time: str, end_time: str):
+        """
+        设置默认数据范围
+
+        Args:
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+        """
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def seed(self, stock_data: Dict[str, pd.DataFrame], period: str = '1d', adjustment: str = None,
+             start_time: str = None, end_time: str = None):
+        """
+        用已下载的数据预先填充上下文
+
+        Args:
+            stock_data (Dict[str, pd.DataFrame]): 股票代码到数据的映射，即download_all_stocks的返回值
+            period (str): 数据周期
+            adjustment (str): 复权方式
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+        """
+        with self._lock:
+            for stock_code, data in stock_data.items():
+                key = self._key(stock_code, period, adjustment, start_time, end_time)
+                # 载入时按日期排序一次，之后计算指标直接按位置截取窗口
+                self._data[key] = sort_bars(data)
+        logger.debug(f"预填充筛选数据上下文: 周期 {period}, 股票数量 {len(stock_data)}")
+
+    def attach_store(self, store, period: str = '1m', adjustment: str = None):
+        """
+        挂载内存映射的K线存储，未缓存的数据优先从存储中读取
+
+        Args:
+            store (MmapBarStore): 内存映射的K线存储
+            period (str): 存储的数据周期
+            adjustment (str): 存储的复权方式
+        """
+        adjustment = adjustment if adjustment is not None else self.adjustment
+        self._stores[(period, adjustment)] = store
+        logger.debug(f"挂载K线存储: 周期 {period}, 复权方式 {adjustment}, 股票数量 {len(store)}")
+
+    def get(self, stock_code: str, period: str = '1d', adjustment: str = None,
+            start_time: str = None, end_time: str = None) -> Optional[pd.DataFrame]:
+        """
+        获取股票K线数据，未缓存时下载并记住结果
+
+        Args:
+            stock_code (str): 股票代码
+            period (str): 数据周期
+            adjustment (str): 复权方式
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+
+        Returns:
+            pd.DataFrame: 股票K线数据，无数据时返回None
+
+        Raises:
+            Exception: 下载失败（如数据源重试用尽的FeedError），失败的结果不会被缓存
+        """
+        key = self._key(stock_code, period, adjustment, start_time, end_time)
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+
+        return self.flights.do(key, self._load, key, stock_code)
+
+    def _load(self, key: tuple, stock_code: str) -> Optional[pd.DataFrame]:
+        """获取未缓存的数据并写入缓存"""
+        with self._lock:
+            # 检查缓存之后、开始请求之前，数据可能已由刚完成的相同请求写入缓存
+            if key in self._data:
+                return self._data[key]
+
+        code, period, adjustment, start_time, end_time = key
+        store = self._stores.get((period, adjustment))
+        if store is not None and code in store:
+            # 从内存映射存储中按股票切片读取，不需要下载
+            data = store.get(code, start_time, end_time)
+        elif self.derive_periods and is_derived_period(period):
+            # 合成周期由基础周期在本地合成，基础周期的数据同样经过上下文缓存
+            source_period = base_period(period)
+            data = resample_bars(self.get(stock_code, source_period, adjustment, start_time, end_time),
+                                 period, source_period)
+        else:
+            from ..engine import download_single_stock
+            data = download_single_stock(stock_code, start_time, end_time, period, adjustment, self.cache)
+        # 下载失败时异常直接抛出，不写入缓存，之后的请求会重新获取；载入时按日期排序一次
+        data = sort_bars(data)
+
+        with self._lock:
+            self._data[key] = data
+        return data
+
+    def get_panel(self, stock_codes: List[str], period: str = '1d', adjustment: str = None,
+                  start_time: str = None, end_time: str = None):
+        """
+        获取多只股票对齐后的面板数据，数据来自上下文缓存，面板本身也会被缓存
+
+        max_workers大于1时，未缓存的股票在线程池中并发获取。下载失败的股票在本次面板中没有数据，
+        面板不被缓存。
+
+        Args:
+            stock_codes (List[str]): 股票代码列表
+            period (str): 数据周期
+            adjustment (str): 复权方式
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+
+        Returns:
+            Panel: 面板数据，股票顺序与stock_codes一致
+        """
+        key = (
+            tuple(stock_codes),
+            period,
+            adjustment if adjustment is not None else self.adjustment,
+            start_time if start_time is not None else self.start_time,
+            end_time if end_time is not None else self.end_time,
+        )
+        with self._lock:
+            if key in self._panels:
+                return self._panels[key]
+
+        # 未缓存的股票需要下载或合成，与逐只股票筛选一样在线程池中并发获取
+        failed = []
+
+        def fetch(stock_code):
+            try:
+                return self.get(stock_code, period, adjustment, start_time, end_time)
+            except Exception as e:
+                logger.error(f"获取股票 {stock_code} 的 {period} 数据失败，本次面板中记为无数据: {str(e)}")
+                failed.append(stock_code)
+                return None
+
+        if self.max_workers <= 1 or len(stock_codes) <= 1:
+            frames = [fetch(stock_code) for stock_code in stock_codes]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                frames = list(executor.map(fetch, stock_codes))
+        stock_data = dict(zip(stock_codes, frames))
+        panel = Panel.from_frames(stock_data)
+        if failed:
+            # 有股票下载失败时不缓存面板，之后的请求会重新获取失败的股票
+            return panel
+        with self._lock:
+            self._panels[key] = panel
+        return panel
+
+    def _indicator_key(self, stock_code: str, indicator, period: str, adjustment: str, start_time: str,
+                       end_time: str, position: int) -> tuple:
+        """生成单只股票指标值的缓存键"""
+        return (self._key(stock_code, period, adjustment, start_time, end_time)
+                + self.indicators.indicator_key(indicator) + (position,))
+    
+    def seed_indicator_value(self, stock_code: str, indicator, value: float, period: str = '1d',
+                             adjustment: str = None, start_time: str = None, end_time: str = None,
+                             position: int = -1):
+        """
+        写入在其他进程中计算好的指标值，之后的indicator_value直接命中缓存
+        
+        Args:
+            stock_code (str): 股票代码
+            indicator (Indicator): 技术指标对象
+            value (float): 指标值
+            period (str): 数据周期
+            adjustment (str): 复权方式
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+            position (int): 按日期排序后的K线位置
+        """
+        key = self._indicator_key(stock_code, indicator, period, adjustment, start_time, end_time, position)
+        self.indicators.put(key, value)
+    
+    def indicator_value(self, stock_code: str, indicator, period: str = '1d', adjustment: str = None,
+                        start_time: str = None, end_time: str = None, position: int = -1,
+                        data: pd.DataFrame = None) -> float:
+        """
+        获取股票在指定K线上的技术指标值，同一指标在同一份数据上只计算一次
+        
+        Args:
+            stock_code (str): 股票代码
+            indicator (Indicator): 技术指标对象
+            period (str): 数据周期
+            adjustment (str): 复权方式
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+            position (int): 按日期排序后的K线位置，默认为最后一根K线
+            data (pd.DataFrame): 调用方已读取的K线数据，为None时从上下文读取
+            
+        Returns:
+            float: 指标值，无数据或数据不足时为NaN
+        """
+        key = self._indicator_key(stock_code, indicator, period, adjustment, start_time, end_time, position)
+        
+        def compute():
+            stock_data = data if data is not None else self.get(stock_code, period, adjustment, start_time, end_time)
+            if stock_data is None or stock_data.empty:
+                return np.nan
+            return indicator.value_at(stock_data, position)
+        
+        return self.indicators.get_or_compute(key, compute)
+    
+    def indicator_panel(self, panel: Panel, indicator) -> np.ndarray:
+        """
+        获取面板上所有股票的技术指标数组，同一指标在同一面板上只计算一次
+        
+        Args:
+            panel (Panel): 面板数据
+            indicator (Indicator): 技术指标对象
+            
+        Returns:
+            np.ndarray: 与面板形状一致的指标值数组
+        """
+        key = ('panel', id(panel)) + self.indicators.indicator_key(indicator)
+        # 缓存中同时保存面板对象，面板在缓存清空前不会被回收，id不会被其他面板复用
+        _, values = self.indicators.get_or_compute(key, lambda: (panel, indicator.calculate_panel(panel)))
+        return values
+    
+    def indicator_last_values(self, panel: Panel, indicator) -> np.ndarray:
+        """
+        获取面板上每只股票最后一根K线上的技术指标值，同一指标在同一面板上只计算一次
+        
+        Args:
+            panel (Panel): 面板数据
+            indicator (Indicator): 技术指标对象
+            
+        Returns:
+            np.ndarray: 与panel.symbols对应的指标值，数据不足的股票为NaN
+        """
+        key = ('panel_last', id(panel)) + self.indicators.indicator_key(indicator)
+        _, values = self.indicators.get_or_compute(
+            key, lambda: (panel, panel.last_values(self.indicator_panel(panel, indicator))))
+        return values
+    
+    def seed_indicator_last_values(self, panel: Panel, indicator, values: np.ndarray):
+        """
+        写入在其他进程中计算好的面板最后值，之后的indicator_last_values直接命中缓存
+        
+        Args:
+            panel (Panel): 面板数据
+            indicator (Indicator): 技术指标对象
+            values (np.ndarray): 与panel.symbols对应的指标值
+        """
+        key = ('panel_last', id(panel)) + self.indicators.indicator_key(indicator)
+        self.indicators.put(key, (panel, values))
+    
+    def clear(self):
+        """清空已缓存的数据和统计信息"""
+        with self._lock:
+            self._data.clear()
+            self._panels.clear()
+            self.hits = 0
+            self.misses = 0
+        self.indicators.clear()
+        logger.debug("清空筛选数据上下文")
@@ -1,6 +1,7 @@
 """
 具体筛选器实现
 """
+import numpy as np
 import pandas as pd
 from typing import List, Dict, Union
 from .base import Filter
@@ -13,7 +14,9 @@ logger = get_logger(__name__)
 class MAFilter(Filter):
     """移动平均线筛选器"""
     
-    def __init__(self, period1: int = 5, period2: int = 10, condition: str = "gt"):
+    supports_panel = True
+    
+    def __init__(self, period1: int = 5, period2: int = 10, condition: str = "gt", data_period: str = "1d"):
         """
         初始化移动平均线筛选器
         
@@ -21,8 +24,10 @@ class MAFilter(Filter):
             period1 (int): 第一个MA周期
             period2 (int): 第二个MA周期
             condition (str): 比较条件 ("gt"表示MA1 > MA2, "lt"表示MA1 < MA2)
+            data_period (str): 数据周期，支持'1m', '5m', '30m', '1d'等
         """
-        super().__init__(f"MA{period1}_vs_MA{period2}")
+        name = f"MA{period1}_vs_MA{period2}"
+        super().__init__(name if data_period == '1d' else f"{name}_{data_period}", data_period)
         self.period1 = period1
         self.period2 = period2
         self.condition = condition
@@ -30,7 +35,54 @@ class MAFilter(Filter):
         self.ma2_indicator = MAIndicator(period2)
         logger.debug(f"初始化移动平均线筛选器，条件: MA{period1} {condition} MA{period2}")
     
-    def filter(self, stock_codes: List[str], start_time: str = None, end_time: str = None) -> List[str]:
+    def indicators(self) -> List:
+        """声明筛选器用到的技术指标"""
+        return [self.ma1_indicator, self.ma2_indicator]
+    
+    def evaluate(self, stock_code: str, start_time: str = None, end_time: str = None, *, context=None) -> bool:
+        """
+        判断单只股票是否通过移动平均线筛选
+        
+        Args:
+            stock_code (str): 股票代码
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+            context (DataContext): 筛选数据上下文，为None时直接下载数据
+            
+        Returns:
+            bool: 是否通过筛选
+        """
+        # 获取股票数据
+        data = self._load_data(stock_code, start_time, end_time, self.data_period, context=context)
+        
+        if data is None or data.empty:
+            logger.debug(f"股票 {stock_code} 数据为空，跳过")
+            # 根据spec要求，数据下载失败应视为该股票筛选失败
+            return False
+        
+        # 只用最后period根K线计算两个移动平均线在最后一根K线上的值
+        ma1_value = self._indicator_value(self.ma1_indicator, stock_code, data, start_time, end_time,
+                                          context=context)
+        ma2_value = self._indicator_value(self.ma2_indicator, stock_code, data, start_time, end_time,
+                                          context=context)
+        
+        # 检查是否有足够的数据
+        if pd.isna(ma1_value) or pd.isna(ma2_value):
+            logger.debug(f"股票 {stock_code} MA数据不足，跳过")
+            return False
+        
+        # 根据条件判断是否通过筛选
+        if self.condition == "gt" and ma1_value > ma2_value:
+            logger.debug(f"股票 {stock_code} 通过MA筛选: {ma1_value} > {ma2_value}")
+            return True
+        elif self.condition == "lt" and ma1_value < ma2_value:
+            logger.debug(f"股票 {stock_code} 通过MA筛选: {ma1_value} < {ma2_value}")
+            return True
+        logger.debug(f"股票 {stock_code} 未通过MA筛选")
+        return False
+    
+    def filter(self, stock_codes: List[str], start_time: str = None, end_time: str = None, *,
+               context=None) -> List[str]:
         """
         执行移动平均线筛选
         
@@ -38,67 +90,68 @@ class MAFilter(Filter):
             stock_codes (List[str]): 股票代码列表
             start_time (str): 数据开始时间
             end_time (str): 数据结束时间
+            context (DataContext): 筛选数据上下文，为None时直接下载数据
             
         Returns:
             List[str]: 通过筛选的股票代码列表
         """
         try:
             logger.info("开始执行移动平均线筛选")
-            filtered_stocks = []
-            
-            for stock_code in stock_codes:
-                try:
-                    # 下载股票数据
-                    from ..engine import download_single_stock
-                    data = download_single_stock(stock_code, start_time, end_time, '1d', 'pre')
-                    
-                    if data is None or data.empty:
-                        logger.debug(f"股票 {stock_code} 数据为空，跳过")
-                        # 根据spec要求，数据下载失败应视为该股票筛选失败
-                        continue
-                    
-                    # 计算两个移动平均线
-                    data_with_ma1 = self.ma1_indicator.calculate(data.copy())
-                    data_with_ma2 = self.ma2_indicator.calculate(data_with_ma1.copy())
-                    
-                    # 获取最后一行数据进行比较
-                    last_row = data_with_ma2.iloc[-1]
-                    ma1_column = f'MA{self.period1}'
-                    ma2_column = f'MA{self.period2}'
-                    
-                    # 检查是否有足够的数据
-                    if pd.isna(last_row[ma1_column]) or pd.isna(last_row[ma2_column]):
-                        logger.debug(f"股票 {stock_code} MA数据不足，跳过")
-                        continue
-                    
-                    # 根据条件判断是否通过筛选
-                    ma1_value = last_row[ma1_column]
-                    ma2_value = last_row[ma2_column]
-                    
-                    if self.condition == "gt" and ma1_value > ma2_value:
-                        filtered_stocks.append(stock_code)
-                        logger.debug(f"股票 {stock_code} 通过MA筛选: {ma1_value} > {ma2_value}")
-                    elif self.condition == "lt" and ma1_value < ma2_value:
-                        filtered_stocks.append(stock_code)
-                        logger.debug(f"股票 {stock_code} 通过MA筛选: {ma1_value} < {ma2_value}")
-                    else:
-                        logger.debug(f"股票 {stock_code} 未通过MA筛选")
-                        
-                except Exception as e:
-                    logger.error(f"筛选股票 {stock_code} 时出错: {str(e)}")
-                    continue
-            
+            filtered_stocks = self._filter_each(stock_codes, start_time, end_time, context)
             logger.info(f"移动平均线筛选完成，通过筛选的股票数量: {len(filtered_stocks)}")
             return filtered_stocks
             
         except Exception as e:
             logger.error(f"执行移动平均线筛选时出错: {str(e)}")
             raise
+    
+    def filter_panel(self, panel, context=None) -> np.ndarray:
+        """
+        在面板数据上批量执行移动平均线筛选
+        
+        Args:
+            panel (Panel): 候选股票的日线面板数据
+            context (DataContext): 筛选数据上下文，用于共享技术指标的计算结果
+            
+        Returns:
+            np.ndarray: 与panel.symbols对应的布尔掩码，通过筛选的股票为True
+        """
+        ma1_values = self._panel_last_values(panel, self.ma1_indicator, context)
+        ma2_values = self._panel_last_values(panel, self.ma2_indicator, context)
+        
+        # 与NaN的比较结果为False，MA数据不足的股票自动视为未通过
+        if self.condition == "gt":
+            return ma1_values > ma2_values
+        elif self.condition == "lt":
+            return ma1_values < ma2_values
+        return np.zeros(len(panel), dtype=bool)
+    
+    def signal_panel(self, panel, context=None) -> np.ndarray:
+        """
+        判断每只股票在每根K线上是否通过移动平均线筛选
+        
+        Args:
+            panel (Panel): 股票的日线面板数据
+            context (DataContext): 筛选数据上下文，用于共享技术指标的计算结果
+            
+        Returns:
+            np.ndarray: 与面板形状一致的布尔数组，没有K线或MA数据不足的位置为False
+        """
+        ma1_values = self._panel_values(panel, self.ma1_indicator, context)
+        ma2_values = self._panel_values(panel, self.ma2_indicator, context)
+        
+        if self.condition == "gt":
+            return ma1_values > ma2_values
+        elif self.condition == "lt":
+            return ma1_values < ma2_values
+        return np.zeros(panel.shape, dtype=bool)
 
 
 class WRFilter(Filter):
     """威廉指标筛选器"""
     
+    supports_panel = True
+    
     def __init__(self, period: int = 14, threshold: float = -80, condition: str = "lt", data_period: str = "1d"):
         """
         初始化威廉指标筛选器
@@ -109,15 +162,59 @@ class WRFilter(Filter):
             condition (str): 比较条件 ("lt"表示WR < threshold，"gt"表示WR > threshold)
             data_period (str): 数据周期，支持'1m', '5m', '30m', '1d'等
         """
-        super().__init__(f"WR{period}_{data_period}")
+        super().__init__(f"WR{period}_{data_period}", data_period)
         self.period = period
         self.threshold = threshold
         self.condition = condition
-        self.data_period = data_period
         self.wr_indicator = WRIindicator(period)
         logger.debug(f"初始化威廉指标筛选器，条件: WR{period} {condition} {threshold} 数据周期: {data_period}")
     
-    def filter(self, stock_codes: List[str], start_time: str = None, end_time: str = None) -> List[str]:
+    def indicators(self) -> List:
+        """声明筛选器用到的技术指标"""
+        return [self.wr_indicator]
+    
+    def evaluate(self, stock_code: str, start_time: str = None, end_time: str = None, *, context=None) -> bool:
+        """
+        判断单只股票是否通过威廉指标筛选
+        
+        Args:
+            stock_code (str): 股票代码
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+            context (DataContext): 筛选数据上下文，为None时直接下载数据
+            
+        Returns:
+            bool: 是否通过筛选
+        """
+        # 获取股票数据
+        data = self._load_data(stock_code, start_time, end_time, self.data_period, context=context)
+        
+        if data is None or data.empty:
+            logger.debug(f"股票 {stock_code} 数据为空，跳过")
+            # 根据spec要求，数据下载失败应视为该股票筛选失败
+            return False
+        
+        # 只用最后period根K线计算最后一根K线上的威廉指标
+        wr_value = self._indicator_value(self.wr_indicator, stock_code, data, start_time, end_time,
+                                         context=context)
+        
+        # 检查是否有足够的数据
+        if pd.isna(wr_value):
+            logger.debug(f"股票 {stock_code} WR数据不足，跳过")
+            return False
+        
+        # 根据条件判断是否通过筛选
+        if self.condition == "lt" and wr_value < self.threshold:
+            logger.debug(f"股票 {stock_code} 通过WR筛选: {wr_value} < {self.threshold}")
+            return True
+        elif self.condition == "gt" and wr_value > self.threshold:
+            logger.debug(f"股票 {stock_code} 通过WR筛选: {wr_value} > {self.threshold}")
+            return True
+        logger.debug(f"股票 {stock_code} 未通过WR筛选")
+        return False
+    
+    def filter(self, stock_codes: List[str], start_time: str = None, end_time: str = None, *,
+               context=None) -> List[str]:
         """
         执行威廉指标筛选
         
@@ -125,68 +222,71 @@ class WRFilter(Filter):
             stock_codes (List[str]): 股票代码列表
             start_time (str): 数据开始时间
             end_time (str): 数据结束时间
+            context (DataContext): 筛选数据上下文，为None时直接下载数据
             
         Returns:
             List[str]: 通过筛选的股票代码列表
         """
         try:
             logger.info(f"开始执行威廉指标筛选，数据周期: {self.data_period}")
-            filtered_stocks = []
-            
-            for stock_code in stock_codes:
-                try:
-                    # 下载股票数据
-                    from ..engine import download_single_stock
-                    data = download_single_stock(stock_code, start_time, end_time, self.data_period, 'pre')
-                    
-                    if data is None or data.empty:
-                        logger.debug(f"股票 {stock_code} 数据为空，跳过")
-                        # 根据spec要求，数据下载失败应视为该股票筛选失败
-                        continue
-                    
-                    # 计算威廉指标
-                    data_with_wr = self.wr_indicator.calculate(data.copy())
-                    
-                    # 获取最后一行数据进行比较
-                    last_row = data_with_wr.iloc[-1]
-                    wr_column = f'WR{self.period}'
-                    
-                    # 检查是否有足够的数据
-                    if pd.isna(last_row[wr_column]):
-                        logger.debug(f"股票 {stock_code} WR数据不足，跳过")
-                        continue
-                    
-                    # 根据条件判断是否通过筛选
-                    wr_value = last_row[wr_column]
-                    
-                    if self.condition == "lt" and wr_value < self.threshold:
-                        filtered_stocks.append(stock_code)
-                        logger.debug(f"股票 {stock_code} 通过WR筛选: {wr_value} < {self.threshold}")
-                    elif self.condition == "gt" and wr_value > self.threshold:
-                        filtered_stocks.append(stock_code)
-                        logger.debug(f"股票 {stock_code} 通过WR筛选: {wr_value} > {self.threshold}")
-                    else:
-                        logger.debug(f"股票 {stock_code} 未通过WR筛选")
-                        
-                except Exception as e:
-                    logger.error(f"筛选股票 {stock_code} 时出错: {str(e)}")
-                    continue
-            
+            filtered_stocks = self._filter_each(stock_codes, start_time, end_time, context)
             logger.info(f"威廉指标筛选完成，通过筛选的股票数量: {len(filtered_stocks)}")
             return filtered_stocks
             
         except Exception as e:
             logger.error(f"执行威廉指标筛选时出错: {str(e)}")
             raise
+    
+    def filter_panel(self, panel, context=None) -> np.ndarray:
+        """
+        在面板数据上批量执行威廉指标筛选
+        
+        Args:
+            panel (Panel): 候选股票在data_period周期上的面板数据
+            context (DataContext): 筛选数据上下文，用于共享技术指标的计算结果
+            
+        Returns:
+            np.ndarray: 与panel.symbols对应的布尔掩码，通过筛选的股票为True
+        """
+        wr_values = self._panel_last_values(panel, self.wr_indicator, context)
+        
+        # 与NaN的比较结果为False，WR数据不足的股票自动视为未通过
+        if self.condition == "lt":
+            return wr_values < self.threshold
+        elif self.condition == "gt":
+            return wr_values > self.threshold
+        return np.zeros(len(panel), dtype=bool)
+    
+    def signal_panel(self, panel, context=None) -> np.ndarray:
+        """
+        判断每只股票在每根K线上是否通过威廉指标筛选
+        
+        Args:
+            panel (Panel): 股票在data_period周期上的面板数据
+            context (DataContext): 筛选数据上下文，用于共享技术指标的计算结果
+            
+        Returns:
+            np.ndarray: 与面板形状一致的布尔数组，没有K线或WR数据不足的位置为False
+        """
+        wr_values = self._panel_values(panel, self.wr_indicator, context)
+        
+        if self.condition == "lt":
+            return wr_values < self.threshold
+        elif self.condition == "gt":
+            return wr_values > self.threshold
+        return np.zeros(panel.shape, dtype=bool)
 
 
 class GeneralComparisonFilter(Filter):
     """通用比较筛选器"""
     
+    supports_panel = True
+    
     def __init__(self, 
                  left_operand: Union[str, int, float], 
                  right_operand: Union[str, int, float], 
-                 condition: str = "gt"):
+                 condition: str = "gt",
+                 data_period: str = "1d"):
         """
         初始化通用比较筛选器
         
@@ -194,8 +294,10 @@ class GeneralComparisonFilter(Filter):
             left_operand: 左操作数，可以是指标名称(如"MA5")、价格字段(如"close")或数值
             right_operand: 右操作数，可以是指标名称、价格字段或数值
             condition: 比较条件 ("gt"表示>, "lt"表示<, "eq"表示=, "gte"表示>=, "lte"表示<=)
+            data_period: 数据周期，支持'1m', '5m', '30m', '1d'等
         """
-        super().__init__(f"GeneralComparison_{left_operand}_{condition}_{right_operand}")
+        name = f"GeneralComparison_{left_operand}_{condition}_{right_operand}"
+        super().__init__(name if data_period == '1d' else f"{name}_{data_period}", data_period)
         self.left_operand = left_operand
         self.right_operand = right_operand
         self.condition = condition
@@ -210,6 +312,10 @@ class GeneralComparisonFilter(Filter):
         
         logger.debug(f"初始化通用比较筛选器: {left_operand} {condition} {right_operand}")
     
+    def indicators(self) -> List:
+        """声明筛选器用到的技术指标"""
+        return [indicator for indicator in (self.left_indicator, self.right_indicator) if indicator is not None]
+    
     def _parse_operand_type(self, operand: Union[str, int, float]) -> str:
         """解析操作数类型"""
         if isinstance(operand, (int, float)):
@@ -237,7 +343,9 @@ class GeneralComparisonFilter(Filter):
         else:
             raise ValueError(f"不支持的指标类型: {indicator_str}")
     
-    def _get_value(self, data: pd.DataFrame, operand: Union[str, int, float], operand_type: str):
+    def _get_value(self, data: pd.DataFrame, operand: Union[str, int, float], operand_type: str,
+                   indicator=None, stock_code: str = None, start_time: str = None, end_time: str = None,
+                   context=None):
         """获取操作数的值"""
         if operand_type == "value":
             return operand
@@ -245,14 +353,145 @@ class GeneralComparisonFilter(Filter):
             # 获取价格字段的最新值
             return data.iloc[-1][operand]
         elif operand_type == "indicator":
-            # 计算指标值并返回最新值
-            indicator_data = self._create_indicator(operand).calculate(data.copy())
-            indicator_column = operand
-            return indicator_data.iloc[-1][indicator_column]
+            # 只用末尾窗口计算指标的最新值，有筛选数据上下文时共享计算结果
+            return self._indicator_value(indicator, stock_code, data, start_time, end_time, context=context)
         else:
             raise ValueError(f"未知的操作数类型: {operand_type}")
     
-    def filter(self, stock_codes: List[str], start_time: str = None, end_time: str = None) -> List[str]:
+    def _get_panel_values(self, panel, operand: Union[str, int, float], operand_type: str,
+                          indicator=None, context=None) -> np.ndarray:
+        """获取操作数在每只股票最后一根K线上的值"""
+        if operand_type == "value":
+            return np.full(len(panel), float(operand))
+        elif operand_type == "field":
+            return panel.last_values(panel.field(operand))
+        elif operand_type == "indicator":
+            return self._panel_last_values(panel, indicator, context)
+        else:
+            raise ValueError(f"未知的操作数类型: {operand_type}")
+    
+    def filter_panel(self, panel, context=None) -> np.ndarray:
+        """
+        在面板数据上批量执行通用比较筛选
+        
+        Args:
+            panel (Panel): 候选股票的日线面板数据
+            context (DataContext): 筛选数据上下文，用于共享技术指标的计算结果
+            
+        Returns:
+            np.ndarray: 与panel.symbols对应的布尔掩码，通过筛选的股票为True
+        """
+        left_values = self._get_panel_values(panel, self.left_operand, self.left_type, self.left_indicator, context)
+        right_values = self._get_panel_values(panel, self.right_operand, self.right_type, self.right_indicator,
+                                              context)
+        
+        # 与NaN的比较结果为False，数据不足的股票自动视为未通过
+        if self.condition == "gt":
+            return left_values > right_values
+        elif self.condition == "lt":
+            return left_values < right_values
+        elif self.condition == "eq":
+            return left_values == right_values
+        elif self.condition == "gte":
+            return left_values >= right_values
+        elif self.condition == "lte":
+            return left_values <= right_values
+        return np.zeros(len(panel), dtype=bool)
+    
+    def _get_panel_arrays(self, panel, operand: Union[str, int, float], operand_type: str,
+                          indicator=None, context=None) -> np.ndarray:
+        """获取操作数在每只股票每根K线上的值，没有K线的位置为NaN"""
+        if operand_type == "value":
+            return np.where(panel.valid(), float(operand), np.nan)
+        elif operand_type == "field":
+            return panel.field(operand)
+        elif operand_type == "indicator":
+            return self._panel_values(panel, indicator, context)
+        else:
+            raise ValueError(f"未知的操作数类型: {operand_type}")
+    
+    def signal_panel(self, panel, context=None) -> np.ndarray:
+        """
+        判断每只股票在每根K线上是否通过通用比较筛选
+        
+        Args:
+            panel (Panel): 股票在data_period周期上的面板数据
+            context (DataContext): 筛选数据上下文，用于共享技术指标的计算结果
+            
+        Returns:
+            np.ndarray: 与面板形状一致的布尔数组，没有K线或数据不足的位置为False
+        """
+        left_values = self._get_panel_arrays(panel, self.left_operand, self.left_type, self.left_indicator, context)
+        right_values = self._get_panel_arrays(panel, self.right_operand, self.right_type, self.right_indicator,
+                                              context)
+        
+        if self.condition == "gt":
+            return left_values > right_values
+        elif self.condition == "lt":
+            return left_values < right_values
+        elif self.condition == "eq":
+            return left_values == right_values
+        elif self.condition == "gte":
+            return left_values >= right_values
+        elif self.condition == "lte":
+            return left_values <= right_values
+        return np.zeros(panel.shape, dtype=bool)
+    
+    def evaluate(self, stock_code: str, start_time: str = None, end_time: str = None, *, context=None) -> bool:
+        """
+        判断单只股票是否通过通用比较筛选
+        
+        Args:
+            stock_code (str): 股票代码
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+            context (DataContext): 筛选数据上下文，为None时直接下载数据
+            
+        Returns:
+            bool: 是否通过筛选
+        """
+        # 获取股票数据
+        data = self._load_data(stock_code, start_time, end_time, self.data_period, context=context)
+        
+        if data is None or data.empty:
+            logger.debug(f"股票 {stock_code} 数据为空，跳过")
+            # 根据spec要求，数据下载失败应视为该股票筛选失败
+            return False
+        
+        # 获取左操作数的值
+        left_value = self._get_value(data, self.left_operand, self.left_type, self.left_indicator,
+                                     stock_code, start_time, end_time, context)
+        
+        # 获取右操作数的值
+        right_value = self._get_value(data, self.right_operand, self.right_type, self.right_indicator,
+                                      stock_code, start_time, end_time, context)
+        
+        # 检查是否有足够的数据
+        if pd.isna(left_value) or pd.isna(right_value):
+            logger.debug(f"股票 {stock_code} 比较数据不足，跳过")
+            return False
+        
+        # 根据条件判断是否通过筛选
+        passed = False
+        if self.condition == "gt" and left_value > right_value:
+            passed = True
+        elif self.condition == "lt" and left_value < right_value:
+            passed = True
+        elif self.condition == "eq" and left_value == right_value:
+            passed = True
+        elif self.condition == "gte" and left_value >= right_value:
+            passed = True
+        elif self.condition == "lte" and left_value <= right_value:
+            passed = True
+        
+        if passed:
+            logger.debug(f"股票 {stock_code} 通过筛选: {left_value} {self.condition} {right_value}")
+        else:
+            logger.debug(f"股票 {stock_code} 未通过筛选: {left_value} {self.condition} {right_value}")
+        return passed
+    
+    def filter(self, stock_codes: List[str], start_time: str = None, end_time: str = None, *,
+               context=None) -> List[str]:
         """
         执行通用比较筛选
         
@@ -260,59 +499,14 @@ class GeneralComparisonFilter(Filter):
             stock_codes (List[str]): 股票代码列表
             start_time (str): 数据开始时间
             end_time (str): 数据结束时间
+            context (DataContext): 筛选数据上下文，为None时直接下载数据
             
         Returns:
             List[str]: 通过筛选的股票代码列表
         """
         try:
             logger.info(f"开始执行通用比较筛选: {self.left_operand} {self.condition} {self.right_operand}")
-            filtered_stocks = []
-            
-            for stock_code in stock_codes:
-                try:
-                    # 下载股票数据
-                    from ..engine import download_single_stock
-                    data = download_single_stock(stock_code, start_time, end_time, '1d', 'pre')
-                    
-                    if data is None or data.empty:
-                        logger.debug(f"股票 {stock_code} 数据为空，跳过")
-                        # 根据spec要求，数据下载失败应视为该股票筛选失败
-                        continue
-                    
-                    # 获取左操作数的值
-                    left_value = self._get_value(data, self.left_operand, self.left_type)
-                    
-                    # 获取右操作数的值
-                    right_value = self._get_value(data, self.right_operand, self.right_type)
-                    
-                    # 检查是否有足够的数据
-                    if pd.isna(left_value) or pd.isna(right_value):
-                        logger.debug(f"股票 {stock_code} 比较数据不足，跳过")
-                        continue
-                    
-                    # 根据条件判断是否通过筛选
-                    passed = False
-                    if self.condition == "gt" and left_value > right_value:
-                        passed = True
-                    elif self.condition == "lt" and left_value < right_value:
-                        passed = True
-                    elif self.condition == "eq" and left_value == right_value:
-                        passed = True
-                    elif self.condition == "gte" and left_value >= right_value:
-                        passed = True
-                    elif self.condition == "lte" and left_value <= right_value:
-                        passed = True
-                    
-                    if passed:
-                        filtered_stocks.append(stock_code)
-                        logger.debug(f"股票 {stock_code} 通过筛选: {left_value} {self.condition} {right_value}")
-                    else:
-                        logger.debug(f"股票 {stock_code} 未通过筛选: {left_value} {self.condition} {right_value}")
-                        
-                except Exception as e:
-                    logger.error(f"筛选股票 {stock_code} 时出错: {str(e)}")
-                    continue
-            
+            filtered_stocks = self._filter_each(stock_codes, start_time, end_time, context)
             logger.info(f"通用比较筛选完成，通过筛选的股票数量: {len(filtered_stocks)}")
             return filtered_stocks
             
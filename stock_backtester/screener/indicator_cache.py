@@ -0,0 +1,94 @@
+"""
+技术指标缓存，在一次筛选运行中共享指标计算结果，避免多个筛选器重复计算同一指标
+"""
+import threading
+from typing import Any, Callable, Dict
+from ..feeds.singleflight import SingleFlight
+from ..logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class IndicatorCache:
+    """
+    技术指标缓存
+
+    缓存键由数据键（股票代码/面板、数据周期、复权方式、时间范围）和指标键（指标类型、指标名称）组成，
+    指标名称中已包含参数（如MA5、WR14），同一指标在同一份数据上只计算一次；
+    多个线程同时请求尚未缓存的同一指标时，只有一个线程计算，其余线程等待并共享结果。
+    """
+
+    def __init__(self):
+        """初始化技术指标缓存"""
+        self.hits = 0
+        self.misses = 0
+        self._values: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+        # 合并同时进行的相同指标计算
+        self.flights = SingleFlight()
+
+    @staticmethod
+    def indicator_key(indicator) -> tuple:
+        """
+        生成指标键
+
+        Args:
+            indicator (Indicator): 技术指标对象
+
+        Returns:
+            tuple: (指标类型, 指标名称)
+        """
+        return type(indicator).__name__, indicator.name
+
+    def get_or_compute(self, key: tuple, compute: Callable[[], Any]) -> Any:
+        """
+        读取缓存的指标结果，未缓存时计算并记住结果
+
+        Args:
+            key (tuple): 缓存键
+            compute (Callable): 计算指标结果的函数
+
+        Returns:
+            Any: 指标结果
+        """
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                return self._values[key]
+            self.misses += 1
+
+        return self.flights.do(key, self._compute, key, compute)
+
+    def _compute(self, key: tuple, compute: Callable[[], Any]) -> Any:
+        """计算未缓存的指标结果并写入缓存"""
+        with self._lock:
+            # 检查缓存之后、开始计算之前，结果可能已由刚完成的相同计算写入缓存
+            if key in self._values:
+                return self._values[key]
+
+        value = compute()
+        with self._lock:
+            self._values[key] = value
+        return value
+
+    def put(self, key: tuple, value: Any):
+        """
+        写入已在别处计算好的指标结果
+
+        Args:
+            key (tuple): 缓存键
+            value (Any): 指标结果
+        """
+        with self._lock:
+            self._values[key] = value
+
+    def __len__(self):
+        return len(self._values)
+
+    def clear(self):
+        """清空已缓存的指标结果和统计信息"""
+        with self._lock:
+            self._values.clear()
+            self.hits = 0
+            self.misses = 0
+        logger.debug("清空技术指标缓存")
@@ -4,6 +4,7 @@
 import pandas as pd
 import numpy as np
 from .base import Indicator
+from ..panel import rolling_mean, rolling_max, rolling_min
 from ..logger import get_logger
 
 logger = get_logger(__name__)
@@ -12,6 +13,8 @@ logger = get_logger(__name__)
 class MAIndicator(Indicator):
     """移动平均线指标"""
     
+    panel_fields = ('close',)
+    
     def __init__(self, period: int = 5):
         """
         初始化移动平均线指标
@@ -23,6 +26,11 @@ class MAIndicator(Indicator):
         self.period = period
         logger.debug(f"初始化移动平均线指标，周期: {period}")
     
+    @property
+    def lookback(self) -> int:
+        """计算一根K线上的指标值需要的K线数量"""
+        return self.period
+    
     def calculate(self, stock_data: pd.DataFrame) -> pd.DataFrame:
         """
         计算移动平均线
@@ -47,11 +55,43 @@ class MAIndicator(Indicator):
         except Exception as e:
             logger.error(f"计算移动平均线时出错: {str(e)}")
             raise
+    
+    def calculate_panel(self, panel) -> np.ndarray:
+        """
+        在面板数据上计算所有股票的移动平均线
+        
+        Args:
+            panel (Panel): 面板数据
+            
+        Returns:
+            np.ndarray: 与面板形状一致的移动平均线数组
+        """
+        logger.debug(f"面板计算移动平均线，周期: {self.period}, 股票数量: {len(panel)}")
+        return rolling_mean(panel.field('close'), self.period, panel.valid())
+    
+    def value_at(self, stock_data: pd.DataFrame, position: int = -1) -> float:
+        """
+        计算指定K线上的移动平均线，只读取该K线及之前period根K线
+        
+        Args:
+            stock_data (pd.DataFrame): 按日期排序的股票数据
+            position (int): K线位置，负数表示从末尾倒数，默认为最后一根K线
+            
+        Returns:
+            float: 移动平均线的值，K线不足period根时为NaN
+        """
+        window = self._trailing_window(stock_data, self.period, position)
+        if window is None:
+            return np.nan
+        # 窗口内有缺失值时与rolling的结果一致，返回NaN
+        return float(np.mean(window['close'].to_numpy(dtype=float)))
 
 
 class WRIindicator(Indicator):
     """威廉指标"""
     
+    panel_fields = ('high', 'low', 'close')
+    
     def __init__(self, period: int = 14):
         """
         初始化威廉指标
@@ -63,6 +103,11 @@ class WRIindicator(Indicator):
         self.period = period
         logger.debug(f"初始化威廉指标，周期: {period}")
     
+    @property
+    def lookback(self) -> int:
+        """计算一根K线上的指标值需要的K线数量"""
+        return self.period
+    
     def calculate(self, stock_data: pd.DataFrame) -> pd.DataFrame:
         """
         计算威廉指标
@@ -99,4 +144,49 @@ class WRIindicator(Indicator):
             return stock_data
         except Exception as e:
             logger.error(f"计算威廉指标时出错: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+    
+    def calculate_panel(self, panel) -> np.ndarray:
+        """
+        在面板数据上计算所有股票的威廉指标
+        
+        Args:
+            panel (Panel): 面板数据
+            
+        Returns:
+            np.ndarray: 与面板形状一致的威廉指标数组
+        """
+        logger.debug(f"面板计算威廉指标，周期: {self.period}, 股票数量: {len(panel)}")
+        valid = panel.valid()
+        high_period = rolling_max(panel.field('high'), self.period, valid)
+        low_period = rolling_min(panel.field('low'), self.period, valid)
+        denominator = high_period - low_period
+        # 当最高价等于最低价时，威廉指标设为-50（中性值）
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(
+                denominator == 0,
+                -50.0,
+                (high_period - panel.field('close')) / denominator * -100
+            )
+    
+    def value_at(self, stock_data: pd.DataFrame, position: int = -1) -> float:
+        """
+        计算指定K线上的威廉指标，只读取该K线及之前period根K线
+        
+        Args:
+            stock_data (pd.DataFrame): 按日期排序的股票数据
+            position (int): K线位置，负数表示从末尾倒数，默认为最后一根K线
+            
+        Returns:
+            float: 威廉指标的值，K线不足period根时为NaN
+        """
+        window = self._trailing_window(stock_data, self.period, position)
+        if window is None:
+            return np.nan
+        high_period = np.max(window['high'].to_numpy(dtype=float))
+        low_period = np.min(window['low'].to_numpy(dtype=float))
+        denominator = high_period - low_period
+        # 当最高价等于最低价时，威廉指标设为-50（中性值）
+        if denominator == 0:
+            return -50.0
+        return float((high_period - float(window['close'].iloc[-1])) / denominator * -100)
@@ -0,0 +1,481 @@
+"""
+实时筛选模块，订阅K线推送，增量更新每只股票的指标状态并发布进入/退出筛选结果的事件
+
+LiveScreener为每个(股票, 数据周期)保存回看长度内的K线窗口和在线技术指标：
+- 新K线以常数摊还时间更新在线指标；同一根K线的重复推送（盘中未收盘的K线）由窗口重放
+- 每批推送只重新判断K线发生变化的股票：所有筛选器都支持面板筛选时，把这些股票的窗口右对齐拼成面板，
+  用在线指标值填充面板最后值后批量判断；否则用窗口和在线指标值填充一个新的筛选数据上下文逐只判断。
+  两种方式都直接命中缓存，不下载数据也不重新计算整段指标
+- 股票由未通过变为通过时发布enter事件，由通过变为未通过时发布exit事件
+
+数据来源：
+- XtdataSource 通过xtdata.subscribe_quote订阅K线推送
+- ReplaySource 按时间顺序回放本地K线，用于测试和盘后复盘
+"""
+import time
+import threading
+import functools
+import numpy as np
+import pandas as pd
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+from .base import Filter
+from .context import DataContext
+from .planner import ExecutionPlan
+from .online import online_indicator, bar_records
+from .indicator_cache import IndicatorCache
+from ..panel import Panel, PANEL_FIELDS
+from ..logger import get_logger
+
+logger = get_logger(__name__)
+
+# 窗口中保存的K线字段
+BAR_FIELDS = ('date', 'open', 'high', 'low', 'close', 'volume', 'amount')
+
+
+class LiveEvent:
+    """股票进入或退出筛选结果的事件"""
+
+    ENTER = 'enter'
+    EXIT = 'exit'
+
+    def __init__(self, kind: str, stock_code: str, period: str, bar_time, latency: float):
+        """
+        初始化事件
+
+        Args:
+            kind (str): 事件类型，enter或exit
+            stock_code (str): 股票代码
+            period (str): 触发重新判断的K线周期
+            bar_time (pd.Timestamp): 触发重新判断的K线时间
+            latency (float): 从收到K线推送到发布事件的耗时（秒）
+        """
+        self.kind = kind
+        self.stock_code = stock_code
+        self.period = period
+        self.bar_time = bar_time
+        self.latency = latency
+
+    def __repr__(self):
+        return f"LiveEvent({self.kind}, {self.stock_code}, {self.period}, {self.bar_time})"
+
+
+class _SymbolState:
+    """一只股票在一个数据周期上的K线窗口和在线指标状态"""
+
+    def __init__(self, window_size: int, indicators: List):
+        """
+        初始化状态
+
+        Args:
+            window_size (int): 窗口保存的K线数量
+            indicators (List[Indicator]): 有在线实现的批量技术指标
+        """
+        self.window = deque(maxlen=window_size)
+        self.online = {IndicatorCache.indicator_key(indicator): (indicator, online_indicator(indicator))
+                       for indicator in indicators}
+        self.frame = None
+        self.array = None
+
+    @property
+    def last_time(self):
+        """窗口中最后一根K线的时间"""
+        return self.window[-1]['date'] if self.window else None
+
+    def update(self, bar: dict):
+        """追加新K线或替换同一时间的K线，并更新在线指标"""
+        self.frame = None
+        self.array = None
+        if self.window and bar['date'] == self.last_time:
+            # 盘中同一根K线重复推送，替换后由窗口重放在线指标
+            self.window[-1] = bar
+            for _, online in self.online.values():
+                online.replay(list(self.window), online.count)
+            return
+        if self.window and bar['date'] < self.last_time:
+            logger.debug(f"忽略过期的K线推送: {bar['date']}")
+            return
+        self.window.append(bar)
+        for _, online in self.online.values():
+            online.update(bar)
+
+    def warm_start(self, stock_data: pd.DataFrame):
+        """用历史K线填充窗口并预热在线指标"""
+        self.window.clear()
+        self.frame = None
+        self.array = None
+        if stock_data is None or stock_data.empty:
+            return
+        if not stock_data['date'].is_monotonic_increasing:
+            stock_data = stock_data.sort_values('date')
+        columns = [field for field in BAR_FIELDS if field in stock_data.columns]
+        # 窗口不短于任何指标的回看长度，在线指标直接由窗口内的K线预热
+        self.window.extend(bar_records(stock_data.iloc[-self.window.maxlen:], columns))
+        for _, online in self.online.values():
+            online.replay(list(self.window), len(stock_data))
+
+    def to_frame(self) -> Optional[pd.DataFrame]:
+        """窗口内的K线数据，窗口未变化时复用上次的结果"""
+        if not self.window:
+            return None
+        if self.frame is None:
+            self.frame = pd.DataFrame.from_records(list(self.window))
+        return self.frame
+
+    def to_array(self) -> np.ndarray:
+        """窗口内K线的面板字段，形状为(K线数量, 字段数量)，窗口未变化时复用上次的结果"""
+        if self.array is None:
+            self.array = np.array([[np.nan if bar.get(field) is None else bar[field] for field in PANEL_FIELDS]
+                                   for bar in self.window], dtype=float).reshape(len(self.window), len(PANEL_FIELDS))
+        return self.array
+
+
+class LiveScreener:
+    """实时筛选器"""
+
+    def __init__(self, filters: List[Filter], adjustment: str = 'pre'):
+        """
+        初始化实时筛选器
+
+        Args:
+            filters (List[Filter]): 按执行顺序排列的筛选器列表，可使用Screener.ordered_filters()
+            adjustment (str): 复权方式
+        """
+        self.adjustment = adjustment
+        self.plan = ExecutionPlan(filters, None, None, adjustment, vectorized=False, stock_major=True)
+        # 每个数据周期上有在线实现的技术指标，没有在线实现的指标由筛选器在窗口上计算
+        self.indicators: Dict[str, List] = {}
+        for stage in self.plan.stages:
+            period = stage.filter.data_period
+            for indicator in stage.indicators:
+                try:
+                    online_indicator(indicator)
+                except TypeError:
+                    logger.debug(f"技术指标 {indicator.name} 没有在线实现，判断时在K线窗口上计算")
+                    continue
+                self.indicators.setdefault(period, []).append(indicator)
+        self.passing = set()
+        self.bars_received = 0
+        self.evaluations = 0
+        self._states: Dict[tuple, _SymbolState] = {}
+        self._dirty: Dict[str, tuple] = {}
+        self._listeners: List[Callable[[LiveEvent], None]] = []
+        self._lock = threading.Lock()
+        logger.debug(f"初始化实时筛选器，筛选器数量: {len(filters)}, 数据周期: {self.plan.periods}")
+
+    @property
+    def periods(self) -> List[str]:
+        """需要订阅的数据周期"""
+        return self.plan.periods
+
+    def subscribe(self, callback: Callable[[LiveEvent], None]) -> 'LiveScreener':
+        """
+        订阅进入/退出事件
+
+        Args:
+            callback (Callable[[LiveEvent], None]): 事件回调
+
+        Returns:
+            LiveScreener: 实时筛选器实例，支持链式调用
+        """
+        self._listeners.append(callback)
+        return self
+
+    def _state(self, stock_code: str, period: str) -> _SymbolState:
+        """获取股票在指定周期上的状态，不存在时创建"""
+        key = (stock_code, period)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _SymbolState(self.plan.lookbacks.get(period, 1),
+                                                     self.indicators.get(period, []))
+        return state
+
+    def warm_start(self, stock_data: Dict[str, pd.DataFrame], period: str = '1d'):
+        """
+        用历史K线预热每只股票的窗口和在线指标，并计算当前通过筛选的股票（不发布事件）
+
+        Args:
+            stock_data (Dict[str, pd.DataFrame]): 股票代码到历史K线的映射，如缓存或download_all_stocks的结果
+            period (str): 数据周期
+        """
+        with self._lock:
+            for stock_code, data in stock_data.items():
+                self._state(stock_code, period).warm_start(data)
+            stock_codes = {stock_code for stock_code, _ in self._states}
+            for stock_code, passed in self._evaluate(stock_codes).items():
+                if passed:
+                    self.passing.add(stock_code)
+                else:
+                    self.passing.discard(stock_code)
+        logger.info(f"实时筛选器预热完成: 周期 {period}, 股票数量 {len(stock_data)}, 当前通过 {len(self.passing)} 只")
+
+    def on_bar(self, stock_code: str, period: str, bar: dict):
+        """
+        接收一根K线推送，只更新状态，不立即重新判断
+
+        Args:
+            stock_code (str): 股票代码
+            period (str): 数据周期
+            bar (dict): K线数据，包含date、open、high、low、close、volume、amount
+        """
+        if period not in self.plan.lookbacks:
+            return
+        with self._lock:
+            self._state(stock_code, period).update(bar)
+            self._dirty[stock_code] = (period, bar['date'])
+            self.bars_received += 1
+
+    def process(self, received: float = None) -> List[LiveEvent]:
+        """
+        重新判断K线发生变化的股票，发布进入/退出事件
+
+        Args:
+            received (float): 收到推送时的time.perf_counter()，用于计算事件延迟，默认为当前时间
+
+        Returns:
+            List[LiveEvent]: 本次产生的事件
+        """
+        received = received if received is not None else time.perf_counter()
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            results = self._evaluate(dirty)
+            events = []
+            for stock_code, passed in results.items():
+                was_passing = stock_code in self.passing
+                if passed == was_passing:
+                    continue
+                if passed:
+                    self.passing.add(stock_code)
+                else:
+                    self.passing.discard(stock_code)
+                period, bar_time = dirty[stock_code]
+                events.append(LiveEvent(LiveEvent.ENTER if passed else LiveEvent.EXIT, stock_code, period,
+                                        bar_time, time.perf_counter() - received))
+
+        for event in events:
+            for listener in self._listeners:
+                try:
+                    listener(event)
+                except Exception as e:
+                    logger.error(f"处理实时筛选事件 {event} 时出错: {str(e)}")
+        if dirty:
+            logger.debug(f"实时筛选重新判断 {len(dirty)} 只股票，产生 {len(events)} 个事件，"
+                         f"耗时 {(time.perf_counter() - received) * 1000:.1f} ms")
+        return events
+
+    def on_bars(self, bars: Iterable[tuple]) -> List[LiveEvent]:
+        """
+        接收一批K线推送并立即重新判断，作为数据来源的回调
+
+        Args:
+            bars (Iterable[tuple]): (股票代码, 数据周期, K线数据)列表
+
+        Returns:
+            List[LiveEvent]: 本次产生的事件
+        """
+        received = time.perf_counter()
+        for stock_code, period, bar in bars:
+            self.on_bar(stock_code, period, bar)
+        return self.process(received)
+
+    def run(self, source):
+        """
+        从数据来源接收推送直到来源结束或停止
+
+        Args:
+            source (ReplaySource | XtdataSource): 数据来源
+        """
+        logger.info(f"开始实时筛选，数据周期: {self.periods}")
+        source.start(self.on_bars)
+
+    def _evaluate(self, stock_codes: Iterable[str]) -> Dict[str, bool]:
+        """重新判断指定股票，所有筛选器都支持面板筛选时批量判断，否则逐只判断"""
+        stock_codes = list(stock_codes)
+        if stock_codes and all(stage.filter.supports_panel for stage in self.plan.stages):
+            try:
+                results = self._evaluate_panel(stock_codes)
+                self.evaluations += len(results)
+                return results
+            except Exception as e:
+                logger.error(f"实时面板筛选出错，改为逐只股票判断: {str(e)}")
+        return self._evaluate_per_symbol(stock_codes)
+
+    def _window_panel(self, stock_codes: List[str], period: str) -> Panel:
+        """
+        把股票在指定周期上的窗口右对齐拼成面板，窗口不足或没有数据的位置为NaN
+
+        面板的时间轴只表示窗口内的位置，每只股票的最后一根K线都在最后一列，
+        面板筛选只使用最后一根K线上的值，滚动计算的指标在每只股票自己的连续K线上进行。
+
+        Args:
+            stock_codes (List[str]): 股票代码列表
+            period (str): 数据周期
+
+        Returns:
+            Panel: 面板数据
+        """
+        width = self.plan.lookbacks.get(period, 1)
+        values = np.full((len(stock_codes), width, len(PANEL_FIELDS)), np.nan)
+        for row, stock_code in enumerate(stock_codes):
+            state = self._states.get((stock_code, period))
+            if state is None or not state.window:
+                continue
+            window = state.to_array()
+            values[row, width - len(window):] = window
+        fields = {name: np.ascontiguousarray(values[:, :, i]) for i, name in enumerate(PANEL_FIELDS)}
+        return Panel(stock_codes, np.arange(width).astype('datetime64[ns]'), fields)
+
+    def _evaluate_panel(self, stock_codes: List[str]) -> Dict[str, bool]:
+        """把窗口拼成面板并用在线指标值填充面板最后值，按阶段批量判断"""
+        context = DataContext(adjustment=self.adjustment, derive_periods=False)
+        panels = {}
+        for period in self.plan.periods:
+            panel = panels[period] = self._window_panel(stock_codes, period)
+            for indicator in self.indicators.get(period, []):
+                key = IndicatorCache.indicator_key(indicator)
+                values = np.full(len(stock_codes), np.nan)
+                for row, stock_code in enumerate(stock_codes):
+                    state = self._states.get((stock_code, period))
+                    if state is not None and state.window:
+                        values[row] = state.online[key][1].value
+                context.seed_indicator_last_values(panel, indicator, values)
+
+        passed = np.ones(len(stock_codes), dtype=bool)
+        for stage in self.plan.stages:
+            passed &= np.asarray(stage.filter.filter_panel(panels[stage.filter.data_period], context), dtype=bool)
+        return dict(zip(stock_codes, passed.tolist()))
+
+    def _evaluate_per_symbol(self, stock_codes: List[str]) -> Dict[str, bool]:
+        """用窗口和在线指标值填充一个新的筛选数据上下文，逐只重新判断指定股票"""
+        context = DataContext(adjustment=self.adjustment, derive_periods=False)
+        results = {}
+        for stock_code in stock_codes:
+            for period in self.plan.periods:
+                state = self._states.get((stock_code, period))
+                # 没有该周期数据的股票填充为None，筛选时视为无数据而不是去下载
+                context.seed({stock_code: state.to_frame() if state is not None else None}, period, self.adjustment)
+                if state is None:
+                    continue
+                for indicator, online in state.online.values():
+                    context.seed_indicator_value(stock_code, indicator, online.value, period, self.adjustment)
+            results[stock_code] = self.plan.evaluate_symbol(stock_code, context)
+        self.evaluations += len(results)
+        return results
+
+
+class ReplaySource:
+    """按时间顺序回放本地K线的数据来源，同一时间的K线作为一批推送"""
+
+    def __init__(self, stock_data: Dict[str, pd.DataFrame], period: str = '1d', interval: float = 0.0):
+        """
+        初始化回放数据来源
+
+        Args:
+            stock_data (Dict[str, pd.DataFrame]): 股票代码到K线数据的映射
+            period (str): 数据周期
+            interval (float): 每批推送之间的等待时间（秒），为0时尽快回放
+        """
+        self.stock_data = stock_data
+        self.period = period
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def start(self, on_bars: Callable[[List[tuple]], object]):
+        """
+        开始回放，回放完成或调用stop后返回
+
+        Args:
+            on_bars (Callable[[List[tuple]], object]): 每批推送的回调，参数为(股票代码, 数据周期, K线数据)列表
+        """
+        self._stopped.clear()
+        frames = []
+        for stock_code, data in self.stock_data.items():
+            if data is None or data.empty:
+                continue
+            columns = [field for field in BAR_FIELDS if field in data.columns]
+            frame = data[columns].copy()
+            frame['stock_code'] = stock_code
+            frames.append(frame)
+        if not frames:
+            return
+        bars = pd.concat(frames, ignore_index=True).sort_values('date', kind='stable')
+        for _, group in bars.groupby('date', sort=True):
+            if self._stopped.is_set():
+                break
+            batch = [(record.pop('stock_code'), self.period, record) for record in group.to_dict('records')]
+            on_bars(batch)
+            if self.interval:
+                time.sleep(self.interval)
+        logger.info("K线回放结束")
+
+    def stop(self):
+        """停止回放"""
+        self._stopped.set()
+
+
+class XtdataSource:
+    """通过xtdata.subscribe_quote订阅K线推送的数据来源"""
+
+    def __init__(self, stock_codes: List[str], periods: Iterable[str] = ('1d',)):
+        """
+        初始化xtdata数据来源
+
+        Args:
+            stock_codes (List[str]): 订阅的股票代码列表，格式为 '600000.SH'
+            periods (Iterable[str]): 订阅的数据周期
+        """
+        self.stock_codes = list(stock_codes)
+        self.periods = list(periods)
+        self._subscriptions = []
+        self._xtdata = None
+
+    @staticmethod
+    def _to_bars(datas: dict, period: str) -> List[tuple]:
+        """将xtdata推送的数据转换为(股票代码, 数据周期, K线数据)列表"""
+        bars = []
+        for stock_code, records in (datas or {}).items():
+            for record in records if isinstance(records, list) else [records]:
+                bar = {field: record.get(field) for field in BAR_FIELDS[1:]}
+                # xtquant推送的时间为UTC毫秒时间戳，转换为北京时间
+                bar['date'] = pd.to_datetime(record['time'], unit='ms') + pd.Timedelta(hours=8)
+                bars.append((stock_code, period, bar))
+        return bars
+
+    def start(self, on_bars: Callable[[List[tuple]], object]):
+        """
+        订阅全部股票和周期的K线推送并阻塞运行，推送在xtdata的回调线程中处理
+
+        Args:
+            on_bars (Callable[[List[tuple]], object]): 每次推送的回调，参数为(股票代码, 数据周期, K线数据)列表
+        """
+        try:
+            from xtquant import xtdata
+        except ImportError:
+            logger.error("未安装xtquant库，无法订阅实时行情，可使用ReplaySource回放本地K线")
+            raise
+
+        def handle(period, datas):
+            try:
+                on_bars(self._to_bars(datas, period))
+            except Exception as e:
+                logger.error(f"处理 {period} 周期K线推送时出错: {str(e)}")
+
+        self._xtdata = xtdata
+        for period in self.periods:
+            for stock_code in self.stock_codes:
+                seq = xtdata.subscribe_quote(stock_code, period=period, count=0,
+                                             callback=functools.partial(handle, period))
+                self._subscriptions.append(seq)
+        logger.info(f"已订阅实时行情: {len(self.stock_codes)} 只股票, 周期 {self.periods}")
+        xtdata.run()
+
+    def stop(self):
+        """取消全部订阅"""
+        if self._xtdata is None:
+            return
+        for seq in self._subscriptions:
+            try:
+                self._xtdata.unsubscribe_quote(seq)
+            except Exception as e:
+                logger.error(f"取消订阅 {seq} 时出错: {str(e)}")
+        self._subscriptions = []
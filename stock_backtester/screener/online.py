@@ -0,0 +1,271 @@
+"""
+在线（增量）技术指标模块，每根新K线以常数摊还时间更新指标值
+
+批量指标（MAIndicator、WRIindicator）每次计算整段序列；在线指标只保存计算窗口内的状态，
+update(bar)接收一根新K线并返回当前指标值，结果与批量指标在浮点误差范围内一致：
+- OnlineMA 维护窗口内收盘价的滚动和
+- OnlineWR 用单调队列维护窗口内的最高价和最低价，最高价等于最低价时为-50
+窗口内有缺失值或K线不足period根时，与批量指标一样返回NaN。
+"""
+import math
+import numpy as np
+import pandas as pd
+from abc import ABC, abstractmethod
+from collections import deque
+from .indicators import MAIndicator, WRIindicator
+from ..logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def bar_records(stock_data: pd.DataFrame, columns=None) -> list:
+    """
+    把K线数据转换为逐根K线的字典列表，按列取值，比DataFrame.to_dict('records')快得多
+
+    Args:
+        stock_data (pd.DataFrame): K线数据
+        columns (list): 字段列表，默认为全部列
+
+    Returns:
+        list: 每根K线一个字典
+    """
+    columns = list(stock_data.columns) if columns is None else list(columns)
+    values = [stock_data[column].tolist() for column in columns]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def _bar_value(bar, field: str) -> float:
+    """读取K线字段，缺失值统一为NaN"""
+    value = bar[field]
+    return np.nan if value is None else float(value)
+
+
+class OnlineIndicator(ABC):
+    """在线技术指标基类"""
+
+    def __init__(self, name: str, period: int):
+        """
+        初始化在线技术指标
+
+        Args:
+            name (str): 指标名称，与对应的批量指标一致
+            period (int): 计算周期
+        """
+        self.name = name
+        self.period = period
+        self.count = 0
+        self.value = np.nan
+
+    @abstractmethod
+    def update(self, bar) -> float:
+        """
+        接收一根新K线并更新指标值
+
+        Args:
+            bar (Mapping | pd.Series): K线数据，包含指标用到的字段
+
+        Returns:
+            float: 新K线上的指标值，数据不足时为NaN
+        """
+        pass
+
+    @abstractmethod
+    def reset(self):
+        """清空指标状态"""
+        pass
+
+    def warm_start(self, stock_data: pd.DataFrame) -> float:
+        """
+        用历史K线初始化指标状态，之后可以逐根调用update
+
+        只有末尾period根K线会影响后续的指标值，因此只回放这部分K线。
+
+        Args:
+            stock_data (pd.DataFrame): 历史K线数据，如缓存中的数据
+
+        Returns:
+            float: 最后一根历史K线上的指标值，没有历史数据时为NaN
+        """
+        self.reset()
+        if stock_data is None or stock_data.empty:
+            return self.value
+        if not stock_data['date'].is_monotonic_increasing:
+            stock_data = stock_data.sort_values('date')
+        self.replay(bar_records(stock_data.iloc[-self.period:]), len(stock_data))
+        logger.debug(f"在线指标 {self.name} 预热完成，历史K线 {len(stock_data)} 根，当前值 {self.value}")
+        return self.value
+
+    def replay(self, bars: list, total: int = None) -> float:
+        """
+        清空状态后回放已按时间排序的K线，只有末尾period根K线会影响指标值
+
+        Args:
+            bars (list): 逐根K线的字典列表
+            total (int): 历史K线总数，用于判断数据是否足够，默认为len(bars)
+
+        Returns:
+            float: 最后一根K线上的指标值
+        """
+        self.reset()
+        for bar in bars[-self.period:]:
+            self.update(bar)
+        # 已回放的K线数量按全部历史计
+        self.count = len(bars) if total is None else total
+        return self.value
+
+
+class OnlineMA(OnlineIndicator):
+    """在线移动平均线，维护窗口内收盘价的滚动和"""
+
+    # 每更新若干次由窗口重新求和，消除滚动和累积的浮点误差
+    RESYNC_INTERVAL = 1024
+
+    def __init__(self, period: int = 5):
+        """
+        初始化在线移动平均线
+
+        Args:
+            period (int): 计算周期
+        """
+        super().__init__(f"MA{period}", period)
+        self.reset()
+
+    def reset(self):
+        """清空指标状态"""
+        self.count = 0
+        self.value = np.nan
+        self._window = deque()
+        self._sum = 0.0
+        self._nans = 0
+        self._updates = 0
+
+    def update(self, bar) -> float:
+        """
+        接收一根新K线并更新移动平均线
+
+        Args:
+            bar (Mapping | pd.Series): K线数据，需要包含close
+
+        Returns:
+            float: 新K线上的移动平均线，K线不足period根或窗口内有缺失值时为NaN
+        """
+        close = _bar_value(bar, 'close')
+        self._window.append(close)
+        if math.isnan(close):
+            self._nans += 1
+        else:
+            self._sum += close
+        if len(self._window) > self.period:
+            dropped = self._window.popleft()
+            if math.isnan(dropped):
+                self._nans -= 1
+            else:
+                self._sum -= dropped
+
+        self.count += 1
+        self._updates += 1
+        if self._updates % self.RESYNC_INTERVAL == 0:
+            self._sum = math.fsum(value for value in self._window if not math.isnan(value))
+
+        if len(self._window) < self.period or self._nans:
+            self.value = np.nan
+        else:
+            self.value = self._sum / self.period
+        return self.value
+
+
+class OnlineWR(OnlineIndicator):
+    """在线威廉指标，用单调队列维护窗口内的最高价和最低价"""
+
+    def __init__(self, period: int = 14):
+        """
+        初始化在线威廉指标
+
+        Args:
+            period (int): 计算周期
+        """
+        super().__init__(f"WR{period}", period)
+        self.reset()
+
+    def reset(self):
+        """清空指标状态"""
+        self.count = 0
+        self.value = np.nan
+        # 单调队列中保存(K线序号, 价格)，队首为窗口内的最高价/最低价
+        self._highs = deque()
+        self._lows = deque()
+        # 窗口内每根K线是否有缺失的最高价或最低价
+        self._missing = deque()
+        self._nans = 0
+        self._index = -1
+
+    def update(self, bar) -> float:
+        """
+        接收一根新K线并更新威廉指标
+
+        Args:
+            bar (Mapping | pd.Series): K线数据，需要包含high、low、close
+
+        Returns:
+            float: 新K线上的威廉指标，K线不足period根或窗口内有缺失值时为NaN，最高价等于最低价时为-50
+        """
+        high = _bar_value(bar, 'high')
+        low = _bar_value(bar, 'low')
+        close = _bar_value(bar, 'close')
+        self._index += 1
+
+        missing = math.isnan(high) or math.isnan(low)
+        self._missing.append(missing)
+        self._nans += missing
+        if len(self._missing) > self.period:
+            self._nans -= self._missing.popleft()
+
+        if not math.isnan(high):
+            while self._highs and self._highs[-1][1] <= high:
+                self._highs.pop()
+            self._highs.append((self._index, high))
+        if not math.isnan(low):
+            while self._lows and self._lows[-1][1] >= low:
+                self._lows.pop()
+            self._lows.append((self._index, low))
+        # 移出窗口之外的K线
+        oldest = self._index - self.period + 1
+        while self._highs and self._highs[0][0] < oldest:
+            self._highs.popleft()
+        while self._lows and self._lows[0][0] < oldest:
+            self._lows.popleft()
+
+        self.count += 1
+        if len(self._missing) < self.period or self._nans:
+            self.value = np.nan
+            return self.value
+
+        high_period = self._highs[0][1]
+        low_period = self._lows[0][1]
+        denominator = high_period - low_period
+        # 当最高价等于最低价时，威廉指标设为-50（中性值），与WRIindicator一致
+        if denominator == 0:
+            self.value = -50.0
+        else:
+            self.value = (high_period - close) / denominator * -100
+        return self.value
+
+
+def online_indicator(indicator) -> OnlineIndicator:
+    """
+    创建与批量指标对应的在线指标
+
+    Args:
+        indicator (Indicator): 批量技术指标对象
+
+    Returns:
+        OnlineIndicator: 在线技术指标对象
+
+    Raises:
+        TypeError: 指标没有在线实现
+    """
+    if isinstance(indicator, MAIndicator):
+        return OnlineMA(indicator.period)
+    if isinstance(indicator, WRIindicator):
+        return OnlineWR(indicator.period)
+    raise TypeError(f"技术指标 {indicator.name} 没有在线实现")
@@ -0,0 +1,649 @@
+"""
+筛选执行计划，在执行前分析筛选链的数据和指标需求，合并重复的数据获取和指标计算
+
+执行计划把筛选链编译为若干阶段，每个阶段对应一个筛选器，依次完成：
+1. 获取该筛选器所需周期中尚未获取的数据（每个(股票, 周期)只获取一次）
+2. 计算尚未计算的技术指标（同一周期上的同一指标只计算一次，结果存入技术指标缓存）
+3. 判断筛选条件
+后面的阶段只处理前面阶段剩余的股票，已获取的数据和已计算的指标直接复用。
+
+按股票执行（stock_major）时，每只股票依次通过全部阶段，在第一个未通过的筛选器处停止，
+不生成中间的候选股票列表，同一只股票的数据在各阶段之间保持在缓存中。
+
+流式执行（stream）时，每只股票在线程池中按需获取所需周期的数据并依次通过全部阶段，
+完成一只即产出一只的结果，不等待其他股票的数据下载完成。
+
+历史信号（signals）在每个数据周期的面板上一次性计算整段指标数组，判断每只股票在每根K线上
+是否通过全部筛选器，生成(时间 × 股票)的布尔信号矩阵，不需要按日期重复执行筛选。
+
+逐只股票执行时，获取数据等I/O操作在线程池中并行执行；配置了进程数时，技术指标在进程池中计算，
+只把每只股票末尾回看长度内的K线发送给子进程。结果始终按输入的股票顺序排列。
+"""
+import math
+import time
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from itertools import repeat
+from typing import Callable, Dict, Iterator, List, Tuple
+from .base import Filter
+from .indicator_cache import IndicatorCache
+from ..shared_panel import compute_last_values
+from ..feeds.resample import PERIOD_MINUTES
+from ..logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 日线及以上周期K线的时间为交易日的零点，收盘（15:00）后才能得到完整的K线
+DAILY_CLOSE = pd.Timedelta(hours=15)
+
+
+def _available_times(timestamps: np.ndarray, period: str) -> np.ndarray:
+    """计算每根K线完成的时间，分钟K线的时间已是结束时间，日线及以上周期为当日收盘"""
+    if period in PERIOD_MINUTES:
+        return timestamps
+    return timestamps + DAILY_CLOSE.to_timedelta64()
+
+
+def _tail_values(indicators: List, tails: List) -> List[List[float]]:
+    """
+    在子进程中计算每只股票最后一根K线上的技术指标值
+
+    Args:
+        indicators (List[Indicator]): 技术指标对象列表
+        tails (List[pd.DataFrame]): 每只股票末尾的K线数据，无数据的股票为None
+
+    Returns:
+        List[List[float]]: 每只股票的各个指标值，顺序与输入一致
+    """
+    return [[indicator.value_at(tail) if tail is not None else np.nan for indicator in indicators]
+            for tail in tails]
+
+
+class FilterStats:
+    """筛选器在多次执行中的累计耗时和通过率，用于调整筛选链的执行顺序"""
+
+    def __init__(self):
+        """初始化统计信息"""
+        self.runs = 0
+        self.elapsed = 0.0
+        self.stocks_in = 0
+        self.stocks_out = 0
+
+    def record(self, elapsed: float, stocks_in: int, stocks_out: int):
+        """
+        记录一次执行结果
+
+        Args:
+            elapsed (float): 本次执行耗时（秒），包含获取数据和计算指标的时间
+            stocks_in (int): 输入的股票数量
+            stocks_out (int): 通过筛选的股票数量
+        """
+        self.runs += 1
+        self.elapsed += elapsed
+        self.stocks_in += stocks_in
+        self.stocks_out += stocks_out
+
+    @property
+    def cost(self) -> float:
+        """平均每只股票的筛选耗时（秒）"""
+        return self.elapsed / self.stocks_in if self.stocks_in else 0.0
+
+    @property
+    def pass_rate(self) -> float:
+        """通过率"""
+        return self.stocks_out / self.stocks_in if self.stocks_in else 1.0
+
+    @property
+    def rank(self) -> float:
+        """
+        排序依据：每淘汰一只股票的平均耗时，越小越应该先执行
+
+        对于相互独立的合取条件，按 cost / (1 - pass_rate) 从小到大执行时总耗时最小；
+        从不淘汰股票的筛选器排在最后。
+        """
+        if self.stocks_in == 0:
+            return 0.0
+        if self.pass_rate >= 1:
+            return float('inf')
+        return self.cost / (1 - self.pass_rate)
+
+
+class PlanStage:
+    """执行计划中的一个阶段，对应筛选链中的一个筛选器"""
+
+    def __init__(self, filter_obj: Filter, fetch_period: str = None, indicators: List = None,
+                 reused_indicators: List = None):
+        """
+        初始化执行阶段
+
+        Args:
+            filter_obj (Filter): 筛选器对象
+            fetch_period (str): 本阶段首次需要获取的数据周期，数据已获取时为None
+            indicators (List[Indicator]): 本阶段首次计算的技术指标
+            reused_indicators (List[Indicator]): 本阶段复用前面阶段结果的技术指标
+        """
+        self.filter = filter_obj
+        self.fetch_period = fetch_period
+        self.indicators = indicators or []
+        self.reused_indicators = reused_indicators or []
+
+
+class ExecutionPlan:
+    """筛选执行计划"""
+
+    def __init__(self, filters: List[Filter], start_time: str = None, end_time: str = None,
+                 adjustment: str = 'pre', vectorized: bool = True, stats: Dict[str, FilterStats] = None,
+                 stock_major: bool = False, max_workers: int = 1, process_workers: int = 0,
+                 process_pool: concurrent.futures.ProcessPoolExecutor = None):
+        """
+        由筛选链生成执行计划
+
+        Args:
+            filters (List[Filter]): 按执行顺序排列的筛选器列表
+            start_time (str): 数据开始时间
+            end_time (str): 数据结束时间
+            adjustment (str): 复权方式
+            vectorized (bool): 所有筛选器都支持面板筛选时，是否在面板数据上批量筛选
+            stats (Dict[str, FilterStats]): 筛选器的历史统计信息，用于在执行计划说明中显示
+            stock_major (bool): 是否按股票执行，每只股票依次通过全部筛选器，遇到未通过的筛选器即停止
+            max_workers (int): 逐只股票获取数据和筛选时的线程数，不大于1时顺序执行
+            process_workers (int): 计算技术指标的进程数，为0时不使用进程池
+            process_pool (concurrent.futures.ProcessPoolExecutor): 计算技术指标复用的进程池，由调用方负责关闭；
+                未传入时在第一次使用时创建，由close()关闭
+        """
+        self.filters = list(filters)
+        self.stats = stats or {}
+        self.start_time = start_time
+        self.end_time = end_time
+        self.adjustment = adjustment
+        self.stock_major = stock_major
+        self.max_workers = max(1, int(max_workers or 1))
+        self.process_workers = max(0, int(process_workers or 0))
+        self.process_pool = process_pool
+        self._owns_pool = False
+        self.vectorized = (vectorized and not stock_major and bool(self.filters)
+                           and all(f.supports_panel for f in self.filters))
+        # 每个数据周期需要的最大回看K线数量
+        self.lookbacks: Dict[str, int] = {}
+        # 每个(数据周期, 指标键)用到该指标的筛选器名称
+        self.indicator_users: Dict[tuple, List[str]] = {}
+        self.stages: List[PlanStage] = []
+        # 最近一次面板筛选中每个数据周期构建和选取面板的耗时（秒），不计入筛选器的耗时
+        self.panel_build_times: Dict[str, float] = {}
+        self._compile()
+
+    def _compile(self):
+        """按筛选链顺序生成执行阶段，记录每个周期的最大回看长度和共享的指标"""
+        fetched = set()
+        computed = set()
+        for filter_obj in self.filters:
+            period = filter_obj.data_period
+            self.lookbacks[period] = max(self.lookbacks.get(period, 1), filter_obj.lookback())
+
+            fetch_period = None
+            if period not in fetched:
+                fetched.add(period)
+                fetch_period = period
+
+            new_indicators, reused_indicators = [], []
+            for indicator in filter_obj.indicators():
+                key = (period,) + IndicatorCache.indicator_key(indicator)
+                self.indicator_users.setdefault(key, []).append(filter_obj.name)
+                if key in computed:
+                    reused_indicators.append(indicator)
+                else:
+                    computed.add(key)
+                    new_indicators.append(indicator)
+
+            self.stages.append(PlanStage(filter_obj, fetch_period, new_indicators, reused_indicators))
+
+    @property
+    def periods(self) -> List[str]:
+        """执行计划需要获取的数据周期，按首次使用的顺序排列"""
+        return list(self.lookbacks)
+
+    def explain(self, stock_codes: List[str] = None) -> str:
+        """
+        生成执行计划的文字说明，不获取数据也不计算指标
+
+        Args:
+            stock_codes (List[str]): 待筛选的股票代码列表，提供时给出数据获取和指标计算的最大次数
+
+        Returns:
+            str: 执行计划说明
+        """
+        if self.stock_major:
+            mode = "按股票执行全部筛选器"
+        else:
+            mode = "面板批量筛选" if self.vectorized else "逐只股票筛选"
+        if not self.vectorized:
+            mode += f", 线程数: {self.max_workers}"
+        mode += f", 指标计算进程数: {self.process_workers}"
+        lines = [f"执行计划: {len(self.filters)} 个筛选器, {len(self.lookbacks)} 个数据周期, "
+                 f"数据范围: {self.start_time} - {self.end_time}, 复权方式: {self.adjustment}, 执行方式: {mode}"]
+
+        lines.append("数据获取:")
+        for period, lookback in self.lookbacks.items():
+            users = [stage.filter.name for stage in self.stages if stage.filter.data_period == period]
+            lines.append(f"  {period}: 最大回看 {lookback} 根K线, 使用者: {', '.join(users)}")
+
+        lines.append("技术指标:")
+        if not self.indicator_users:
+            lines.append("  无")
+        for (period, _, name), users in self.indicator_users.items():
+            shared = f", 共享 {len(users)} 次" if len(users) > 1 else ""
+            lines.append(f"  {period} {name}: 使用者: {', '.join(users)}{shared}")
+
+        lines.append("执行阶段:")
+        for i, stage in enumerate(self.stages):
+            steps = []
+            if stage.fetch_period is not None:
+                steps.append(f"获取{stage.fetch_period}数据")
+            if stage.indicators:
+                steps.append(f"计算 {', '.join(indicator.name for indicator in stage.indicators)}")
+            if stage.reused_indicators:
+                steps.append(f"复用 {', '.join(indicator.name for indicator in stage.reused_indicators)}")
+            steps.append("判断筛选条件")
+            history = self.stats.get(stage.filter.name)
+            if history is not None and history.stocks_in:
+                steps.append(f"历史耗时 {history.cost * 1000:.3f} ms/只, 通过率 {history.pass_rate:.1%}")
+            lines.append(f"  {i + 1}. {stage.filter.name} [{stage.filter.data_period}]: {'; '.join(steps)}")
+
+        if stock_codes is not None:
+            n_indicators = sum(len(stage.indicators) for stage in self.stages)
+            lines.append(f"股票数量: {len(stock_codes)}, 最多获取数据 {len(stock_codes) * len(self.lookbacks)} 次, "
+                         f"最多计算指标 {len(stock_codes) * n_indicators} 次")
+        return "\n".join(lines)
+
+    def execute(self, stock_codes: List[str], context, stats: Dict[str, FilterStats] = None) -> List[str]:
+        """
+        按执行计划筛选股票
+
+        Args:
+            stock_codes (List[str]): 股票代码列表
+            context (DataContext): 筛选数据上下文，数据和技术指标结果都缓存在其中
+            stats (Dict[str, FilterStats]): 筛选器名称到统计信息的映射，提供时记录每个阶段的耗时和通过率
+
+        Returns:
+            List[str]: 通过所有筛选条件的股票代码列表，顺序与stock_codes一致
+        """
+        if self.stock_major:
+            return self._execute_stock_major(stock_codes, context, stats)
+        if self.vectorized:
+            try:
+                return self._execute_panel(stock_codes, context, stats)
+            except Exception as e:
+                logger.error(f"面板筛选出错，改为逐只股票筛选: {str(e)}")
+        return self._execute_per_symbol(stock_codes, context, stats)
+
+    def evaluate_symbol(self, stock_code: str, context, run_stats: Dict[str, FilterStats] = None) -> bool:
+        """
+        让单只股票依次通过全部阶段，在第一个未通过的筛选器处停止
+
+        Args:
+            stock_code (str): 股票代码
+            context (DataContext): 筛选数据上下文
+            run_stats (Dict[str, FilterStats]): 本次执行的统计信息，提供时累计每个筛选器的耗时和通过数量
+
+        Returns:
+            bool: 是否通过全部筛选器，单个筛选器出错时视为未通过
+        """
+        for stage in self.stages:
+            filter_obj = stage.filter
+            started = time.perf_counter()
+            try:
+                passed = filter_obj.call_evaluate(stock_code, self.start_time, self.end_time, context=context)
+            except Exception as e:
+                logger.error(f"筛选器 {filter_obj.name} 筛选股票 {stock_code} 时出错: {str(e)}")
+                passed = False
+            if run_stats is not None:
+                run_stats.setdefault(filter_obj.name, FilterStats()).record(time.perf_counter() - started, 1,
+                                                                            int(passed))
+            if not passed:
+                return False
+        return True
+
+    def stream(self, stock_codes: List[str], context, stats: Dict[str, FilterStats] = None,
+               callback: Callable[[str, bool], None] = None) -> Iterator[Tuple[str, bool]]:
+        """
+        流式筛选，每只股票所需周期的数据就绪后立即筛选，按完成顺序产出结果
+
+        Args:
+            stock_codes (List[str]): 股票代码列表
+            context (DataContext): 筛选数据上下文，未缓存的数据在筛选时按需下载
+            stats (Dict[str, FilterStats]): 筛选器名称到统计信息的映射，全部股票完成后合并本次执行的统计
+            callback (Callable[[str, bool], None]): 每只股票完成时的回调，参数为股票代码和是否通过
+
+        Yields:
+            Tuple[str, bool]: (股票代码, 是否通过全部筛选器)
+        """
+        def evaluate(stock_code):
+            symbol_stats: Dict[str, FilterStats] = {}
+            return self.evaluate_symbol(stock_code, context, symbol_stats), symbol_stats
+
+        run_stats: Dict[str, FilterStats] = {}
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {executor.submit(evaluate, stock_code): stock_code for stock_code in stock_codes}
+            for future in concurrent.futures.as_completed(futures):
+                stock_code = futures[future]
+                passed, symbol_stats = future.result()
+                for name, symbol in symbol_stats.items():
+                    run_stats.setdefault(name, FilterStats()).record(symbol.elapsed, symbol.stocks_in,
+                                                                     symbol.stocks_out)
+                if callback is not None:
+                    callback(stock_code, passed)
+                yield stock_code, passed
+            self._merge_run_stats(stats, run_stats)
+        finally:
+            # 调用方提前停止迭代时取消尚未开始的股票
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def signals(self, stock_codes: List[str], context, period: str = None) -> pd.DataFrame:
+        """
+        计算每只股票在每根K线上是否通过全部筛选器，生成历史信号矩阵
+
+        每个数据周期只构建一次面板，技术指标在整段面板上一次性计算（同一指标只计算一次），
+        每个筛选器得到(股票 × 时间)的布尔数组后按位与。其他周期的筛选结果按K线完成时间对齐到输出周期：
+        取每只股票在输出K线完成时已经完成的最后一根K线上的结果，日线不会用到当天尚未收盘的数据。
+
+        Args:
+            stock_codes (List[str]): 股票代码列表
+            context (DataContext): 筛选数据上下文，数据和整段指标数组都缓存在其中
+            period (str): 信号矩阵的时间轴使用的数据周期，默认为筛选链的第一个数据周期
+
+        Returns:
+            pd.DataFrame: 以K线时间为索引、股票代码为列的布尔矩阵，股票在该时间没有K线时为False
+
+        Raises:
+            ValueError: 筛选链为空或有筛选器不支持面板筛选
+        """
+        if not self.filters:
+            raise ValueError("筛选链为空，无法计算历史信号")
+        unsupported = [f.name for f in self.filters if not f.supports_panel]
+        if unsupported:
+            raise ValueError(f"筛选器 {', '.join(unsupported)} 不支持面板筛选，无法计算历史信号")
+
+        stock_codes = list(stock_codes)
+        period = period or self.periods[0]
+        panels = {p: context.get_panel(stock_codes, p, self.adjustment, self.start_time, self.end_time)
+                  for p in dict.fromkeys([period] + self.periods)}
+        masks = {p: np.ones(panel.shape, dtype=bool) for p, panel in panels.items()}
+        for stage in self.stages:
+            filter_obj = stage.filter
+            started = time.perf_counter()
+            masks[filter_obj.data_period] &= filter_obj.signal_panel(panels[filter_obj.data_period], context)
+            logger.debug(f"筛选器 {filter_obj.name} 历史信号计算完成，耗时 {time.perf_counter() - started:.3f} 秒")
+
+        target = panels[period]
+        result = masks[period] & target.valid()
+        target_times = _available_times(target.timestamps, period)
+        for other, panel in panels.items():
+            if other == period:
+                continue
+            result &= self._align_mask(masks[other], panel, _available_times(panel.timestamps, other), target_times)
+
+        logger.info(f"历史信号计算完成: {len(stock_codes)} 只股票 × {len(target.timestamps)} 根K线, "
+                    f"信号数量: {int(result.sum())}")
+        return pd.DataFrame(result.T, index=pd.DatetimeIndex(target.timestamps, name='date'),
+                            columns=target.symbols)
+
+    @staticmethod
+    def _align_mask(mask: np.ndarray, panel, times: np.ndarray, target_times: np.ndarray) -> np.ndarray:
+        """
+        把一个周期的信号按时间对齐到另一个周期的时间轴
+
+        Args:
+            mask (np.ndarray): 与panel形状一致的信号数组
+            panel (Panel): 信号所在周期的面板数据
+            times (np.ndarray): panel中每根K线的完成时间
+            target_times (np.ndarray): 目标时间轴上每根K线的完成时间
+
+        Returns:
+            np.ndarray: 形状为(股票数量, 目标时间点数量)的信号数组，取每只股票在目标时间之前完成的最后一根K线上的信号
+        """
+        n_symbols, n_times = panel.shape
+        # 每个时间点上每只股票最近一根K线所在的列，停牌时沿用停牌前的最后一根K线
+        last = np.where(panel.valid(), np.arange(n_times), -1)
+        last = np.maximum.accumulate(last, axis=1) if n_times else last
+        columns = np.searchsorted(times, target_times, side='right') - 1
+        aligned = np.zeros((n_symbols, len(target_times)), dtype=bool)
+        has_bar = columns >= 0
+        if not has_bar.any():
+            return aligned
+        source = last[:, columns[has_bar]]
+        rows = np.arange(n_symbols)[:, None]
+        aligned[:, has_bar] = np.where(source >= 0, mask[rows, np.maximum(source, 0)], False)
+        return aligned
+
+    @staticmethod
+    def _merge_run_stats(stats: Dict[str, FilterStats], run_stats: Dict[str, FilterStats]):
+        """把本次执行中逐只股票累计的统计合并为每个筛选器的一次执行记录"""
+        if stats is None:
+            return
+        for name, run in run_stats.items():
+            stats.setdefault(name, FilterStats()).record(run.elapsed, run.stocks_in, run.stocks_out)
+
+    def _process_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        """获取计算技术指标的进程池，各阶段和多次执行复用同一个进程池，不重复启动子进程"""
+        if self.process_pool is None:
+            self.process_pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.process_workers)
+            self._owns_pool = True
+        return self.process_pool
+
+    def close(self):
+        """关闭执行计划自己创建的进程池，传入的进程池由调用方关闭"""
+        if self._owns_pool and self.process_pool is not None:
+            self.process_pool.shutdown()
+            self.process_pool = None
+            self._owns_pool = False
+
+    def _map(self, func, items: List) -> List:
+        """在线程池中对每个元素调用func，结果按输入顺序排列，线程数不大于1时顺序执行"""
+        if self.max_workers <= 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(func, items))
+
+    @staticmethod
+    def _tail(data, length: int):
+        """截取末尾length根K线，数据来自DataContext，已按日期排序，无数据时返回None"""
+        if data is None or data.empty:
+            return None
+        return data.iloc[-length:]
+
+    def _compute_indicators(self, indicators: List, stock_codes: List[str], stock_data: List, period: str,
+                            context):
+        """
+        计算每只股票最后一根K线上的技术指标值并写入技术指标缓存
+
+        Args:
+            indicators (List[Indicator]): 技术指标对象列表
+            stock_codes (List[str]): 股票代码列表
+            stock_data (List[pd.DataFrame]): 与stock_codes对应的K线数据
+            period (str): 数据周期
+            context (DataContext): 筛选数据上下文
+        """
+        if self.process_workers > 0 and len(stock_codes) > 1:
+            try:
+                # 只发送末尾回看长度内的K线，子进程计算的结果写回技术指标缓存
+                lookback = max(indicator.lookback for indicator in indicators)
+                tails = [self._tail(data, lookback) for data in stock_data]
+                chunk_size = math.ceil(len(tails) / (self.process_workers * 4))
+                chunks = [tails[i:i + chunk_size] for i in range(0, len(tails), chunk_size)]
+                executor = self._process_pool()
+                values = [row for rows in executor.map(_tail_values, repeat(indicators), chunks) for row in rows]
+                for stock_code, row in zip(stock_codes, values):
+                    for indicator, value in zip(indicators, row):
+                        context.seed_indicator_value(stock_code, indicator, value, period, self.adjustment,
+                                                     self.start_time, self.end_time)
+                return
+            except Exception as e:
+                logger.error(f"进程池计算技术指标出错，改为在线程中计算: {str(e)}")
+
+        def compute(item):
+            stock_code, data = item
+            for indicator in indicators:
+                try:
+                    context.indicator_value(stock_code, indicator, period, self.adjustment, self.start_time,
+                                            self.end_time, data=data)
+                except Exception as e:
+                    logger.error(f"计算股票 {stock_code} 的指标 {indicator.name} 时出错: {str(e)}")
+
+        self._map(compute, list(zip(stock_codes, stock_data)))
+
+    def _compute_panel_indicators(self, indicators: List, panel, context):
+        """
+        计算面板上每只股票最后一根K线上的技术指标值并写入技术指标缓存
+
+        配置了进程数时，面板字段放入共享内存，由进程池按股票分片计算，子进程只返回最后值。
+
+        Args:
+            indicators (List[Indicator]): 技术指标对象列表
+            panel (Panel): 面板数据
+            context (DataContext): 筛选数据上下文
+        """
+        if self.process_workers > 0:
+            try:
+                values = compute_last_values(panel, indicators, self.process_workers, executor=self._process_pool())
+                for indicator in indicators:
+                    context.seed_indicator_last_values(panel, indicator, values[indicator.name])
+                return
+            except Exception as e:
+                logger.error(f"进程池计算面板指标出错，改为在当前进程中计算: {str(e)}")
+        for indicator in indicators:
+            context.indicator_last_values(panel, indicator)
+
+    def _execute_stock_major(self, stock_codes: List[str], context, stats: Dict[str, FilterStats] = None) -> List[str]:
+        """按股票执行，每只股票在第一个未通过的筛选器处停止，多只股票在线程池中并行执行"""
+        def evaluate(stock_code):
+            symbol_stats: Dict[str, FilterStats] = {}
+            return self.evaluate_symbol(stock_code, context, symbol_stats), symbol_stats
+
+        results = self._map(evaluate, list(stock_codes))
+        run_stats: Dict[str, FilterStats] = {}
+        for _, symbol_stats in results:
+            for name, symbol in symbol_stats.items():
+                run_stats.setdefault(name, FilterStats()).record(symbol.elapsed, symbol.stocks_in, symbol.stocks_out)
+        current_stocks = [stock_code for stock_code, (passed, _) in zip(stock_codes, results) if passed]
+        self._merge_run_stats(stats, run_stats)
+        logger.info(f"按股票执行筛选完成，剩余股票数量: {len(current_stocks)}")
+        return current_stocks
+
+    @staticmethod
+    def _record(stats: Dict[str, FilterStats], filter_obj: Filter, started: float, stocks_in: int,
+                stocks_out: int):
+        """记录阶段的耗时和通过率"""
+        if stats is not None:
+            stats.setdefault(filter_obj.name, FilterStats()).record(time.perf_counter() - started, stocks_in,
+                                                                    stocks_out)
+
+    def _prefetch(self, context, stock_code: str, period: str):
+        """预先获取一只股票的数据，下载失败时记为无数据，失败的结果不被缓存，筛选时由筛选器再次获取"""
+        try:
+            return context.get(stock_code, period, self.adjustment, self.start_time, self.end_time)
+        except Exception as e:
+            logger.error(f"预先获取股票 {stock_code} 的 {period} 数据失败: {str(e)}")
+            return None
+
+    def _execute_per_symbol(self, stock_codes: List[str], context, stats: Dict[str, FilterStats] = None) -> List[str]:
+        """逐只股票执行各个阶段，只为剩余的股票获取数据和计算指标"""
+        current_stocks = list(stock_codes)
+        for i, stage in enumerate(self.stages):
+            filter_obj = stage.filter
+            started = time.perf_counter()
+            stocks_in = len(current_stocks)
+            try:
+                logger.info(f"应用第 {i+1} 个筛选器: {filter_obj.name}")
+                period = filter_obj.data_period
+                # 预先并行获取数据并计算本阶段首次用到的指标，后续判断直接命中缓存
+                stock_data = self._map(lambda stock_code: self._prefetch(context, stock_code, period),
+                                       current_stocks)
+                if stage.indicators:
+                    self._compute_indicators(stage.indicators, current_stocks, stock_data, period, context)
+
+                filtered_stocks = filter_obj.call_filter(current_stocks, self.start_time, self.end_time, context=context)
+                passed = set(filtered_stocks)
+                current_stocks = [stock for stock in current_stocks if stock in passed]
+                self._record(stats, filter_obj, started, stocks_in, len(current_stocks))
+                logger.info(f"第 {i+1} 个筛选器应用完成，剩余股票数量: {len(current_stocks)}")
+
+                if not current_stocks:
+                    logger.info("没有股票通过所有筛选条件")
+                    break
+
+            except Exception as e:
+                logger.error(f"应用筛选器 {filter_obj.name} 时出错: {str(e)}")
+                # 根据spec要求，部分条件失败应视为整个筛选过程失败
+                raise Exception(f"筛选器 {filter_obj.name} 执行失败: {str(e)}")
+        return current_stocks
+
+    def _stage_panel(self, panels: Dict, computed: Dict[str, List], period: str, current_stocks: List[str],
+                     context):
+        """
+        获取剩余股票在period周期上的面板
+
+        数据周期首次使用时只为当时剩余的股票构建面板；之后从该周期上一个面板中选取剩余股票，
+        前面阶段已计算的指标最后值按行带到新面板，不重新计算。
+
+        Args:
+            panels (Dict): 数据周期到当前面板的映射，会被更新
+            computed (Dict[str, List]): 数据周期到已在当前面板上计算的技术指标的映射
+            period (str): 数据周期
+            current_stocks (List[str]): 剩余股票，是当前面板中股票的子集且顺序一致
+            context (DataContext): 筛选数据上下文
+
+        Returns:
+            Panel: 只包含剩余股票的面板
+        """
+        panel = panels.get(period)
+        if panel is None:
+            panel = context.get_panel(current_stocks, period, self.adjustment, self.start_time, self.end_time)
+        elif len(panel) != len(current_stocks):
+            positions = {symbol: row for row, symbol in enumerate(panel.symbols)}
+            rows = [positions[symbol] for symbol in current_stocks]
+            selected = panel.select(current_stocks)
+            for indicator in computed.get(period, []):
+                context.seed_indicator_last_values(selected, indicator,
+                                                   context.indicator_last_values(panel, indicator)[rows])
+            panel = selected
+        panels[period] = panel
+        return panel
+
+    def _execute_panel(self, stock_codes: List[str], context, stats: Dict[str, FilterStats] = None) -> List[str]:
+        """
+        在面板数据上执行各个阶段，每个阶段只在剩余股票构成的面板上计算指标和判断条件
+
+        构建和选取面板的耗时单独累计在panel_build_times中，不计入筛选器的耗时，
+        筛选器的耗时和通过率只反映其自身的开销，据此调整执行顺序才能减少实际的计算量。
+        """
+        panels = {}
+        computed: Dict[str, List] = {}
+        self.panel_build_times = {}
+        current_stocks = list(stock_codes)
+        for i, stage in enumerate(self.stages):
+            filter_obj = stage.filter
+            stocks_in = len(current_stocks)
+            period = filter_obj.data_period
+            build_started = time.perf_counter()
+            panel = self._stage_panel(panels, computed, period, current_stocks, context)
+            self.panel_build_times[period] = (self.panel_build_times.get(period, 0.0)
+                                              + time.perf_counter() - build_started)
+
+            started = time.perf_counter()
+            if stage.indicators:
+                self._compute_panel_indicators(stage.indicators, panel, context)
+                computed.setdefault(period, []).extend(stage.indicators)
+
+            mask = filter_obj.filter_panel(panel, context)
+            current_stocks = [symbol for symbol, keep in zip(panel.symbols, mask) if keep]
+            self._record(stats, filter_obj, started, stocks_in, len(current_stocks))
+            logger.info(f"第 {i+1} 个筛选器 {filter_obj.name} 面板筛选完成，剩余股票数量: {len(current_stocks)}")
+
+            if not current_stocks:
+                logger.info("没有股票通过所有筛选条件")
+                break
+        logger.debug(f"面板构建耗时: {', '.join(f'{p} {t:.3f} 秒' for p, t in self.panel_build_times.items())}")
+        return current_stocks
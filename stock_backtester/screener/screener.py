@@ -1,10 +1,13 @@
 """
 筛选器管理器
 """
+import concurrent.futures
 import pandas as pd
-from typing import List, Dict, Any
+from typing import Callable, Iterator, List, Dict, Any, Tuple
 from .base import Filter
 from .filters import MAFilter, WRFilter
+from .context import DataContext
+from .planner import ExecutionPlan, FilterStats
 from ..logger import get_logger
 from ..config import Config
 
@@ -14,18 +17,38 @@ logger = get_logger(__name__)
 class Screener:
     """筛选器管理器，支持链式筛选方式"""
     
-    def __init__(self, start_time: str = None, end_time: str = None):
+    def __init__(self, start_time: str = None, end_time: str = None, cache=None, vectorized: bool = True,
+                 pin_order: bool = False, stock_major: bool = False, max_workers: int = 1,
+                 process_workers: int = 0, adjustment: str = 'pre'):
         """
         初始化筛选器管理器
         
         Args:
             start_time (str): 数据开始时间
             end_time (str): 数据结束时间
+            cache (BarCache): K线本地缓存，筛选时下载数据使用
+            vectorized (bool): 所有筛选器都支持面板筛选时，是否在面板数据上批量筛选
+            pin_order (bool): 是否固定按添加顺序执行筛选器，为False时按历史耗时和通过率调整顺序
+            stock_major (bool): 是否按股票执行，每只股票依次通过全部筛选器，遇到未通过的筛选器即停止
+            max_workers (int): 逐只股票获取数据和筛选时的线程数
+            process_workers (int): 计算技术指标的进程数，为0时不使用进程池
+            adjustment (str): 筛选使用的复权方式
         """
         self.filters: List[Filter] = []
         self.filtered_stocks: List[str] = []
         self.start_time = start_time
         self.end_time = end_time
+        self.vectorized = vectorized
+        self.pin_order = pin_order
+        self.stock_major = stock_major
+        self.max_workers = max_workers
+        self.process_workers = process_workers
+        # 计算技术指标的进程池，第一次生成执行计划时创建，多次执行之间复用，由close()关闭
+        self.process_pool = None
+        # 筛选器名称到历史耗时和通过率的映射，跨多次执行累计
+        self.filter_stats: Dict[str, FilterStats] = {}
+        # 所有筛选器共享的数据上下文，同一份数据只下载一次
+        self.context = DataContext(start_time, end_time, adjustment, cache=cache, max_workers=max_workers)
         logger.debug(f"初始化筛选器管理器，时间范围: {start_time} - {end_time}")
     
     def set_data_range(self, start_time: str, end_time: str):
@@ -38,9 +61,23 @@ class Screener:
         """
         self.start_time = start_time
         self.end_time = end_time
+        self.context.set_data_range(start_time, end_time)
         logger.debug(f"设置数据范围: {start_time} - {end_time}")
     
-
+    def seed_data(self, stock_data: Dict[str, pd.DataFrame], period: str = '1d', adjustment: str = None) -> 'Screener':
+        """
+        用已下载的数据预先填充数据上下文，筛选时不再重复下载
+        
+        Args:
+            stock_data (Dict[str, pd.DataFrame]): 股票代码到数据的映射，即download_all_stocks的返回值
+            period (str): 数据周期
+            adjustment (str): 复权方式，为None时使用筛选的复权方式
+            
+        Returns:
+            Screener: 筛选器管理器实例，支持链式调用
+        """
+        self.context.seed(stock_data, period, adjustment, self.start_time, self.end_time)
+        return self
     
     def add_filter(self, filter_obj: Filter) -> 'Screener':
         """
@@ -96,41 +133,154 @@ class Screener:
                 logger.warning("筛选链为空，返回所有股票")
                 return stock_codes
             
-            # 初始化结果为所有股票
-            current_stocks = stock_codes
-            logger.debug(f"初始股票数量: {len(current_stocks)}")
+            logger.debug(f"初始股票数量: {len(stock_codes)}")
             
-            # 依次应用每个筛选器
-            for i, filter_obj in enumerate(self.filters):
-                try:
-                    logger.info(f"应用第 {i+1} 个筛选器: {filter_obj.name}")
-                    
-                    # 应用筛选器，传递数据范围参数
-                    filtered_stocks = filter_obj.filter(current_stocks, self.start_time, self.end_time)
-                    
-                    # 更新当前股票列表
-                    current_stocks = [stock for stock in current_stocks if stock in filtered_stocks]
-                    
-                    logger.info(f"第 {i+1} 个筛选器应用完成，剩余股票数量: {len(current_stocks)}")
-                    
-                    # 如果没有股票通过筛选，提前结束
-                    if not current_stocks:
-                        logger.info("没有股票通过所有筛选条件")
-                        break
-                        
-                except Exception as e:
-                    logger.error(f"应用筛选器 {filter_obj.name} 时出错: {str(e)}")
-                    # 根据spec要求，部分条件失败应视为整个筛选过程失败
-                    raise Exception(f"筛选器 {filter_obj.name} 执行失败: {str(e)}")
+            # 编译执行计划，合并重复的数据获取和指标计算后执行
+            plan = self.plan()
+            logger.debug(plan.explain(stock_codes))
+            current_stocks = plan.execute(stock_codes, self.context, self.filter_stats)
             
             self.filtered_stocks = current_stocks
             logger.info(f"链式筛选完成，最终通过筛选的股票数量: {len(current_stocks)}")
+            self._log_context_stats()
             return current_stocks
             
         except Exception as e:
             logger.error(f"执行链式筛选时出错: {str(e)}")
             raise
     
+    def stream(self, stock_codes: List[str],
+               callback: Callable[[str, bool], None] = None) -> Iterator[Tuple[str, bool]]:
+        """
+        流式执行链式筛选，边下载边筛选
+        
+        每只股票按需获取筛选链所需周期的数据，就绪后立即依次通过全部筛选器，在第一个未通过的筛选器处停止，
+        结果按完成顺序产出，第一条结果只需等待一只股票的下载和筛选时间。全部股票完成后，
+        get_filtered_stocks按输入顺序返回通过筛选的股票。
+        
+        Args:
+            stock_codes (List[str]): 股票代码列表
+            callback (Callable[[str, bool], None]): 每只股票完成时的回调，参数为股票代码和是否通过
+            
+        Yields:
+            Tuple[str, bool]: (股票代码, 是否通过全部筛选条件)
+        """
+        logger.info(f"开始流式执行链式筛选，筛选器数量: {len(self.filters)}, 股票数量: {len(stock_codes)}")
+        
+        if not self.filters:
+            logger.warning("筛选链为空，所有股票均通过")
+            for stock_code in stock_codes:
+                if callback is not None:
+                    callback(stock_code, True)
+                yield stock_code, True
+            self.filtered_stocks = list(stock_codes)
+            return
+        
+        plan = self.plan()
+        logger.debug(plan.explain(stock_codes))
+        passed_stocks = set()
+        for stock_code, passed in plan.stream(stock_codes, self.context, self.filter_stats, callback):
+            if passed:
+                passed_stocks.add(stock_code)
+            yield stock_code, passed
+        
+        self.filtered_stocks = [stock_code for stock_code in stock_codes if stock_code in passed_stocks]
+        logger.info(f"流式筛选完成，最终通过筛选的股票数量: {len(self.filtered_stocks)}")
+        self._log_context_stats()
+    
+    def signals(self, stock_codes: List[str], start_date: str = None, end_date: str = None,
+                period: str = None) -> pd.DataFrame:
+        """
+        计算筛选链在历史上每根K线的信号矩阵，用于回测
+        
+        在数据范围内的全部K线上一次性计算技术指标后批量判断，不按日期重复执行筛选。
+        数据范围应比信号区间多出技术指标的回看长度，信号区间开头的指标才不会因数据不足而为NaN。
+        
+        Args:
+            stock_codes (List[str]): 股票代码列表
+            start_date (str): 信号区间的开始日期，为None时从数据范围的开头开始
+            end_date (str): 信号区间的结束日期，为None时到数据范围的末尾
+            period (str): 信号矩阵的时间轴使用的数据周期，默认为第一个添加的筛选器的数据周期，
+                不随按历史统计调整的执行顺序变化
+            
+        Returns:
+            pd.DataFrame: 以K线时间为索引、股票代码为列的布尔矩阵，True表示当根K线通过全部筛选条件
+        """
+        logger.info(f"开始计算历史信号，筛选器数量: {len(self.filters)}, 股票数量: {len(stock_codes)}")
+        if period is None and self.filters:
+            period = self.filters[0].data_period
+        signals = self.plan().signals(stock_codes, self.context, period)
+        if start_date is not None or end_date is not None:
+            signals = signals.loc[start_date:end_date]
+        self._log_context_stats()
+        return signals
+    
+    def _log_context_stats(self):
+        """记录数据上下文和技术指标缓存的命中情况"""
+        logger.debug(f"数据上下文命中 {self.context.hits} 次，下载 {self.context.misses} 次，"
+                     f"合并进行中的相同请求 {self.context.flights.coalesced} 次")
+        logger.debug(f"技术指标缓存命中 {self.context.indicators.hits} 次，"
+                     f"计算 {self.context.indicators.misses} 次")
+    
+    def ordered_filters(self) -> List[Filter]:
+        """
+        获取本次执行的筛选器顺序
+        
+        筛选链是合取条件，调整顺序不影响筛选结果。未固定顺序时按历史统计的每淘汰一只股票的平均耗时
+        从小到大排序，便宜且淘汰率高的筛选器先执行；尚无统计信息的筛选器排在最前以便采集统计，
+        排序依据相同的筛选器保持添加顺序。
+        
+        Returns:
+            List[Filter]: 按执行顺序排列的筛选器列表
+        """
+        if self.pin_order:
+            return list(self.filters)
+        
+        def rank(filter_obj):
+            stats = self.filter_stats.get(filter_obj.name)
+            return stats.rank if stats is not None else 0.0
+        
+        return sorted(self.filters, key=rank)
+    
+    def plan(self) -> ExecutionPlan:
+        """
+        由当前筛选链生成执行计划
+        
+        Returns:
+            ExecutionPlan: 执行计划
+        """
+        if self.process_workers > 0 and self.process_pool is None:
+            # 创建进程池时不启动子进程，第一次提交任务时才启动
+            self.process_pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.process_workers)
+        return ExecutionPlan(self.ordered_filters(), self.start_time, self.end_time, self.context.adjustment,
+                             self.vectorized, self.filter_stats, self.stock_major, self.max_workers, self.process_workers,
+                             self.process_pool)
+    
+    def close(self):
+        """关闭计算技术指标的进程池，之后再执行筛选时会重新创建"""
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+            self.process_pool = None
+            logger.debug("关闭技术指标计算进程池")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def explain(self, stock_codes: List[str] = None) -> str:
+        """
+        说明当前筛选链的执行计划，不获取数据也不计算指标
+        
+        Args:
+            stock_codes (List[str]): 待筛选的股票代码列表
+            
+        Returns:
+            str: 执行计划说明
+        """
+        return self.plan().explain(stock_codes)
+    
     def get_filtered_stocks(self) -> List[str]:
         """
         获取筛选结果
@@ -0,0 +1,153 @@
+"""
+共享内存面板计算模块，在进程池中按股票分片计算技术指标
+
+面板中指标用到的字段一次性复制到multiprocessing.shared_memory，子进程按名称映射同一块内存，
+各自计算互不重叠的一段股票（面板的若干行），只返回每只股票最后一根K线上的指标值，
+不在进程之间传递DataFrame或完整的指标数组。滚动窗口按每只股票自身的K线序列计算，
+按行分片的结果与在整个面板上计算的结果一致。
+"""
+import math
+import concurrent.futures
+import numpy as np
+from multiprocessing import shared_memory
+from itertools import repeat
+from .panel import Panel
+from .logger import get_logger
+
+# 获取日志记录器
+logger = get_logger(__name__)
+
+
+class SharedPanel:
+    """放在共享内存中的面板字段，用作上下文管理器，退出时释放共享内存"""
+
+    def __init__(self, panel, fields):
+        """
+        将面板字段复制到共享内存
+
+        Args:
+            panel (Panel): 面板数据
+            fields (list): 需要共享的字段列表
+        """
+        self.shape = panel.shape
+        self._blocks = {}
+        try:
+            for name in fields:
+                values = panel.field(name)
+                # 共享内存的大小不能为0
+                block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+                self._blocks[name] = block
+                np.ndarray(self.shape, dtype=np.float64, buffer=block.buf)[:] = values
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def names(self):
+        """字段名到共享内存名称的映射，传给子进程用于映射同一块内存"""
+        return {name: block.name for name, block in self._blocks.items()}
+
+    def close(self):
+        """释放共享内存"""
+        for block in self._blocks.values():
+            block.close()
+            block.unlink()
+        self._blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _compute_shard(blocks, shape, indicators, start, stop):
+    """在共享内存的一段行上计算各指标最后一根K线上的值"""
+    fields = {name: np.ndarray(shape, dtype=np.float64, buffer=block.buf)[start:stop]
+              for name, block in blocks.items()}
+    shard = Panel(range(start, stop), np.empty(shape[1], dtype='datetime64[ns]'), fields)
+    result = np.empty((len(indicators), stop - start))
+    for i, indicator in enumerate(indicators):
+        result[i] = shard.last_values(indicator.calculate_panel(shard))
+    return result
+
+
+def _shard_last_values(names, shape, indicators, bounds):
+    """
+    子进程入口：映射共享内存并计算一个分片
+
+    Args:
+        names (dict): 字段名到共享内存名称的映射
+        shape (tuple): 面板形状
+        indicators (list): 技术指标对象列表
+        bounds (tuple): 分片的起止行号
+
+    Returns:
+        tuple: (起始行号, 形状为(指标数量, 分片股票数量)的最后值数组)
+    """
+    start, stop = bounds
+    blocks = {name: shared_memory.SharedMemory(name=block_name) for name, block_name in names.items()}
+    try:
+        return start, _compute_shard(blocks, shape, indicators, start, stop)
+    finally:
+        for block in blocks.values():
+            try:
+                block.close()
+            except BufferError:
+                # 计算出错时异常回溯仍引用着共享内存上的数组，由进程退出时释放映射
+                pass
+
+
+def panel_fields(indicators):
+    """
+    获取计算指标需要的面板字段
+
+    Args:
+        indicators (list): 技术指标对象列表
+
+    Returns:
+        list: 字段列表，始终包含close（用于判断每个时间点是否有K线）
+    """
+    fields = ['close']
+    for indicator in indicators:
+        for name in indicator.panel_fields:
+            if name not in fields:
+                fields.append(name)
+    return fields
+
+
+def compute_last_values(panel, indicators, max_workers, shard_size=None, executor=None):
+    """
+    在进程池中计算面板上每只股票最后一根K线上的技术指标值
+
+    Args:
+        panel (Panel): 面板数据
+        indicators (list): 技术指标对象列表
+        max_workers (int): 进程数
+        shard_size (int): 每个分片的股票数量，默认按进程数平均分配
+        executor (concurrent.futures.ProcessPoolExecutor): 复用的进程池，由调用方负责关闭；
+            未传入时临时创建一个进程池，计算完成后关闭
+
+    Returns:
+        dict: 指标名称到最后值数组的映射，数组与panel.symbols对应，数据不足的股票为NaN
+    """
+    n_symbols = len(panel)
+    if max_workers <= 1 or n_symbols < 2:
+        return {indicator.name: panel.last_values(indicator.calculate_panel(panel)) for indicator in indicators}
+
+    shard_size = shard_size or math.ceil(n_symbols / (max_workers * 2))
+    bounds = [(start, min(start + shard_size, n_symbols)) for start in range(0, n_symbols, shard_size)]
+    result = np.full((len(indicators), n_symbols), np.nan)
+
+    with SharedPanel(panel, panel_fields(indicators)) as shared:
+        pool = executor or concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+        try:
+            for start, values in pool.map(_shard_last_values, repeat(shared.names), repeat(shared.shape),
+                                          repeat(indicators), bounds):
+                result[:, start:start + values.shape[1]] = values
+        finally:
+            if executor is None:
+                pool.shutdown()
+
+    logger.debug(f"进程池计算指标完成: {len(indicators)} 个指标, {n_symbols} 只股票, {len(bounds)} 个分片")
+    return {indicator.name: result[i] for i, indicator in enumerate(indicators)}
@@ -0,0 +1,191 @@
+"""
+向量化回测模块单元测试
+"""
+import unittest
+import sys
+import os
+import pandas as pd
+import numpy as np
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from stock_backtester.backtest import Backtester, limit_ratio
+from stock_backtester.panel import Panel
+
+
+def make_bars(opens, closes, start='2025-01-01'):
+    """由开盘价和收盘价生成日线数据，NaN表示停牌"""
+    frame = pd.DataFrame({'date': pd.date_range(start, periods=len(opens), freq='D'),
+                          'open': opens, 'close': closes})
+    return frame.dropna().reset_index(drop=True)
+
+
+def reference_backtest(signals, bars, backtester):
+    """逐日逐只股票模拟的参考实现，用于验证向量化结果：每日先卖出，再按股票顺序用可用现金买入，现金用完后本日不再开仓"""
+    def commission(value):
+        return max(value * backtester.commission_rate, backtester.min_commission) if value else 0.0
+
+    cash = backtester.initial_cash
+    shares = {code: 0 for code in signals.columns}
+    last_close = {code: np.nan for code in signals.columns}
+    equity, min_cash = [], cash
+    by_date = {code: data.set_index('date') for code, data in bars.items()}
+    for i, date in enumerate(signals.index):
+        quotes = {code: by_date[code].loc[date] for code in signals.columns if date in by_date[code].index}
+        orders = {}
+        for code, quote in quotes.items():
+            ratio = limit_ratio(code)
+            orders[code] = (bool(signals[code].iloc[i - 1]) if i > 0 else False,
+                            round(last_close[code] * (1 + ratio), 2), round(last_close[code] * (1 - ratio), 2))
+        for code, (target, _, limit_down) in orders.items():
+            open_price = quotes[code]['open']
+            if not target and shares[code] and not open_price <= limit_down + 1e-6:
+                value = shares[code] * open_price
+                cash += value - commission(value) - value * backtester.stamp_duty
+                shares[code] = 0
+        exhausted = False
+        for code, (target, limit_up, _) in orders.items():
+            open_price = quotes[code]['open']
+            if target and shares[code] == 0 and not open_price >= limit_up - 1e-6 and not exhausted:
+                count = int(backtester.position_value / open_price / 100) * 100
+                while count and count * open_price + commission(count * open_price) > cash:
+                    # 第一只买不全的股票按剩余现金买入整手，本日之后的股票不再开仓
+                    exhausted = True
+                    count -= 100
+                value = count * open_price
+                cash -= value + commission(value)
+                shares[code] = count
+        for code, quote in quotes.items():
+            last_close[code] = quote['close']
+        min_cash = min(min_cash, cash)
+        equity.append(cash + sum(shares[code] * np.nan_to_num(last_close[code]) for code in shares))
+    return np.array(equity), min_cash
+
+
+class TestBacktest(unittest.TestCase):
+    """向量化回测测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.dates = pd.date_range('2025-01-01', periods=6, freq='D')
+        self.backtester = Backtester(initial_cash=100000, position_value=10000)
+
+    def signals(self, values, code='600000.SH'):
+        return pd.DataFrame({code: values}, index=self.dates)
+
+    def test_round_trip_costs_and_lots(self):
+        """测试次日开盘成交、整手买入、最低佣金和卖出印花税"""
+        bars = {'600000.SH': make_bars([10.0, 10.1, 10.2, 10.3, 10.4, 10.5], [10.0, 10.2, 10.2, 10.3, 10.6, 10.5])}
+        result = self.backtester.run(self.signals([True, True, False, False, False, False]), bars)
+
+        # 第1天收盘的信号在第2天开盘买入 floor(10000 / 10.1 / 100) * 100 = 900 股
+        np.testing.assert_array_equal(result.positions['600000.SH'].to_numpy(), [0, 900, 900, 0, 0, 0])
+        self.assertEqual(result.trades['600000.SH'].iloc[1], 900)
+        self.assertEqual(result.trades['600000.SH'].iloc[3], -900)
+        buy, sell = 900 * 10.1, 900 * 10.3
+        self.assertAlmostEqual(result.costs.iloc[1], 5.0)
+        self.assertAlmostEqual(result.costs.iloc[3], 5.0 + sell * 0.0005)
+        self.assertAlmostEqual(result.equity.iloc[1], 100000 - buy - 5 + 900 * 10.2)
+        self.assertAlmostEqual(result.equity.iloc[-1], 100000 - buy + sell - 10 - sell * 0.0005)
+        self.assertAlmostEqual(result.turnover.iloc[1], buy / 2 / 100000)
+        self.assertEqual(result.summary()['trades'], 2)
+
+    def test_limit_and_suspension_block_fills(self):
+        """测试涨停不能买入、跌停和停牌不能卖出，委托在之后的交易日成交"""
+        # 第2天开盘涨停，第3天买入；第5天开盘跌停，第6天停牌，均不能卖出
+        bars = {'600000.SH': make_bars([10.0, 11.0, 10.8, 10.9, 9.81, np.nan], [10.0, 10.9, 10.9, 10.9, 9.9, np.nan])}
+        result = self.backtester.run(self.signals([True, True, True, False, False, False]), bars)
+        np.testing.assert_array_equal(result.positions['600000.SH'].to_numpy(), [0, 0, 900, 900, 900, 900])
+
+        # 创业板的涨停幅度为20%，开盘上涨10%仍可买入
+        self.assertEqual(limit_ratio('300750.SZ'), 0.2)
+        self.assertEqual(limit_ratio('688001.SH'), 0.2)
+        self.assertEqual(limit_ratio('830799.BJ'), 0.3)
+        # 不带市场后缀的原始代码按代码前缀判断
+        for code in ('830799', '430047', '920001', 'BJ.830799'):
+            self.assertEqual(limit_ratio(code), 0.3, code)
+        self.assertEqual(limit_ratio('300750'), 0.2)
+        self.assertEqual(limit_ratio('600000'), 0.1)
+        bars = {'300750.SZ': bars['600000.SH']}
+        result = self.backtester.run(self.signals([True] * 6, '300750.SZ'), bars)
+        self.assertEqual(result.positions['300750.SZ'].iloc[1], 900)
+
+        # 信号矩阵的列为原始代码时，北交所股票开盘上涨15%仍可买入，主板股票涨停不能买入
+        bars = {code: make_bars([10.0, 11.5, 11.5], [10.0, 11.5, 11.5]) for code in ('830799', '600000')}
+        signals = pd.DataFrame({'830799': [True] * 3, '600000': [True] * 3}, index=self.dates[:3])
+        result = self.backtester.run(signals, bars)
+        self.assertEqual(result.positions['830799'].iloc[1], 800)
+        self.assertEqual(result.positions['600000'].iloc[1], 0)
+
+    def test_entries_limited_by_cash(self):
+        """测试现金不足时按股票顺序用剩余现金买入整手，买不起一手的开仓顺延到卖出后"""
+        codes = ['600000.SH', '600001.SH', '600002.SH']
+        bars = {code: make_bars([10.0] * 6, [10.0] * 6) for code in codes}
+        signals = pd.DataFrame({'600000.SH': [True, True, False, False, False, False],
+                                '600001.SH': [True] * 6, '600002.SH': [True] * 6}, index=self.dates)
+        result = Backtester(initial_cash=15000, position_value=10000).run(signals, bars)
+
+        # 第2天前两只股票分别买入1000股和剩余现金可买的400股，第三只买不起一手
+        np.testing.assert_array_equal(result.positions.iloc[1].to_numpy(), [1000, 400, 0])
+        # 第一只股票卖出后，第三只股票在同一天用卖出所得开仓
+        np.testing.assert_array_equal(result.positions.iloc[3].to_numpy(), [0, 400, 1000])
+        self.assertGreaterEqual(result.cash.min(), 0)
+
+    def test_dense_signals_fast(self):
+        """测试信号密集且现金不足时按数组运算分配现金，全市场规模的回测在数秒内完成"""
+        import time
+        rng = np.random.default_rng(11)
+        n_symbols, days = 2000, 500
+        dates = pd.date_range('2020-01-01', periods=days, freq='D')
+        close = 10 * np.cumprod(1 + rng.normal(0, 0.02, (n_symbols, days)), axis=1)
+        opens = close * (1 + rng.normal(0, 0.01, (n_symbols, days)))
+        symbols = [f'{600000 + i}.SH' for i in range(n_symbols)]
+        panel = Panel(symbols, dates.to_numpy(dtype='datetime64[ns]'), {'open': opens, 'close': close})
+        signals = pd.DataFrame(rng.random((days, n_symbols)) < 0.5, index=dates, columns=symbols)
+
+        started = time.perf_counter()
+        result = Backtester().run(signals, panel)
+        elapsed = time.perf_counter() - started
+
+        self.assertLess(elapsed, 5.0)
+        self.assertGreaterEqual(result.cash.min(), -1e-6)
+        self.assertGreater(result.summary()['trades'], 100)
+
+    def test_matches_reference(self):
+        """测试向量化回测与逐日模拟的结果一致"""
+        rng = np.random.default_rng(5)
+        days = 120
+        dates = pd.date_range('2025-01-01', periods=days, freq='D')
+        bars, signals = {}, {}
+        for code in ['600000.SH', '000001.SZ', '300750.SZ', '688001.SH']:
+            close = 10 * np.cumprod(1 + np.clip(rng.normal(0, 0.05, days), -0.2, 0.2))
+            opens = np.roll(close, 1) * (1 + np.clip(rng.normal(0, 0.06, days), -0.2, 0.2))
+            opens[0] = close[0]
+            suspended = rng.random(days) < 0.05
+            opens[suspended] = close[suspended] = np.nan
+            bars[code] = make_bars(opens, close)
+            signals[code] = rng.random(days) < 0.5
+        signals = pd.DataFrame(signals, index=dates)
+
+        result = self.backtester.run(signals, bars)
+        expected, _ = reference_backtest(signals, bars, self.backtester)
+        np.testing.assert_allclose(result.equity.to_numpy(), expected)
+        self.assertGreater(result.summary()['trades'], 20)
+
+        # 资金不足以同时持有全部股票时，开仓受可用现金约束，现金始终不为负
+        constrained = Backtester(initial_cash=25000, position_value=10000)
+        limited = constrained.run(signals, bars)
+        expected, min_cash = reference_backtest(signals, bars, constrained)
+        np.testing.assert_allclose(limited.equity.to_numpy(), expected)
+        self.assertGreaterEqual(min_cash, 0)
+        self.assertGreaterEqual(limited.cash.min(), -1e-6)
+
+        # 传入面板与传入逐只股票数据的结果一致
+        panel_result = self.backtester.run(signals, Panel.from_frames(bars, ['open', 'close']))
+        pd.testing.assert_series_equal(panel_result.equity, result.equity)
+
+
+if __name__ == '__main__':
+    unittest.main()
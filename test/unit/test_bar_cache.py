@@ -0,0 +1,206 @@
+"""
+K线本地缓存模块单元测试
+"""
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import pandas as pd
+import numpy as np
+import datetime
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from stock_backtester.feeds.bar_cache import BarCache
+from stock_backtester.feeds.resilience import FeedError, FetchResults
+
+
+def make_bars(start_date, end_date, offset=0.0):
+    """生成指定日期范围内每天一条的K线数据，同一日期的价格固定，offset用于模拟复权后的价格变化"""
+    dates = pd.date_range(start_date, end_date, freq='D')
+    values = (dates - pd.Timestamp('2024-01-01')).days.to_numpy(dtype=float) + 10 + offset
+    return pd.DataFrame({
+        'date': dates,
+        'open': values,
+        'high': values + 1,
+        'low': values - 1,
+        'close': values + 0.5,
+        'volume': np.full(len(dates), 1000.0),
+        'amount': values * 1000
+    })
+
+
+class RecordingFetcher:
+    """记录调用参数的模拟数据源"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, stock_code, start_date, end_date, period='1d', adjustment='pre'):
+        self.calls.append((stock_code, start_date, end_date, period, adjustment))
+        return make_bars(start_date, end_date)
+
+
+class TestBarCache(unittest.TestCase):
+    """K线本地缓存测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = BarCache(self.cache_dir)
+        self.fetcher = RecordingFetcher()
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_first_request_fetches_full_range(self):
+        """测试首次请求时获取完整范围并写入缓存"""
+        data = self.cache.get_or_fetch('000001.SZ', '2024-01-01', '2024-01-10', '1d', 'pre', self.fetcher)
+        self.assertEqual(len(data), 10)
+        self.assertEqual(self.fetcher.calls, [('000001.SZ', '2024-01-01', '2024-01-10', '1d', 'pre')])
+        self.assertEqual(self.cache.coverage('000001.SZ', '1d', 'pre'), ('2024-01-01', '2024-01-10'))
+
+    def test_covered_request_served_from_disk(self):
+        """测试已覆盖范围的请求不再调用数据源"""
+        self.cache.get_or_fetch('000001.SZ', '2024-01-01', '2024-01-10', '1d', 'pre', self.fetcher)
+        data = self.cache.get_or_fetch('000001.SZ', '2024-01-03', '2024-01-05', '1d', 'pre', self.fetcher)
+        self.assertEqual(len(self.fetcher.calls), 1)
+        self.assertEqual(list(data['date']), list(pd.date_range('2024-01-03', '2024-01-05')))
+
+    def test_only_uncovered_head_and_tail_fetched(self):
+        """测试只获取未覆盖的头部和尾部区间"""
+        self.cache.get_or_fetch('000001.SZ', '2024-01-05', '2024-01-10', '1d', 'pre', self.fetcher)
+        data = self.cache.get_or_fetch('000001.SZ', '2024-01-01', '2024-01-15', '1d', 'pre', self.fetcher)
+        self.assertEqual(self.fetcher.calls[1:], [
+            ('000001.SZ', '2024-01-01', '2024-01-04', '1d', 'pre'),
+            ('000001.SZ', '2024-01-11', '2024-01-15', '1d', 'pre'),
+        ])
+        self.assertEqual(len(data), 15)
+        self.assertTrue(data['date'].is_monotonic_increasing)
+        self.assertEqual(self.cache.coverage('000001.SZ', '1d', 'pre'), ('2024-01-01', '2024-01-15'))
+
+    def test_partitions_are_independent(self):
+        """测试不同周期和复权方式的分区互不影响"""
+        self.cache.get_or_fetch('000001.SZ', '2024-01-01', '2024-01-10', '1d', 'pre', self.fetcher)
+        self.cache.get_or_fetch('000001.SZ', '2024-01-01', '2024-01-10', '1d', 'none', self.fetcher)
+        self.cache.get_or_fetch('000001.SZ', '2024-01-01', '2024-01-10', '5m', 'pre', self.fetcher)
+        self.assertEqual(len(self.fetcher.calls), 3)
+
+    def test_failed_fetch_does_not_extend_coverage(self):
+        """测试数据源下载失败时不扩展覆盖范围"""
+        def failing_fetcher(*args):
+            raise FeedError("下载失败")
+
+        with self.assertRaises(FeedError):
+            self.cache.get_or_fetch('000001.SZ', '2024-01-01', '2024-01-10', '1d', 'pre', failing_fetcher)
+        self.assertIsNone(self.cache.coverage('000001.SZ', '1d', 'pre'))
+
+    def test_empty_fetch_extends_coverage(self):
+        """测试只有节假日的区间下载成功但没有数据时记为已覆盖，再次请求不调用数据源"""
+        calls = []
+
+        def holiday_fetcher(*args):
+            calls.append(args)
+            return None
+
+        for _ in range(2):
+            data = self.cache.get_or_fetch('000001.SZ', '2024-02-10', '2024-02-17', '1d', 'pre', holiday_fetcher)
+            self.assertIsNone(data)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.cache.coverage('000001.SZ', '1d', 'pre'), ('2024-02-10', '2024-02-17'))
+
+        # 批量读取时失败的股票不记为已覆盖
+        def batch_fetcher(stock_codes, start_date, end_date, period, adjustment):
+            return FetchResults({code: None for code in stock_codes}, failed={'000002.SZ'})
+
+        result = self.cache.get_or_fetch_many(['000002.SZ', '600000.SH'], '2024-02-10', '2024-02-17', '1d', 'pre',
+                                              batch_fetcher)
+        self.assertEqual(result.failed, {'000002.SZ'})
+        self.assertIsNone(self.cache.coverage('000002.SZ', '1d', 'pre'))
+        self.assertEqual(self.cache.coverage('600000.SH', '1d', 'pre'), ('2024-02-10', '2024-02-17'))
+
+    def test_get_or_fetch_many_groups_missing_ranges(self):
+        """测试批量读取时缺失区间相同的股票合并为一次批量请求"""
+        self.cache.get_or_fetch('000001.SZ', '2024-01-01', '2024-01-05', '1d', 'pre', self.fetcher)
+        batch_calls = []
+
+        def batch_fetcher(stock_codes, start_date, end_date, period, adjustment):
+            batch_calls.append((list(stock_codes), start_date, end_date))
+            return {code: make_bars(start_date, end_date) for code in stock_codes}
+
+        result = self.cache.get_or_fetch_many(['000001.SZ', '000002.SZ', '600000.SH'],
+                                              '2024-01-01', '2024-01-10', '1d', 'pre', batch_fetcher)
+        self.assertEqual(sorted(batch_calls), [
+            (['000001.SZ'], '2024-01-06', '2024-01-10'),
+            (['000002.SZ', '600000.SH'], '2024-01-01', '2024-01-10'),
+        ])
+        self.assertTrue(all(len(data) == 10 for data in result.values()))
+
+    def test_refresh_appends_only_new_bars(self):
+        """测试增量刷新只下载水位线之后的数据并追加到缓存"""
+        self.cache.get_or_fetch('000001.SZ', '2024-01-01', '2024-01-10', '1d', 'pre', self.fetcher)
+        self.assertEqual(self.cache.last_bar('000001.SZ', '1d', 'pre'), pd.Timestamp('2024-01-10'))
+        batch_calls = []
+
+        def batch_fetcher(stock_codes, start_date, end_date, period, adjustment):
+            batch_calls.append((list(stock_codes), start_date, end_date))
+            return {code: make_bars(start_date, end_date) for code in stock_codes}
+
+        result = self.cache.refresh_many(['000001.SZ', '000002.SZ'], '2024-01-12', '1d', 'pre', batch_fetcher)
+        # 从水位线所在日期开始获取，没有缓存的股票不参与增量刷新
+        self.assertEqual(batch_calls, [(['000001.SZ'], '2024-01-10', '2024-01-12')])
+        self.assertEqual(list(result['000001.SZ']['date']), list(pd.date_range('2024-01-11', '2024-01-12')))
+        self.assertIsNone(result['000002.SZ'])
+        self.assertEqual(len(self.cache.load('000001.SZ', '1d', 'pre')), 12)
+        self.assertEqual(self.cache.last_bar('000001.SZ', '1d', 'pre'), pd.Timestamp('2024-01-12'))
+
+    def test_refresh_refetches_on_adjustment_event(self):
+        """测试重叠K线价格变化（除权除息）时整体重新获取"""
+        self.cache.get_or_fetch('000001.SZ', '2024-01-01', '2024-01-10', '1d', 'pre', self.fetcher)
+        batch_calls = []
+
+        def batch_fetcher(stock_codes, start_date, end_date, period, adjustment):
+            batch_calls.append((list(stock_codes), start_date, end_date))
+            return {code: make_bars(start_date, end_date, offset=-1.0) for code in stock_codes}
+
+        result = self.cache.refresh_many(['000001.SZ'], '2024-01-12', '1d', 'pre', batch_fetcher)
+        self.assertEqual(batch_calls[-1], (['000001.SZ'], '2024-01-01', '2024-01-12'))
+        self.assertEqual(len(result['000001.SZ']), 12)
+        cached = self.cache.load('000001.SZ', '1d', 'pre')
+        self.assertEqual(cached['close'].iloc[0], 9.5)
+        self.assertEqual(self.cache.coverage('000001.SZ', '1d', 'pre'), ('2024-01-01', '2024-01-12'))
+
+
+    def test_refresh_after_intraday_store(self):
+        """测试盘中写入的未完成K线不作为水位线，收盘后刷新不会误判为除权除息而整体重新获取"""
+        intraday = make_bars('2024-01-01', '2024-01-10')
+        # 1月10日盘中写入，收盘价之后还会变化
+        intraday.loc[intraday.index[-1], 'close'] += 0.3
+        with patch('stock_backtester.feeds.bar_cache._complete_through', return_value=datetime.date(2024, 1, 9)):
+            self.cache.store('000001.SZ', intraday, '2024-01-01', '2024-01-10', '1d', 'pre')
+        self.assertEqual(self.cache.coverage('000001.SZ', '1d', 'pre'), ('2024-01-01', '2024-01-09'))
+        self.assertEqual(self.cache.last_bar('000001.SZ', '1d', 'pre'), pd.Timestamp('2024-01-09'))
+
+        batch_calls = []
+
+        def batch_fetcher(stock_codes, start_date, end_date, period, adjustment):
+            batch_calls.append((list(stock_codes), start_date, end_date))
+            return {code: make_bars(start_date, end_date) for code in stock_codes}
+
+        with patch('stock_backtester.feeds.bar_cache._complete_through', return_value=datetime.date(2024, 1, 11)):
+            result = self.cache.refresh_many(['000001.SZ'], '2024-01-11', '1d', 'pre', batch_fetcher)
+        self.assertEqual(batch_calls, [(['000001.SZ'], '2024-01-09', '2024-01-11')])
+        self.assertEqual(list(result['000001.SZ']['date']), list(pd.date_range('2024-01-10', '2024-01-11')))
+        cached = self.cache.load('000001.SZ', '1d', 'pre')
+        # 盘中的K线被收盘后的数据替换
+        self.assertEqual(cached['close'].iloc[9], make_bars('2024-01-10', '2024-01-10')['close'].iloc[0])
+        self.assertEqual(self.cache.coverage('000001.SZ', '1d', 'pre'), ('2024-01-01', '2024-01-11'))
+
+
+if __name__ == '__main__':
+    unittest.main()
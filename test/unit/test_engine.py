@@ -4,12 +4,19 @@ engine模块单元测试
 import unittest
 import sys
 import os
+import asyncio
+import threading
+import time
+import pandas as pd
+from unittest.mock import patch
 
 # 添加项目根目录到Python路径
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, project_root)
 
-from stock_backtester.engine import calculate_time_range
+from stock_backtester.engine import (calculate_time_range, download_all_stocks, download_all_stocks_async,
+                                     download_all_periods, schedule_download_jobs, download_single_stock,
+                                     download_flights)
 
 
 class TestEngine(unittest.TestCase):
@@ -49,6 +56,155 @@ class TestEngine(unittest.TestCase):
         self.assertEqual(start_date, "2024-01-01")
         self.assertEqual(end_date, "2024-12-31")
 
+    def test_download_all_stocks_keeps_input_order(self):
+        """测试批量并发下载按输入顺序返回结果，无效代码记为None"""
+        stock_list = ['600519', '000001', 'ABCDEF', '000858']
+        results = download_all_stocks(stock_list, '2025-01-01', '2025-01-10', '1d', 'pre',
+                                      max_threads=2, batch_size=2)
+        self.assertEqual(list(results.keys()), stock_list)
+        self.assertIsNone(results['ABCDEF'])
+        for stock in ['600519', '000001', '000858']:
+            self.assertEqual(len(results[stock]), 10)
+
+    def test_download_all_stocks_async(self):
+        """测试异步下载产出全部(股票, 周期)结果，并发数量不超过上限"""
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+        
+        def fake_download(stock_code, start_date, end_date, period='1d', adjustment='pre', cache=None):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.01)
+            with lock:
+                state['running'] -= 1
+            if stock_code == 'ABCDEF':
+                raise ValueError(f"无效的股票代码格式: {stock_code}")
+            if stock_code == '000858':
+                return None
+            return pd.DataFrame({'date': pd.date_range(start_date, end_date), 'close': 1.0})
+        
+        async def collect():
+            return [item async for item in download_all_stocks_async(
+                ['600519', '000001', 'ABCDEF', '000858'], '2025-01-01', '2025-01-10', ['1d', '5m'],
+                max_concurrency=3)]
+        
+        with patch('stock_backtester.engine.download_single_stock', side_effect=fake_download):
+            results = asyncio.run(collect())
+        
+        self.assertEqual(len(results), 8)
+        self.assertLessEqual(state['peak'], 3)
+        by_key = {(stock, period): data for stock, period, data in results}
+        # 下载失败产出异常对象，与成功但无数据的None区分
+        self.assertIsInstance(by_key[('ABCDEF', '5m')], ValueError)
+        self.assertIsNone(by_key[('000858', '1d')])
+        self.assertEqual(len(by_key[('600519', '1d')]), 10)
+
+    def test_download_all_stocks_adaptive(self):
+        """测试自适应并发下载返回全部结果，并发在上下限之间增长"""
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+        
+        def fake_chunk(stock_codes, start_date, end_date, period='1d', adjustment='pre', cache=None):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.01)
+            with lock:
+                state['running'] -= 1
+            return {code: pd.DataFrame({'date': pd.date_range(start_date, end_date), 'close': 1.0})
+                    for code in stock_codes}
+        
+        stock_list = [f"{600000 + i}" for i in range(40)]
+        with patch('stock_backtester.engine.download_stock_chunk', side_effect=fake_chunk):
+            results = download_all_stocks(stock_list, '2025-01-01', '2025-01-10', '1d', 'pre',
+                                          max_threads=4, batch_size=1, adaptive=True, min_threads=1)
+        
+        self.assertEqual(list(results.keys()), stock_list)
+        self.assertTrue(all(len(data) == 10 for data in results.values()))
+        self.assertLessEqual(state['peak'], 4)
+        self.assertGreater(state['peak'], 1)
+
+    def test_schedule_download_jobs_priority(self):
+        """测试优先周期的任务排在前面，同优先级的周期按批次轮流"""
+        chunks_by_period = {'1m': [['a'], ['b']], '5m': [['a'], ['b']], '1d': [['a'], ['b']]}
+        jobs = schedule_download_jobs(chunks_by_period, priority_periods=['1d'])
+        self.assertEqual([(period, chunk[0]) for period, chunk in jobs],
+                         [('1d', 'a'), ('1d', 'b'), ('1m', 'a'), ('5m', 'a'), ('1m', 'b'), ('5m', 'b')])
+    
+    def test_download_all_periods_single_pool(self):
+        """测试多周期下载在一个线程池中完成，优先周期先开始，结果按周期和输入顺序返回"""
+        lock = threading.Lock()
+        started = []
+        
+        def fake_chunk(stock_codes, start_date, end_date, period='1d', adjustment='pre', cache=None):
+            with lock:
+                started.append(period)
+            time.sleep(0.005)
+            return {code: pd.DataFrame({'date': pd.date_range(start_date, end_date), 'close': 1.0})
+                    for code in stock_codes}
+        
+        stock_list = ['600519', '000001', 'ABCDEF', '000858']
+        for adaptive in (False, True):
+            started.clear()
+            with patch('stock_backtester.engine.download_stock_chunk', side_effect=fake_chunk):
+                results = download_all_periods(stock_list, '2025-01-01', '2025-01-10', ['1m', '5m', '1d'],
+                                               max_threads=1, batch_size=1, priority_periods=['1d'],
+                                               adaptive=adaptive)
+            
+            self.assertEqual(list(results), ['1m', '5m', '1d'])
+            self.assertEqual(started[:3], ['1d'] * 3)
+            self.assertEqual(len(started), 9)
+            for stock_data in results.values():
+                self.assertEqual(list(stock_data), stock_list)
+                self.assertIsNone(stock_data['ABCDEF'])
+                self.assertEqual(len(stock_data['600519']), 10)
+                self.assertEqual(stock_data.failed, {'ABCDEF'})
+
+        # 配置了缓存时只写入缓存的周期不保留数据，只记录是否有数据
+        with patch('stock_backtester.engine.download_stock_chunk', side_effect=fake_chunk):
+            results = download_all_periods(stock_list, '2025-01-01', '2025-01-10', ['1m', '1d'], cache=object(),
+                                           max_threads=1, batch_size=1, cache_only_periods=['1m'])
+        self.assertIs(results['1m']['600519'], True)
+        self.assertIsNone(results['1m']['ABCDEF'])
+        self.assertEqual(len(results['1d']['600519']), 10)
+
+    def test_download_single_stock_coalesced(self):
+        """测试多个线程同时下载同一只股票的同一份数据时只调用一次数据源"""
+        data = pd.DataFrame({'date': pd.date_range('2025-01-01', '2025-01-10'), 'close': 1.0})
+        
+        def slow_download(*args, **kwargs):
+            time.sleep(0.1)
+            return data
+        
+        barrier = threading.Barrier(4)
+        results = []
+        
+        def worker():
+            barrier.wait()
+            results.append(download_single_stock('000001', '2025-01-01', '2025-01-10'))
+        
+        before = download_flights.coalesced
+        with patch('stock_backtester.feeds.xtquant_feed.download_stock_data', side_effect=slow_download) as mock_download:
+            threads = [threading.Thread(target=worker) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        self.assertEqual(mock_download.call_count, 1)
+        self.assertTrue(all(result is data for result in results))
+        self.assertEqual(download_flights.coalesced - before, 3)
+
+    def test_download_single_stock_raises_on_failure(self):
+        """测试下载失败时抛出异常，不再当作无数据返回"""
+        from stock_backtester.feeds.resilience import FeedError
+        with patch('stock_backtester.feeds.xtquant_feed.download_stock_data', side_effect=FeedError('重试用尽')):
+            with self.assertRaises(FeedError):
+                download_single_stock('000002', '2025-01-01', '2025-01-10')
+        with self.assertRaises(ValueError):
+            download_single_stock('ABCDEF', '2025-01-01', '2025-01-10')
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""
+内存映射K线存储单元测试
+"""
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import pandas as pd
+import numpy as np
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from stock_backtester.feeds.mmap_store import MmapBarStore
+from stock_backtester.feeds.bar_cache import BarCache
+from stock_backtester.screener.context import DataContext
+
+
+def make_bars(start_date, periods, base):
+    """生成每天一条的K线数据"""
+    dates = pd.date_range(start_date, periods=periods, freq='D')
+    close = np.arange(periods, dtype=float) + base
+    return pd.DataFrame({
+        'date': dates,
+        'open': close - 0.5,
+        'high': close + 1,
+        'low': close - 1,
+        'close': close,
+        'volume': np.full(periods, 1000.0),
+        'amount': close * 1000
+    })
+
+
+class TestMmapBarStore(unittest.TestCase):
+    """内存映射K线存储测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.test_dir = tempfile.mkdtemp()
+        self.store_dir = os.path.join(self.test_dir, 'store')
+        self.stock_data = {
+            '000001.SZ': make_bars('2025-01-01', 10, 10),
+            '600519.SH': make_bars('2025-01-03', 5, 1500),
+            '000002.SZ': None,
+        }
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_build_and_read(self):
+        """测试构建存储后按股票读取数据"""
+        MmapBarStore.build(self.store_dir, self.stock_data)
+        store = MmapBarStore(self.store_dir)
+        self.assertEqual(len(store), 2)
+        self.assertIn('600519.SH', store)
+        self.assertNotIn('000002.SZ', store)
+        self.assertIsNone(store.get('000002.SZ'))
+
+        result = store.get('600519.SH')
+        pd.testing.assert_frame_equal(result, self.stock_data['600519.SH'], check_dtype=False)
+
+    def test_arrays_are_zero_copy(self):
+        """测试按股票切片返回的是内存映射数组的视图"""
+        store = MmapBarStore.build(self.store_dir, self.stock_data)
+        arrays = store.get_arrays('000001.SZ', ['close'])
+        self.assertTrue(np.shares_memory(arrays['close'], store.field('close')))
+        self.assertFalse(arrays['close'].flags.writeable)
+        np.testing.assert_array_equal(arrays['close'], self.stock_data['000001.SZ']['close'].to_numpy())
+
+    def test_date_range_slice(self):
+        """测试按日期范围切片"""
+        store = MmapBarStore.build(self.store_dir, self.stock_data)
+        result = store.get('000001.SZ', '2025-01-03', '2025-01-05')
+        self.assertEqual(list(result['date']), list(pd.date_range('2025-01-03', '2025-01-05')))
+
+    def test_build_from_cache_and_attach(self):
+        """测试由K线缓存构建存储并挂载到数据上下文"""
+        cache = BarCache(os.path.join(self.test_dir, 'cache'))
+        cache.store('000001.SZ', self.stock_data['000001.SZ'], '2025-01-01', '2025-01-10', '1m', 'pre')
+        store = MmapBarStore.build_from_cache(self.store_dir, cache, ['000001.SZ', '600519.SH'], period='1m')
+        self.assertEqual(store.symbols, ['000001.SZ'])
+
+        context = DataContext('2025-01-01', '2025-01-05')
+        context.attach_store(store, '1m', 'pre')
+        result = context.get('000001', '1m')
+        self.assertEqual(len(result), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
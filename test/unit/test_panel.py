@@ -0,0 +1,102 @@
+"""
+面板数据模块单元测试
+"""
+import unittest
+import sys
+import os
+import pandas as pd
+import numpy as np
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from stock_backtester.panel import Panel, rolling_mean, rolling_max
+from stock_backtester.shared_panel import compute_last_values
+from stock_backtester.screener.indicators import MAIndicator, WRIindicator
+
+
+def make_bars(dates, seed):
+    """生成指定日期的随机K线数据"""
+    rng = np.random.default_rng(seed)
+    count = len(dates)
+    close = rng.uniform(100, 110, count)
+    return pd.DataFrame({
+        'date': dates,
+        'open': rng.uniform(100, 110, count),
+        'high': close + rng.uniform(0, 5, count),
+        'low': close - rng.uniform(0, 5, count),
+        'close': close,
+        'volume': rng.integers(1000000, 2000000, count).astype(float),
+        'amount': rng.uniform(10000000, 20000000, count)
+    })
+
+
+class TestPanel(unittest.TestCase):
+    """面板数据测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        all_dates = pd.date_range('2025-01-01', periods=30, freq='D')
+        # 第二只股票中间停牌5天，第三只股票最后两天停牌，第四只股票没有数据
+        self.stock_data = {
+            '000001.SZ': make_bars(all_dates, 1),
+            '600519.SH': make_bars(all_dates.delete(range(10, 15)), 2),
+            '000858.SZ': make_bars(all_dates[:-2], 3),
+            '000002.SZ': None,
+        }
+        self.panel = Panel.from_frames(self.stock_data)
+
+    def test_alignment(self):
+        """测试面板按时间对齐，缺失的K线为NaN"""
+        self.assertEqual(self.panel.shape, (4, 30))
+        close = self.panel.field('close')
+        self.assertTrue(np.isnan(close[1, 10:15]).all())
+        self.assertTrue(np.isnan(close[3]).all())
+        np.testing.assert_array_equal(close[0], self.stock_data['000001.SZ']['close'].to_numpy())
+
+    def test_last_values(self):
+        """测试取每只股票最后一根K线的值"""
+        last = self.panel.last_values(self.panel.field('close'))
+        for i, (code, data) in enumerate(self.stock_data.items()):
+            if data is None:
+                self.assertTrue(np.isnan(last[i]))
+            else:
+                self.assertEqual(last[i], data['close'].iloc[-1])
+
+    def test_rolling_skips_missing_bars(self):
+        """测试滚动计算跳过停牌时间点，与逐只股票计算一致"""
+        values = np.array([[1.0, 2.0, np.nan, 3.0, 4.0]])
+        np.testing.assert_allclose(rolling_mean(values, 3), [[np.nan, np.nan, np.nan, 2.0, 3.0]])
+        np.testing.assert_allclose(rolling_max(values, 2), [[np.nan, 2.0, np.nan, 3.0, 4.0]])
+
+    def test_indicators_match_per_symbol(self):
+        """测试面板指标计算结果与逐只股票计算一致"""
+        for indicator in [MAIndicator(5), WRIindicator(14)]:
+            panel_values = self.panel.last_values(indicator.calculate_panel(self.panel))
+            for i, data in enumerate(self.stock_data.values()):
+                if data is None:
+                    self.assertTrue(np.isnan(panel_values[i]))
+                    continue
+                expected = indicator.calculate(data.copy())[indicator.name].iloc[-1]
+                self.assertAlmostEqual(panel_values[i], expected, places=9)
+
+    def test_select(self):
+        """测试选取部分股票"""
+        selected = self.panel.select(['600519.SH', '999999.SZ'])
+        self.assertEqual(selected.shape, (2, 30))
+        np.testing.assert_array_equal(selected.field('close')[0], self.panel.field('close')[1])
+        self.assertTrue(np.isnan(selected.field('close')[1]).all())
+
+    def test_process_pool_last_values(self):
+        """测试共享内存进程池按股票分片计算的最后值与在整个面板上计算的结果一致"""
+        indicators = [MAIndicator(5), WRIindicator(14)]
+        values = compute_last_values(self.panel, indicators, max_workers=2, shard_size=1)
+        for indicator in indicators:
+            expected = self.panel.last_values(indicator.calculate_panel(self.panel))
+            np.testing.assert_allclose(values[indicator.name], expected, equal_nan=True)
+        self.assertTrue(np.isnan(values['MA5'][3]))
+
+
+if __name__ == '__main__':
+    unittest.main()
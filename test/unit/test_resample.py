@@ -0,0 +1,102 @@
+"""
+K线周期合成模块单元测试
+"""
+import unittest
+import sys
+import os
+import pandas as pd
+import numpy as np
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from stock_backtester.feeds.resample import resample_bars, base_period, is_derived_period
+from stock_backtester.screener.context import DataContext
+
+
+def make_minute_bars(day, minutes=1):
+    """生成一个交易日的分钟K线，时间为K线结束时间"""
+    morning = pd.date_range(f'{day} 09:30', f'{day} 11:30', freq=f'{minutes}min')[1:]
+    afternoon = pd.date_range(f'{day} 13:00', f'{day} 15:00', freq=f'{minutes}min')[1:]
+    dates = morning.append(afternoon)
+    count = len(dates)
+    close = np.arange(count, dtype=float) + 10
+    return pd.DataFrame({
+        'date': dates,
+        'open': close - 0.5,
+        'high': close + 1,
+        'low': close - 1,
+        'close': close,
+        'volume': np.ones(count),
+        'amount': np.full(count, 100.0)
+    })
+
+
+class TestResample(unittest.TestCase):
+    """K线周期合成测试类"""
+
+    def test_period_mapping(self):
+        """测试合成周期与基础周期的对应关系"""
+        self.assertEqual(base_period('30m'), '5m')
+        self.assertEqual(base_period('3m'), '1m')
+        self.assertEqual(base_period('1w'), '1d')
+        self.assertEqual(base_period('5m'), '5m')
+        self.assertTrue(is_derived_period('15m'))
+        self.assertFalse(is_derived_period('1d'))
+
+    def test_30m_respects_lunch_break(self):
+        """测试30分钟K线按交易时段切分，不跨越午休"""
+        bars = make_minute_bars('2025-01-02', minutes=5)
+        result = resample_bars(bars, '30m')
+        expected_times = ['10:00', '10:30', '11:00', '11:30', '13:30', '14:00', '14:30', '15:00']
+        self.assertEqual([d.strftime('%H:%M') for d in result['date']], expected_times)
+        self.assertTrue((result['volume'] == 6).all())
+        # 第一根30分钟K线由09:35-10:00的6根5分钟K线合成
+        first = bars.iloc[:6]
+        self.assertEqual(result['open'].iloc[0], first['open'].iloc[0])
+        self.assertEqual(result['close'].iloc[0], first['close'].iloc[-1])
+        self.assertEqual(result['high'].iloc[0], first['high'].max())
+        self.assertEqual(result['low'].iloc[0], first['low'].min())
+
+    def test_60m_from_1m(self):
+        """测试由1分钟K线合成60分钟K线"""
+        bars = make_minute_bars('2025-01-02')
+        result = resample_bars(bars, '60m', '1m')
+        self.assertEqual([d.strftime('%H:%M') for d in result['date']], ['10:30', '11:30', '14:00', '15:00'])
+        self.assertTrue((result['amount'] == 6000.0).all())
+
+    def test_weekly_from_daily(self):
+        """测试由日线合成周线，时间为当周最后一个交易日"""
+        dates = pd.bdate_range('2025-01-06', '2025-01-17')
+        bars = pd.DataFrame({
+            'date': dates,
+            'open': np.arange(10, dtype=float),
+            'high': np.arange(10, dtype=float) + 1,
+            'low': np.arange(10, dtype=float) - 1,
+            'close': np.arange(10, dtype=float) + 0.5,
+            'volume': np.ones(10),
+            'amount': np.ones(10)
+        })
+        result = resample_bars(bars, '1w')
+        self.assertEqual(list(result['date']), [pd.Timestamp('2025-01-10'), pd.Timestamp('2025-01-17')])
+        self.assertEqual(list(result['open']), [0.0, 5.0])
+        self.assertEqual(list(result['close']), [4.5, 9.5])
+        self.assertEqual(list(result['volume']), [5.0, 5.0])
+
+    def test_invalid_source_period(self):
+        """测试无法合成的周期组合"""
+        with self.assertRaises(ValueError):
+            resample_bars(make_minute_bars('2025-01-02'), '1w', '1m')
+
+    def test_context_derives_period_from_base(self):
+        """测试数据上下文由基础周期合成合成周期，不单独下载"""
+        context = DataContext('2025-01-02', '2025-01-02')
+        context.seed({'000001.SZ': make_minute_bars('2025-01-02', minutes=5)}, '5m')
+        result = context.get('000001.SZ', '30m')
+        self.assertEqual(len(result), 8)
+        self.assertEqual(context.hits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+"""
+数据源调用保护模块单元测试
+"""
+import unittest
+import sys
+import os
+import time
+import threading
+from unittest.mock import MagicMock, patch
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from stock_backtester.feeds import resilience
+from stock_backtester.feeds.resilience import (TokenBucket, CircuitBreaker, CircuitOpenError, FeedCaller,
+                                               FeedCallTimeout, FeedError, AdaptiveConcurrency,
+                                               is_retryable)
+from stock_backtester.feeds.xtquant_feed import download_stock_data, download_stock_data_batch
+
+
+class TestResilience(unittest.TestCase):
+    """数据源调用保护测试类"""
+
+    def test_is_retryable(self):
+        """测试错误分类"""
+        self.assertTrue(is_retryable(TimeoutError()))
+        self.assertTrue(is_retryable(ConnectionResetError()))
+        self.assertTrue(is_retryable(RuntimeError("请求过于频繁")))
+        self.assertTrue(is_retryable(Exception("client not connected")))
+        self.assertFalse(is_retryable(ValueError("timeout参数错误")))
+        self.assertFalse(is_retryable(RuntimeError("股票代码不存在")))
+
+    def test_token_bucket_limits_rate(self):
+        """测试令牌桶限制持续调用速率"""
+        bucket = TokenBucket(rate=100, capacity=1)
+        start = time.monotonic()
+        for _ in range(11):
+            bucket.acquire()
+        # 除第一次外每次调用都需等待约10毫秒
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_retry_then_success(self):
+        """测试可重试错误按退避重试后成功"""
+        func = MagicMock(side_effect=[TimeoutError(), ConnectionError(), 'ok'])
+        caller = FeedCaller(max_retries=3, base_delay=0.001)
+        self.assertEqual(caller.call(func, 1, key='v'), 'ok')
+        self.assertEqual(func.call_count, 3)
+        func.assert_called_with(1, key='v')
+        self.assertEqual(caller.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_non_retryable_raises_immediately(self):
+        """测试不可重试错误直接抛出"""
+        func = MagicMock(side_effect=ValueError("bad"))
+        caller = FeedCaller(max_retries=3, base_delay=0.001)
+        with self.assertRaises(ValueError):
+            caller.call(func)
+        self.assertEqual(func.call_count, 1)
+
+    def test_retries_exhausted(self):
+        """测试重试次数用尽后抛出最后一次错误"""
+        func = MagicMock(side_effect=TimeoutError())
+        caller = FeedCaller(max_retries=2, base_delay=0.001, failure_threshold=10)
+        with self.assertRaises(TimeoutError):
+            caller.call(func)
+        self.assertEqual(func.call_count, 3)
+
+    def test_call_timeout(self):
+        """测试单次调用超时"""
+        caller = FeedCaller(max_retries=0, timeout=0.05)
+        with self.assertRaises(FeedCallTimeout):
+            caller.call(time.sleep, 1)
+        self.assertEqual(caller.abandoned, 1)
+
+    def test_timeout_threads_bounded(self):
+        """测试超时放弃的调用仍占用线程名额，名额用尽时不再创建新线程"""
+        release = threading.Event()
+        caller = FeedCaller(max_retries=0, timeout=0.05, max_call_threads=1)
+        with self.assertRaises(FeedCallTimeout):
+            caller.call(release.wait)
+        func = MagicMock(return_value='ok')
+        with self.assertRaises(FeedCallTimeout):
+            caller.call(func)
+        func.assert_not_called()
+
+        # 被放弃的调用返回后释放名额
+        release.set()
+        time.sleep(0.05)
+        self.assertEqual(caller.call(func), 'ok')
+
+    def test_circuit_breaker_pauses_callers(self):
+        """测试熔断期间调用方暂停，冷却后试探调用成功则关闭"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        with self.assertRaises(CircuitOpenError):
+            breaker.wait(timeout=0.01)
+
+        # 冷却后只放行一次试探调用，其他调用方等待试探结果
+        start = time.monotonic()
+        breaker.wait()
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+
+        released = threading.Event()
+        waiter = threading.Thread(target=lambda: (breaker.wait(), released.set()))
+        waiter.start()
+        self.assertFalse(released.wait(0.05))
+        breaker.record_success()
+        waiter.join(1)
+        self.assertTrue(released.is_set())
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_download_stock_data_retries(self):
+        """测试下载单只股票时客户端短暂不可用会重试而不是丢失该股票"""
+        mock_xtdata = MagicMock()
+        mock_xtdata.download_history_data.side_effect = [ConnectionError("not connected"), None]
+        mock_xtdata.get_market_data_ex.return_value = {'000001.SZ': None}
+        mock_xtquant = MagicMock()
+        mock_xtquant.xtdata = mock_xtdata
+
+        with patch.dict('sys.modules', {'xtquant': mock_xtquant, 'xtquant.xtdata': mock_xtdata}), \
+                patch.object(resilience, '_feed_caller', FeedCaller(base_delay=0.001)):
+            self.assertIsNone(download_stock_data('000001.SZ', '2025-01-01', '2025-01-02'))
+
+        self.assertEqual(mock_xtdata.download_history_data.call_count, 2)
+        mock_xtdata.get_market_data_ex.assert_called_once()
+
+    def test_download_stock_data_raises_after_retries(self):
+        """测试下载单只股票重试用尽时抛出FeedError，而不是返回与无数据相同的None"""
+        mock_xtdata = MagicMock()
+        mock_xtdata.download_history_data.side_effect = ConnectionError("not connected")
+        mock_xtquant = MagicMock()
+        mock_xtquant.xtdata = mock_xtdata
+
+        with patch.dict('sys.modules', {'xtquant': mock_xtquant, 'xtquant.xtdata': mock_xtdata}), \
+                patch.object(resilience, '_feed_caller', FeedCaller(max_retries=1, base_delay=0.001)):
+            with self.assertRaises(FeedError):
+                download_stock_data('000001.SZ', '2025-01-01', '2025-01-02')
+
+    def test_download_batch_gives_up_after_retries(self):
+        """测试批量下载重试用尽时该批股票视为下载失败"""
+        mock_xtdata = MagicMock(spec=['download_history_data', 'get_market_data_ex'])
+        mock_xtdata.get_market_data_ex.side_effect = TimeoutError()
+        mock_xtquant = MagicMock()
+        mock_xtquant.xtdata = mock_xtdata
+
+        with patch.dict('sys.modules', {'xtquant': mock_xtquant, 'xtquant.xtdata': mock_xtdata}), \
+                patch.object(resilience, '_feed_caller', FeedCaller(max_retries=1, base_delay=0.001)):
+            result = download_stock_data_batch(['000001.SZ', '600000.SH'], '2025-01-01', '2025-01-02')
+
+        self.assertEqual(result, {'000001.SZ': None, '600000.SH': None})
+        self.assertEqual(result.failed, {'000001.SZ', '600000.SH'})
+        self.assertEqual(mock_xtdata.get_market_data_ex.call_count, 2)
+
+    def test_adaptive_concurrency(self):
+        """测试AIMD并发控制：无拥塞时加性增长，出错时减半，始终在上下限之间"""
+        controller = AdaptiveConcurrency(min_limit=1, max_limit=8)
+        for _ in range(100):
+            controller.record(0.1)
+        self.assertEqual(controller.limit, 8)
+
+        controller.record(0.1, error=True)
+        self.assertEqual(controller.limit, 4)
+        # 同一轮内的其他失败不再继续减少
+        controller.record(0.1, error=True)
+        self.assertEqual(controller.limit, 4)
+
+        # 单只股票耗时明显超过基准时视为拥塞
+        for _ in range(40):
+            controller.record(1.0)
+        self.assertEqual(controller.limit, 1)
+        self.assertEqual(controller.errors, 2)
+
+        # 整批耗时按股票数量换算，大批次不会被误判为拥塞
+        controller.record(1.0, items=10)
+        self.assertAlmostEqual(controller.baseline, 0.1)
+
+    def test_adaptive_concurrency_baseline_window(self):
+        """测试基准只取最近的样本：少量极快的任务（如命中缓存）移出窗口后并发恢复增长"""
+        controller = AdaptiveConcurrency(min_limit=1, max_limit=8, baseline_window=20)
+        for _ in range(5):
+            controller.record(0.001)
+        # 正常耗时的任务相对极快任务的基准显得拥塞，并发先被压低
+        for _ in range(19):
+            controller.record(0.1)
+        self.assertEqual(controller.limit, 1)
+        self.assertAlmostEqual(controller.baseline, 0.001)
+
+        # 极快任务移出窗口后基准回到正常耗时，并发重新增长到上限
+        for _ in range(100):
+            controller.record(0.1)
+        self.assertAlmostEqual(controller.baseline, 0.1)
+        self.assertEqual(controller.limit, 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
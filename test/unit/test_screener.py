@@ -8,6 +8,7 @@ import tempfile
 import os
 import sys
 import yaml
+from unittest.mock import patch
 
 # 添加项目根目录到Python路径
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -15,8 +16,12 @@ sys.path.insert(0, project_root)
 
 from stock_backtester.screener.base import Filter, Indicator
 from stock_backtester.screener.indicators import MAIndicator, WRIindicator
+from stock_backtester.screener.online import OnlineMA, OnlineWR, online_indicator
+from stock_backtester.screener.live import LiveScreener, LiveEvent, ReplaySource
 from stock_backtester.screener.filters import MAFilter, WRFilter, GeneralComparisonFilter
 from stock_backtester.screener.screener import Screener
+from stock_backtester.screener.context import DataContext
+from stock_backtester.screener.indicator_cache import IndicatorCache
 from stock_backtester.config import Config
 
 
@@ -77,6 +82,81 @@ class TestIndicators(unittest.TestCase):
         result_data_zero = wr_indicator.calculate(test_data_zero_range.copy())
         # 验证除零情况下的处理 - 当最高价等于最低价时，威廉指标应该是一个有限值
         self.assertFalse(pd.isna(result_data_zero['WR14'].iloc[13]))
+    
+    def test_value_at_matches_calculate(self):
+        """测试只计算末尾窗口的指标值与完整计算的结果一致"""
+        # 未排序的数据在载入筛选数据上下文时排序一次，之后按位置截取窗口
+        context = DataContext('2025-01-01', '2025-01-20')
+        context.seed({'000001.SZ': self.test_data.sample(frac=1, random_state=0)})
+        shuffled = context.get('000001.SZ')
+        self.assertTrue(shuffled['date'].is_monotonic_increasing)
+        for indicator in (MAIndicator(5), WRIindicator(14)):
+            full = indicator.calculate(self.test_data.copy())[indicator.name]
+            for position in (-1, -3, 15, 13):
+                self.assertAlmostEqual(indicator.value_at(self.test_data, position), full.iloc[position])
+                self.assertAlmostEqual(indicator.value_at(shuffled, position), full.iloc[position])
+            # K线不足一个周期时为NaN
+            self.assertTrue(np.isnan(indicator.value_at(self.test_data, 2)))
+        
+        # 最高价等于最低价时威廉指标为-50
+        flat = self.test_data.copy()
+        flat[['high', 'low', 'close']] = 100.0
+        self.assertEqual(WRIindicator(14).value_at(flat), -50.0)
+
+
+class TestOnlineIndicators(unittest.TestCase):
+    """在线技术指标测试类"""
+    
+    def setUp(self):
+        """测试前准备：包含缺失值和最高价等于最低价区间的K线"""
+        rng = np.random.default_rng(11)
+        n = 300
+        close = 100 + np.cumsum(rng.normal(0, 1, n))
+        high = close + rng.uniform(0, 1, n)
+        low = close - rng.uniform(0, 1, n)
+        # 连续多根K线价格不变，窗口内最高价等于最低价
+        high[100:130] = low[100:130] = close[100:130] = 50.0
+        close[200] = np.nan
+        high[250] = np.nan
+        self.data = pd.DataFrame({
+            'date': pd.date_range('2024-01-01', periods=n, freq='D'),
+            'open': close, 'high': high, 'low': low, 'close': close,
+            'volume': 1000.0, 'amount': close * 1000
+        })
+    
+    def assert_matches_batch(self, batch, online, data):
+        expected = batch.calculate(data.copy())[batch.name].to_numpy()
+        actual = np.array([online.update(bar) for bar in data.to_dict('records')])
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+        return expected
+    
+    def test_online_ma_matches_batch(self):
+        """测试在线移动平均线逐根更新的结果与批量计算一致"""
+        for period in (1, 5, 20):
+            self.assert_matches_batch(MAIndicator(period), OnlineMA(period), self.data)
+    
+    def test_online_wr_matches_batch(self):
+        """测试在线威廉指标逐根更新的结果与批量计算一致，包括-50的约定"""
+        for period in (1, 14):
+            expected = self.assert_matches_batch(WRIindicator(period), OnlineWR(period), self.data)
+            self.assertTrue(np.any(expected == -50.0))
+    
+    def test_warm_start(self):
+        """测试用历史K线预热后继续更新的结果与批量计算一致"""
+        for batch in (MAIndicator(10), WRIindicator(14)):
+            online = online_indicator(batch)
+            expected = batch.calculate(self.data.copy())[batch.name].to_numpy()
+            value = online.warm_start(self.data.iloc[:150])
+            np.testing.assert_allclose(value, expected[149], equal_nan=True)
+            actual = [online.update(bar) for bar in self.data.iloc[150:].to_dict('records')]
+            np.testing.assert_allclose(actual, expected[150:], rtol=1e-9, atol=1e-9, equal_nan=True)
+        
+        class CustomIndicator(Indicator):
+            def calculate(self, stock_data):
+                return stock_data
+        
+        with self.assertRaises(TypeError):
+            online_indicator(CustomIndicator('Custom'))
 
 
 class TestFilters(unittest.TestCase):
@@ -220,6 +300,161 @@ class TestScreener(unittest.TestCase):
         # 验证结果类型
         self.assertIsInstance(result, list)
     
+    def test_legacy_filter_without_context(self):
+        """测试filter只接受三个参数的旧版自定义筛选器仍可在各种执行方式下使用"""
+        class LegacyFilter(Filter):
+            def __init__(self):
+                super().__init__('legacy')
+                self.calls = []
+            
+            def filter(self, stock_codes, start_time=None, end_time=None):
+                self.calls.append(list(stock_codes))
+                return [code for code in stock_codes if code.startswith('6')]
+        
+        for stock_major in (False, True):
+            legacy = LegacyFilter()
+            screener = Screener('2025-01-01', '2025-01-20', stock_major=stock_major)
+            screener.seed_data(self.test_stock_data, '1d', 'pre')
+            screener.add_filter(GeneralComparisonFilter('close', 0, 'gt'))
+            screener.add_filter(legacy)
+            self.assertEqual(screener.exec(list(self.test_stock_data)), ['600519.SH'], stock_major)
+            self.assertTrue(legacy.calls)
+
+    def test_explain_merges_shared_work(self):
+        """测试执行计划合并相同周期的数据获取和共享的指标"""
+        screener = Screener('2025-01-01', '2025-01-20')
+        screener.add_filter(MAFilter(5, 10, 'gt'))
+        screener.add_filter(GeneralComparisonFilter('close', 'MA5', 'gt'))
+        screener.add_filter(WRFilter(14, -80, 'lt', data_period='5m'))
+        
+        plan = screener.plan()
+        self.assertEqual(plan.lookbacks, {'1d': 10, '5m': 14})
+        self.assertEqual([stage.fetch_period for stage in plan.stages], ['1d', None, '5m'])
+        self.assertEqual([indicator.name for indicator in plan.stages[1].indicators], [])
+        self.assertEqual([indicator.name for indicator in plan.stages[1].reused_indicators], ['MA5'])
+        
+        explanation = screener.explain(list(self.test_stock_data))
+        self.assertIn('1d: 最大回看 10 根K线', explanation)
+        self.assertIn('1d MA5: 使用者: MA5_vs_MA10, GeneralComparison_close_gt_MA5, 共享 2 次', explanation)
+        self.assertIn('最多获取数据 4 次', explanation)
+    
+    def test_adaptive_order(self):
+        """测试按历史通过率调整筛选器顺序，筛选结果不变"""
+        codes = list(self.test_stock_data)
+        results = {}
+        for pin_order in (False, True):
+            screener = Screener('2025-01-01', '2025-01-20', pin_order=pin_order)
+            screener.seed_data(self.test_stock_data, '1d', 'pre')
+            # 第一个筛选器不淘汰任何股票，第二个筛选器淘汰全部股票
+            screener.add_filter(GeneralComparisonFilter('close', 0, 'gt'))
+            screener.add_filter(GeneralComparisonFilter('close', 1e9, 'gt'))
+            screener.add_filter(GeneralComparisonFilter('close', 'open', 'gt'))
+            first = screener.exec(codes)
+            names = [f.name for f in screener.ordered_filters()]
+            results[pin_order] = (first, screener.exec(codes), names)
+        
+        # 淘汰全部股票的筛选器排到不淘汰股票的筛选器之前，尚未执行过的筛选器排在最前
+        self.assertEqual(results[False][2], ['GeneralComparison_close_gt_open',
+                                             'GeneralComparison_close_gt_1000000000.0',
+                                             'GeneralComparison_close_gt_0'])
+        self.assertEqual(results[True][2], screener.get_filter_chain())
+        self.assertEqual(results[False][:2], results[True][:2])
+        self.assertEqual(screener.filter_stats['GeneralComparison_close_gt_0'].pass_rate, 1.0)
+    
+    def test_stock_major_matches_filter_major(self):
+        """测试按股票执行与按筛选器执行的结果一致，未通过的股票不再执行后续筛选器"""
+        codes = list(self.test_stock_data) + ['000002.SZ']
+        stock_data = dict(self.test_stock_data, **{'000002.SZ': None})
+        results = []
+        for stock_major in (False, True):
+            screener = Screener('2025-01-01', '2025-01-20', vectorized=False, pin_order=True,
+                                stock_major=stock_major)
+            screener.seed_data(stock_data, '1d', 'pre')
+            screener.add_filter(GeneralComparisonFilter('close', 1000, 'lt'))
+            screener.add_filter(MAFilter(5, 10, 'gt'))
+            screener.add_filter(GeneralComparisonFilter('close', 'open', 'gt'))
+            results.append(screener.exec(codes))
+        
+        self.assertEqual(results[0], results[1])
+        # 600519.SH和000002.SZ在第一个筛选器处停止
+        self.assertEqual(screener.filter_stats['GeneralComparison_close_lt_1000'].stocks_in, 3)
+        self.assertEqual(screener.filter_stats['MA5_vs_MA10'].stocks_in, 1)
+    
+    def test_parallel_matches_sequential(self):
+        """测试线程池和进程池并行筛选的结果与顺序执行一致，并保持输入顺序"""
+        rng = np.random.default_rng(3)
+        stock_data = {}
+        for i in range(12):
+            data = self.test_stock_data['000001.SZ'].copy()
+            data['close'] = rng.uniform(100, 110, 20)
+            stock_data[f'60{i:04d}.SH'] = data
+        codes = list(stock_data)
+        
+        results = []
+        for vectorized, stock_major, max_workers, process_workers in ((False, False, 1, 0), (False, False, 4, 2),
+                                                                      (False, True, 4, 0), (True, False, 1, 2)):
+            screener = Screener('2025-01-01', '2025-01-20', vectorized=vectorized, stock_major=stock_major,
+                                max_workers=max_workers, process_workers=process_workers)
+            screener.seed_data(stock_data, '1d', 'pre')
+            screener.add_filter(MAFilter(5, 10, 'gt'))
+            screener.add_filter(GeneralComparisonFilter('close', 'MA5', 'gt'))
+            with screener:
+                results.append(screener.exec(codes))
+                # 多次执行复用同一个进程池
+                pool = screener.process_pool
+                self.assertEqual(screener.exec(codes), results[-1])
+                self.assertIs(screener.process_pool, pool)
+                self.assertEqual(pool is not None, process_workers > 0)
+            self.assertIsNone(screener.process_pool)
+        
+        self.assertTrue(results[0])
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(results[0], results[3])
+    
+    def test_stream_emits_results_as_symbols_complete(self):
+        """测试流式筛选在每只股票下载完成后立即产出结果，最终结果与一次性筛选一致"""
+        import time
+        rng = np.random.default_rng(5)
+        stock_data = {}
+        for i in range(6):
+            data = self.test_stock_data['000001.SZ'].copy()
+            data['close'] = rng.uniform(100, 110, 20)
+            stock_data[f'60{i:04d}.SH'] = data
+        codes = list(stock_data)
+        slow_code = codes[0]
+        
+        def fake_download(stock_code, start_date, end_date, period='1d', adjustment='pre', cache=None):
+            # 第一只股票下载很慢，不应阻塞其他股票的结果
+            if stock_code == slow_code:
+                time.sleep(0.3)
+            return stock_data[stock_code]
+        
+        def build():
+            screener = Screener('2025-01-01', '2025-01-20', max_workers=3)
+            screener.add_filter(MAFilter(5, 10, 'gt'))
+            screener.add_filter(GeneralComparisonFilter('close', 'MA5', 'gt'))
+            return screener
+        
+        expected = build().seed_data(stock_data, '1d', 'pre').exec(codes)
+        
+        callbacks = []
+        screener = build()
+        with patch('stock_backtester.engine.download_single_stock', side_effect=fake_download):
+            started = time.perf_counter()
+            stream = screener.stream(codes, callback=lambda code, passed: callbacks.append((code, passed)))
+            first = next(stream)
+            first_latency = time.perf_counter() - started
+            results = [first] + list(stream)
+        
+        self.assertTrue(expected)
+        self.assertNotEqual(first[0], slow_code)
+        self.assertLess(first_latency, 0.3)
+        self.assertEqual(results[-1][0], slow_code)
+        self.assertEqual(callbacks, results)
+        self.assertEqual(sorted(code for code, passed in results if passed), sorted(expected))
+        self.assertEqual(screener.get_filtered_stocks(), expected)
+    
     def test_screener_config_loading(self):
         """测试从配置加载筛选器"""
         # 创建临时配置文件
@@ -251,5 +486,460 @@ class TestScreener(unittest.TestCase):
             os.unlink(temp_config_path)
 
 
+class TestLiveScreener(unittest.TestCase):
+    """实时筛选测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        rng = np.random.default_rng(21)
+        self.stock_data = {}
+        for i in range(5):
+            close = 100 + np.cumsum(rng.normal(0, 2, 40))
+            self.stock_data[f'60{i:04d}.SH'] = pd.DataFrame({
+                'date': pd.date_range('2025-01-01', periods=40, freq='D'),
+                'open': close + rng.normal(0, 1, 40),
+                'high': close + 2,
+                'low': close - 2,
+                'close': close,
+                'volume': 1000.0,
+                'amount': close * 1000
+            })
+    
+    def make_filters(self):
+        return [MAFilter(5, 10, 'gt'), GeneralComparisonFilter('close', 'MA5', 'gt'), WRFilter(14, -20, 'gt')]
+    
+    def expected_passing(self, end):
+        """用一次性筛选计算截至第end根K线时通过的股票"""
+        screener = Screener(vectorized=False, pin_order=True)
+        screener.seed_data({code: data.iloc[:end] for code, data in self.stock_data.items()})
+        for filter_obj in self.make_filters():
+            screener.add_filter(filter_obj)
+        return set(screener.exec(list(self.stock_data)))
+    
+    def test_replay_matches_one_shot_screening(self):
+        """测试回放过程中每根K线后的通过集合与一次性筛选一致，并发布进入/退出事件"""
+        live = LiveScreener(self.make_filters())
+        events = []
+        live.subscribe(events.append)
+        
+        history = {code: data.iloc[:15] for code, data in self.stock_data.items()}
+        live.warm_start(history)
+        self.assertEqual(live.passing, self.expected_passing(15))
+        
+        passing = set(live.passing)
+        for end in range(16, 41):
+            replay = ReplaySource({code: data.iloc[end - 1:end] for code, data in self.stock_data.items()})
+            before = len(events)
+            live.run(replay)
+            for event in events[before:]:
+                if event.kind == LiveEvent.ENTER:
+                    passing.add(event.stock_code)
+                else:
+                    passing.discard(event.stock_code)
+            self.assertEqual(live.passing, self.expected_passing(end))
+            self.assertEqual(passing, live.passing)
+            # 面板批量判断与逐只判断的结果一致
+            codes = list(self.stock_data)
+            self.assertEqual(live._evaluate_panel(codes), live._evaluate_per_symbol(codes))
+        self.assertTrue(events)
+        self.assertEqual(live.bars_received, 25 * 5)
+    
+    def test_same_bar_revision(self):
+        """测试同一根K线重复推送时替换窗口中的K线而不是追加"""
+        live = LiveScreener(self.make_filters())
+        code = '600000.SH'
+        data = self.stock_data[code]
+        live.warm_start({code: data.iloc[:39]})
+        last = data.iloc[39].to_dict()
+        live.on_bars([(code, '1d', dict(last, close=1.0))])
+        live.on_bars([(code, '1d', last)])
+        
+        state = live._states[(code, '1d')]
+        self.assertEqual(len(state.window), live.plan.lookbacks['1d'])
+        self.assertEqual(state.last_time, data['date'].iloc[39])
+        for indicator, online in state.online.values():
+            self.assertAlmostEqual(online.value, indicator.value_at(data))
+        self.assertEqual(code in live.passing, code in self.expected_passing(40))
+
+
+class TestDataContext(unittest.TestCase):
+    """筛选数据上下文测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        dates = pd.date_range('2025-01-01', periods=20, freq='D')
+        self.test_data = pd.DataFrame({
+            'date': dates,
+            'open': np.random.uniform(100, 110, 20),
+            'high': np.random.uniform(110, 120, 20),
+            'low': np.random.uniform(90, 100, 20),
+            'close': np.random.uniform(100, 110, 20),
+            'volume': np.random.randint(1000000, 2000000, 20),
+            'amount': np.random.uniform(10000000, 20000000, 20)
+        })
+    
+    def test_get_is_memoized(self):
+        """测试相同参数的数据只下载一次"""
+        context = DataContext('2025-01-01', '2025-01-20')
+        with patch('stock_backtester.engine.download_single_stock', return_value=self.test_data) as mock_download:
+            first = context.get('000001')
+            second = context.get('000001.SZ', '1d', 'pre')
+            context.get('000001.SZ', '5m')
+        
+        self.assertIs(first, second)
+        self.assertEqual(mock_download.call_count, 2)
+        self.assertEqual(context.hits, 1)
+        self.assertEqual(context.misses, 2)
+    
+    def test_concurrent_gets_coalesced(self):
+        """测试多个线程同时请求同一份未缓存的数据时只下载一次"""
+        import threading
+        import time
+        context = DataContext('2025-01-01', '2025-01-20')
+        
+        def slow_download(*args, **kwargs):
+            time.sleep(0.1)
+            return self.test_data
+        
+        barrier = threading.Barrier(6)
+        results = []
+        
+        def worker():
+            barrier.wait()
+            results.append(context.get('000001.SZ'))
+        
+        with patch('stock_backtester.engine.download_single_stock', side_effect=slow_download) as mock_download:
+            threads = [threading.Thread(target=worker) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        self.assertEqual(mock_download.call_count, 1)
+        self.assertTrue(all(result is self.test_data for result in results))
+        self.assertEqual(context.flights.executions, 1)
+        self.assertEqual(context.flights.coalesced, context.misses - 1)
+    
+    def test_get_panel_fetches_concurrently(self):
+        """测试构建面板时未缓存的股票并发下载，面板股票顺序与输入一致"""
+        import threading
+        import time
+        context = DataContext('2025-01-01', '2025-01-20', max_workers=4)
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+        
+        def slow_download(*args, **kwargs):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.05)
+            with lock:
+                state['running'] -= 1
+            return self.test_data
+        
+        codes = ['000001', '000002', '600000', '600519']
+        with patch('stock_backtester.engine.download_single_stock', side_effect=slow_download) as mock_download:
+            panel = context.get_panel(codes)
+        
+        self.assertEqual(mock_download.call_count, 4)
+        self.assertGreater(state['peak'], 1)
+        self.assertEqual(list(panel.symbols), codes)
+    
+    def test_concurrent_indicator_misses_coalesced(self):
+        """测试多个线程同时请求同一个未缓存的指标时只计算一次"""
+        import threading
+        import time
+        cache = IndicatorCache()
+        calls = []
+        
+        def slow_compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return 1.0
+        
+        barrier = threading.Barrier(6)
+        results = []
+        
+        def worker():
+            barrier.wait()
+            results.append(cache.get_or_compute(('000001.SZ', 'MA5'), slow_compute))
+        
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [1.0] * 6)
+        self.assertEqual(cache.flights.executions, 1)
+    
+    def test_failed_download_not_memoized(self):
+        """测试下载失败时抛出异常且不被缓存为无数据，之后的请求重新下载"""
+        from stock_backtester.feeds.resilience import FeedError
+        context = DataContext('2025-01-01', '2025-01-20')
+        with patch('stock_backtester.engine.download_single_stock',
+                   side_effect=[FeedError('重试用尽'), self.test_data]) as mock_download:
+            with self.assertRaises(FeedError):
+                context.get('000001')
+            self.assertIs(context.get('000001'), self.test_data)
+        self.assertEqual(mock_download.call_count, 2)
+        
+        # 面板中失败的股票记为无数据，面板不被缓存
+        with patch('stock_backtester.engine.download_single_stock',
+                   side_effect=[FeedError('重试用尽'), self.test_data]):
+            first = context.get_panel(['000002'])
+            self.assertTrue(np.isnan(first.field('close')).all())
+            second = context.get_panel(['000002'])
+        self.assertIsNot(first, second)
+        self.assertEqual(second.shape[1], 20)
+        
+        # 筛选时下载失败的股票视为未通过，不影响其他股票
+        screener = Screener('2025-01-01', '2025-01-20', vectorized=False)
+        screener.add_filter(GeneralComparisonFilter('close', 0, 'gt'))
+        
+        def flaky(stock_code, *args, **kwargs):
+            if stock_code == '600000':
+                raise FeedError('重试用尽')
+            return self.test_data
+        
+        with patch('stock_backtester.engine.download_single_stock', side_effect=flaky):
+            self.assertEqual(screener.exec(['000001', '600000']), ['000001'])
+        self.assertNotIn(screener.context._key('600000', '1d', None, None, None), screener.context._data)
+    
+    def test_seeded_screener_does_not_download(self):
+        """测试预填充数据后筛选链不再下载数据"""
+        screener = Screener('2025-01-01', '2025-01-20')
+        screener.seed_data({'000001': self.test_data, '600519': None}, '1d', 'pre')
+        screener.add_filter(MAFilter(5, 10, 'gt'))
+        screener.add_filter(GeneralComparisonFilter('close', 'MA5', 'gt'))
+        screener.add_filter(WRFilter(14, 0, 'lt'))
+        
+        with patch('stock_backtester.engine.download_single_stock') as mock_download:
+            result = screener.exec(['000001', '600519'])
+        
+        mock_download.assert_not_called()
+        self.assertNotIn('600519', result)
+
+    def test_filters_use_data_period_and_adjustment(self):
+        """测试筛选器按自身的数据周期和筛选的复权方式读取数据"""
+        data = self.test_data.copy()
+        data['close'] = np.arange(20, dtype=float) + 100
+        data['open'] = data['close'] - 1
+        for vectorized in (False, True):
+            screener = Screener('2025-01-01', '2025-01-20', vectorized=vectorized, adjustment='none')
+            screener.seed_data({'000001': data}, '5m')
+            screener.add_filter(MAFilter(5, 10, 'gt', data_period='5m'))
+            screener.add_filter(GeneralComparisonFilter('close', 'open', 'gt', data_period='5m'))
+
+            with patch('stock_backtester.engine.download_single_stock') as mock_download:
+                result = screener.exec(['000001'])
+
+            mock_download.assert_not_called()
+            self.assertEqual(result, ['000001'])
+
+    def test_vectorized_matches_per_symbol(self):
+        """测试面板筛选与逐只股票筛选的结果一致"""
+        rng = np.random.default_rng(7)
+        stock_data = {}
+        for code in ['000001', '000002', '600000', '600519', '300750']:
+            data = self.test_data.copy()
+            data['close'] = rng.uniform(100, 110, 20)
+            data['high'] = data['close'] + rng.uniform(0, 5, 20)
+            data['low'] = data['close'] - rng.uniform(0, 5, 20)
+            stock_data[code] = data
+        # 停牌的股票缺少部分日期，数据不足的股票指标为NaN
+        stock_data['600000'] = stock_data['600000'].drop(index=[3, 7, 15]).reset_index(drop=True)
+        stock_data['300750'] = stock_data['300750'].iloc[:8]
+        stock_data['688001'] = None
+        codes = list(stock_data)
+        
+        results = []
+        for vectorized in (True, False):
+            for filters in ([MAFilter(5, 10, 'gt')], [WRFilter(14, -50, 'lt')],
+                            [GeneralComparisonFilter('close', 'MA5', 'gt'), GeneralComparisonFilter('high', 105, 'gte')]):
+                screener = Screener('2025-01-01', '2025-01-20', vectorized=vectorized)
+                screener.seed_data(stock_data, '1d', 'pre')
+                for filter_obj in filters:
+                    screener.add_filter(filter_obj)
+                with patch('stock_backtester.engine.download_single_stock') as mock_download:
+                    results.append(screener.exec(codes))
+                mock_download.assert_not_called()
+        
+        self.assertEqual(results[:3], results[3:])
+    
+    def make_history(self, codes, days=60, seed=3):
+        rng = np.random.default_rng(seed)
+        stock_data = {}
+        for code in codes:
+            close = 100 + np.cumsum(rng.normal(0, 2, days))
+            stock_data[code] = pd.DataFrame({
+                'date': pd.date_range('2025-01-01', periods=days, freq='D'),
+                'open': close + rng.normal(0, 1, days),
+                'high': close + rng.uniform(0, 3, days),
+                'low': close - rng.uniform(0, 3, days),
+                'close': close,
+                'volume': 1000.0,
+                'amount': close * 1000
+            })
+        return stock_data
+    
+    def test_signals_match_per_date_screening(self):
+        """测试历史信号矩阵与逐日截断数据后执行筛选的结果一致"""
+        codes = ['000001', '000002', '600000', '600519']
+        stock_data = self.make_history(codes)
+        # 停牌的股票缺少部分日期，停牌日没有信号
+        stock_data['600000'] = stock_data['600000'].drop(index=[20, 21, 35]).reset_index(drop=True)
+        stock_data['688001'] = None
+        codes.append('688001')
+        filters = lambda: [MAFilter(5, 10, 'gt'), GeneralComparisonFilter('close', 'MA5', 'gt'),
+                           WRFilter(14, -20, 'gt')]
+        
+        screener = Screener('2025-01-01', '2025-03-01')
+        screener.seed_data(stock_data, '1d', 'pre')
+        for filter_obj in filters():
+            screener.add_filter(filter_obj)
+        with patch('stock_backtester.engine.download_single_stock') as mock_download:
+            signals = screener.signals(codes)
+        mock_download.assert_not_called()
+        
+        self.assertEqual(list(signals.columns), codes)
+        self.assertEqual(len(signals), 60)
+        self.assertTrue(signals.to_numpy().any())
+        for date in signals.index:
+            truncated = {code: data[data['date'] <= date] if data is not None else None
+                         for code, data in stock_data.items()}
+            per_date = Screener(vectorized=False, pin_order=True)
+            per_date.seed_data(truncated, '1d', 'pre')
+            for filter_obj in filters():
+                per_date.add_filter(filter_obj)
+            with_bar = [code for code in codes
+                        if stock_data[code] is not None and (stock_data[code]['date'] == date).any()]
+            expected = set(per_date.exec(with_bar))
+            self.assertEqual({code for code in codes if signals.at[date, code]}, expected, str(date))
+        
+        # 信号区间只截取结果，不影响指标的回看
+        window = screener.signals(codes, '2025-02-01', '2025-02-10')
+        self.assertEqual(len(window), 10)
+        pd.testing.assert_frame_equal(window, signals.loc['2025-02-01':'2025-02-10'])
+    
+    def test_signals_align_other_periods(self):
+        """测试其他周期的信号按K线完成时间对齐，日线信号只使用当日收盘前完成的分钟K线"""
+        codes = ['000001', '000002', '600000']
+        daily = self.make_history(codes, days=30, seed=5)
+        rng = np.random.default_rng(6)
+        clock = pd.to_timedelta(['10:00:00', '10:30:00', '11:00:00', '11:30:00',
+                                 '13:30:00', '14:00:00', '14:30:00', '15:00:00'])
+        minute = {}
+        for code in codes:
+            # 分钟K线比日线多一天，最后一天的分钟K线不能影响之前的日线信号
+            dates = (pd.date_range('2025-01-01', periods=31, freq='D').to_numpy()[:, None] + clock.to_numpy()).ravel()
+            close = 100 + np.cumsum(rng.normal(0, 1, len(dates)))
+            minute[code] = pd.DataFrame({'date': dates, 'open': close, 'high': close + 1, 'low': close - 1,
+                                         'close': close, 'volume': 1.0, 'amount': close})
+        filters = lambda: [MAFilter(5, 10, 'gt'), WRFilter(14, -50, 'gt', data_period='30m')]
+        
+        screener = Screener('2025-01-01', '2025-03-01', pin_order=True)
+        screener.seed_data(daily, '1d', 'pre')
+        screener.seed_data(minute, '30m', 'pre')
+        for filter_obj in filters():
+            screener.add_filter(filter_obj)
+        signals = screener.signals(codes)
+        
+        self.assertEqual(len(signals), 30)
+        self.assertTrue(signals.to_numpy().any())
+        for date in signals.index:
+            per_date = Screener(vectorized=False, pin_order=True)
+            per_date.seed_data({code: data[data['date'] <= date] for code, data in daily.items()}, '1d', 'pre')
+            close_time = date + pd.Timedelta(hours=15)
+            per_date.seed_data({code: data[data['date'] <= close_time] for code, data in minute.items()}, '30m', 'pre')
+            for filter_obj in filters():
+                per_date.add_filter(filter_obj)
+            expected = set(per_date.exec(codes))
+            self.assertEqual({code for code in codes if signals.at[date, code]}, expected, str(date))
+
+    def test_signals_axis_independent_of_adaptive_order(self):
+        """测试默认信号时间轴取第一个添加的筛选器的周期，执行筛选调整顺序后不变"""
+        codes = ['000001', '000002']
+        daily = self.make_history(codes, days=20, seed=8)
+        clock = pd.to_timedelta(['10:00:00', '10:30:00', '11:00:00', '11:30:00',
+                                 '13:30:00', '14:00:00', '14:30:00', '15:00:00'])
+        dates = (pd.date_range('2025-01-01', periods=20, freq='D').to_numpy()[:, None] + clock.to_numpy()).ravel()
+        minute = {code: pd.DataFrame({'date': dates, 'open': 100.0, 'high': 101.0, 'low': 99.0,
+                                      'close': 100.0 + np.arange(len(dates)) % 3, 'volume': 1.0, 'amount': 100.0})
+                  for code in codes}
+        screener = Screener('2025-01-01', '2025-03-01')
+        screener.seed_data(daily, '1d', 'pre')
+        screener.seed_data(minute, '30m', 'pre')
+        close_filter = GeneralComparisonFilter('close', 0, 'gt')
+        wr_filter = WRFilter(14, -50, 'lt', data_period='30m')
+        screener.add_filter(close_filter)
+        screener.add_filter(wr_filter)
+        
+        before = screener.signals(codes)
+        screener.exec(codes)
+        # 日线筛选器从不淘汰股票，按历史统计排在30m筛选器之后
+        self.assertIs(screener.ordered_filters()[0], wr_filter)
+        after = screener.signals(codes)
+        
+        self.assertEqual(len(before), 20)
+        pd.testing.assert_index_equal(after.index, before.index)
+
+    def test_indicators_shared_across_filters(self):
+        """测试同一指标在多个筛选器之间只计算一次"""
+        # 收盘价逐日上涨，两只股票都能通过全部筛选器
+        rising = self.test_data.copy()
+        rising['close'] = np.linspace(100, 120, 20)
+        screener = Screener('2025-01-01', '2025-01-20', vectorized=False)
+        screener.seed_data({'000001': rising, '000002': rising.copy()}, '1d', 'pre')
+        screener.add_filter(MAFilter(5, 10, 'gt'))
+        screener.add_filter(GeneralComparisonFilter('MA5', 'MA10', 'gt'))
+        screener.add_filter(GeneralComparisonFilter('close', 'MA5', 'gt'))
+        
+        with patch.object(MAIndicator, 'value_at', autospec=True, side_effect=MAIndicator.value_at) as mock_value:
+            first = screener.exec(['000001', '000002'])
+        
+        # 每只股票只计算MA5和MA10各一次
+        self.assertEqual(mock_value.call_count, 4)
+        self.assertEqual(screener.context.indicators.misses, 4)
+        self.assertGreater(screener.context.indicators.hits, 0)
+        
+        # 面板筛选时每个指标数组同样只计算一次
+        screener.vectorized = True
+        with patch.object(MAIndicator, 'calculate_panel', autospec=True,
+                          side_effect=MAIndicator.calculate_panel) as mock_panel:
+            second = screener.exec(['000001', '000002'])
+        self.assertEqual(mock_panel.call_count, 2)
+        self.assertEqual(first, ['000001', '000002'])
+        self.assertEqual(first, second)
+
+    def test_panel_stages_only_see_survivors(self):
+        """测试面板筛选的后续阶段只在剩余股票上判断条件，已计算的指标不重新计算"""
+        rising = self.test_data.copy()
+        rising['close'] = np.linspace(100, 120, 20)
+        falling = self.test_data.copy()
+        falling['close'] = np.linspace(120, 100, 20)
+        screener = Screener('2025-01-01', '2025-01-20')
+        screener.seed_data({'000001': rising, '000002': falling, '000003': rising.copy()}, '1d', 'pre')
+        screener.add_filter(MAFilter(5, 10, 'gt'))
+        screener.add_filter(GeneralComparisonFilter('close', 'MA5', 'gt'))
+        
+        sizes = []
+        original = GeneralComparisonFilter.filter_panel
+        
+        def record_size(self, panel, context=None):
+            sizes.append(len(panel))
+            return original(self, panel, context)
+        
+        with patch.object(GeneralComparisonFilter, 'filter_panel', autospec=True, side_effect=record_size), \
+                patch.object(MAIndicator, 'calculate_panel', autospec=True,
+                             side_effect=MAIndicator.calculate_panel) as mock_panel:
+            result = screener.exec(['000001', '000002', '000003'])
+        
+        self.assertEqual(result, ['000001', '000003'])
+        self.assertEqual(sizes, [2])
+        self.assertEqual(mock_panel.call_count, 2)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""
+请求合并模块单元测试
+"""
+import unittest
+import sys
+import os
+import time
+import threading
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from stock_backtester.feeds.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    """请求合并测试类"""
+
+    def run_concurrently(self, flights, key, func, n_threads=8):
+        """多个线程同时发出相同的请求，返回每个线程得到的结果或异常"""
+        barrier = threading.Barrier(n_threads)
+        outcomes = [None] * n_threads
+
+        def worker(i):
+            barrier.wait()
+            try:
+                outcomes[i] = flights.do(key, func)
+            except Exception as e:
+                outcomes[i] = e
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_concurrent_requests_coalesced(self):
+        """测试同时进行的相同请求只执行一次，所有等待者得到同一个结果"""
+        flights = SingleFlight()
+        executions = []
+
+        def fetch():
+            executions.append(1)
+            time.sleep(0.1)
+            return object()
+
+        outcomes = self.run_concurrently(flights, ('000001.SZ', '1d'), fetch)
+        self.assertEqual(len(executions), 1)
+        self.assertTrue(all(outcome is outcomes[0] for outcome in outcomes))
+        self.assertEqual(flights.calls, 8)
+        self.assertEqual(flights.executions, 1)
+        self.assertEqual(flights.coalesced, 7)
+        self.assertEqual(flights.in_flight, 0)
+
+    def test_error_shared_and_not_remembered(self):
+        """测试执行者的异常传给所有等待者，完成后的相同请求重新执行"""
+        flights = SingleFlight()
+
+        def fail():
+            time.sleep(0.1)
+            raise ConnectionError("not connected")
+
+        outcomes = self.run_concurrently(flights, 'key', fail)
+        self.assertTrue(all(isinstance(outcome, ConnectionError) for outcome in outcomes))
+        self.assertEqual(flights.executions, 1)
+
+        self.assertEqual(flights.do('key', lambda: 'ok'), 'ok')
+        self.assertEqual(flights.executions, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
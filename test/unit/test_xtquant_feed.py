@@ -11,7 +11,9 @@ import pandas as pd
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, project_root)
 
-from stock_backtester.feeds.xtquant_feed import format_stock_code, download_stock_data
+from stock_backtester.feeds.xtquant_feed import (
+    format_stock_code, download_stock_data, download_stock_data_batch, estimate_chunk_size
+)
 
 
 class TestXtQuantFeed(unittest.TestCase):
@@ -210,6 +212,45 @@ class TestXtQuantFeed(unittest.TestCase):
         # 验证结果 - 当股票代码不存在时，应该返回None
         self.assertIsNone(result)
 
+    def test_download_stock_data_batch_chunks(self):
+        """测试批量下载按批次调用get_market_data_ex"""
+        codes = ['000001.SZ', '000002.SZ', '600000.SH', '600519.SH', '300001.SZ']
+        
+        def fake_market_data(field_list, stock_list, **kwargs):
+            return {
+                code: pd.DataFrame({
+                    'time': [1760025600000],
+                    'open': [10.0], 'high': [11.0], 'low': [9.5], 'close': [10.5],
+                    'volume': [1000000], 'amount': [10000000.0]
+                })
+                for code in stock_list if code != '600519.SH'
+            }
+        
+        mock_xtdata = MagicMock()
+        mock_xtdata.get_market_data_ex.side_effect = fake_market_data
+        mock_xtquant = MagicMock(xtdata=mock_xtdata)
+        
+        with patch.dict('sys.modules', {'xtquant': mock_xtquant, 'xtquant.xtdata': mock_xtdata}):
+            result = download_stock_data_batch(codes, '2025-10-10', '2025-10-10', chunk_size=2)
+        
+        # 5只股票按每批2只分为3批
+        self.assertEqual(mock_xtdata.get_market_data_ex.call_count, 3)
+        self.assertEqual(mock_xtdata.download_history_data2.call_count, 3)
+        self.assertEqual(
+            [call.kwargs['stock_list'] for call in mock_xtdata.get_market_data_ex.call_args_list],
+            [codes[0:2], codes[2:4], codes[4:5]]
+        )
+        self.assertEqual(list(result.keys()), codes)
+        self.assertIsNone(result['600519.SH'])
+        self.assertEqual(result['000001.SZ']['date'].iloc[0].date(), pd.Timestamp('2025-10-10').date())
+    
+    def test_estimate_chunk_size_bounded_by_memory(self):
+        """测试批次大小受内存上限约束"""
+        self.assertEqual(estimate_chunk_size('2025-01-01', '2025-06-30', '1d', batch_size=500), 500)
+        minute_chunk = estimate_chunk_size('2025-01-01', '2025-06-30', '1m', batch_size=500, memory_limit_mb=64)
+        self.assertLess(minute_chunk, 500)
+        self.assertGreaterEqual(minute_chunk, 1)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file